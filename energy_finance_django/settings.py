@@ -74,6 +74,31 @@ DATABASES = {
     )
 }
 
+# Caches
+# Financial metric results are cached per input hash, and concurrent
+# identical solar fetches and metric calculations are coalesced through locks
+# in the single_flight cache. Both must be shared by all worker processes:
+# database tables by default (created by migrate, or createcachetable), or
+# e.g. Redis through METRICS_CACHE_BACKEND and SINGLE_FLIGHT_CACHE_BACKEND.
+# A process-local backend fails the projects.W001/W002 system checks.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "financial_metrics": {
+        "BACKEND": os.environ.get("METRICS_CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.environ.get("METRICS_CACHE_LOCATION", "financial_metrics_cache"),
+        "TIMEOUT": int(os.environ.get("METRICS_CACHE_TIMEOUT", 3600)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("METRICS_CACHE_MAX_ENTRIES", 10000)),
+        },
+    },
+    "single_flight": {
+        "BACKEND": os.environ.get("SINGLE_FLIGHT_CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.environ.get("SINGLE_FLIGHT_CACHE_LOCATION", "single_flight_cache"),
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,6 +131,31 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Decompressed hourly production profiles, memory-mapped on read
+HOURLY_PROFILE_CACHE_DIR = os.environ.get("HOURLY_PROFILE_CACHE_DIR", str(MEDIA_ROOT / "hourly_profiles"))
+
+# Persistent PVWatts response cache: entry lifetime in seconds and the bound
+# on the total size of the stored (compressed) hourly outputs
+PVWATTS_CACHE_TTL = int(os.environ.get("PVWATTS_CACHE_TTL", 30 * 24 * 3600))
+PVWATTS_CACHE_MAX_BYTES = int(os.environ.get("PVWATTS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Solar resource backend: "pvwatts" (NREL API) or "clear_sky" (offline model)
+SOLAR_RESOURCE_BACKEND = os.environ.get("SOLAR_RESOURCE_BACKEND", "pvwatts")
+
+# Serve site profiles by bilinear interpolation of a grid of precomputed
+# profiles with this node spacing in degrees (0 fetches every site exactly).
+# Grid nodes are stored as memory-mapped .npy files in SOLAR_GRID_DIR.
+SOLAR_GRID_RESOLUTION = float(os.environ.get("SOLAR_GRID_RESOLUTION", 0))
+SOLAR_GRID_DIR = os.environ.get("SOLAR_GRID_DIR", str(MEDIA_ROOT / "solar_grid"))
+
+# Bulk PVWatts prefetch rate in requests per second (NREL default: 1,000 per hour)
+PVWATTS_RATE_LIMIT = float(os.environ.get("PVWATTS_RATE_LIMIT", 1000 / 3600))
+
+# Published machine learning model artifacts, and the models each web worker
+# loads at start-up (comma-separated registry names)
+ML_MODEL_DIR = os.environ.get("ML_MODEL_DIR", str(MEDIA_ROOT / "ml_models"))
+ML_WARM_MODELS = [name for name in os.environ.get("ML_WARM_MODELS", "power_generation").split(",") if name]
+
 # Authentication redirects
 LOGIN_URL = "/accounts/login/"
 LOGIN_REDIRECT_URL = "/"
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'energy_finance_django.settings')
 
 application = get_wsgi_application()
+
+# Load the served machine learning models before the first request
+from projects.model_registry import warm_models  # noqa: E402
+
+warm_models()
@@ -2,13 +2,57 @@
 Admin configuration for the Energy Finance application.
 """
 
-from django.contrib import admin
-from .models import Project, SolarProject, CashFlow, FinancialMetric, GeospatialLayer
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+from .models import (Project, SolarProject, FinancialMetric, GeospatialLayer, Job, MLModelVersion, PVWattsResponse,
+                     RiskAlias, RiskTable, RiskTableEntry, Scenario, ScenarioResultSet)
+from .model_registry import activate_model_version, request_training
+from .risk_tables import activate_risk_table, draft_risk_table
+from .scenarios import evaluate_scenarios
+from .utils import rescore_portfolio_risk
 
 
-class CashFlowInline(admin.TabularInline):
-    model = CashFlow
-    extra = 0
+class CashFlowTableMixin:
+    """Read-only cash flow table rendered from the packed columns (one query, no row objects)"""
+    
+    readonly_fields = ('cash_flow_table',)
+    
+    @admin.display(description='Cash flows')
+    def cash_flow_table(self, obj):
+        if obj is None or obj.pk is None:
+            return '-'
+        arrays = obj.get_cash_flow_arrays()
+        if not len(arrays['year']):
+            return 'No cash flows generated'
+        columns = ['revenue', 'opex', 'energy_production_mwh', 'net_cash_flow', 'cumulative_cash_flow']
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            zip(arrays['year'].astype(int).tolist(),
+                *[[f"{value:,.0f}" for value in arrays[column].tolist()] for column in columns])
+        )
+        return format_html(
+            '<table><thead><tr><th>Year</th><th>Revenue</th><th>OPEX</th><th>Energy (MWh)</th>'
+            '<th>Net cash flow</th><th>Cumulative</th></tr></thead><tbody>{}</tbody></table>',
+            rows
+        )
+
+
+class RiskRescoreMixin:
+    """Admin action recalculating risk scores in bulk"""
+    
+    actions = ['rescore_risk']
+    
+    @admin.action(description='Recalculate risk scores of selected projects')
+    def rescore_risk(self, request, queryset):
+        result = rescore_portfolio_risk(queryset)
+        self.message_user(
+            request,
+            f"Rescored {result['projects']} projects; {result['updated']} changed.",
+            messages.SUCCESS
+        )
 
 
 class FinancialMetricInline(admin.StackedInline):
@@ -18,11 +62,11 @@ class FinancialMetricInline(admin.StackedInline):
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(RiskRescoreMixin, CashFlowTableMixin, admin.ModelAdmin):
     list_display = ('name', 'project_type', 'capacity_mw', 'location', 'status')
     list_filter = ('project_type', 'status')
     search_fields = ('name', 'location')
-    inlines = [FinancialMetricInline, CashFlowInline]
+    inlines = [FinancialMetricInline]
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'description', 'project_type', 'status')
@@ -38,16 +82,20 @@ class ProjectAdmin(admin.ModelAdmin):
         }),
         ('Timeline', {
             'fields': ('start_date', 'commercial_operation_date', 'expected_lifetime_years')
+        }),
+        ('Cash Flows', {
+            'classes': ('collapse',),
+            'fields': ('cash_flow_table',)
         })
     )
 
 
 @admin.register(SolarProject)
-class SolarProjectAdmin(admin.ModelAdmin):
+class SolarProjectAdmin(RiskRescoreMixin, CashFlowTableMixin, admin.ModelAdmin):
     list_display = ('name', 'capacity_mw', 'location', 'panel_type', 'status')
     list_filter = ('status', 'panel_type', 'tracking_type')
     search_fields = ('name', 'location')
-    inlines = [FinancialMetricInline, CashFlowInline]
+    inlines = [FinancialMetricInline]
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'description', 'status')
@@ -67,6 +115,10 @@ class SolarProjectAdmin(admin.ModelAdmin):
         }),
         ('Timeline', {
             'fields': ('start_date', 'commercial_operation_date', 'expected_lifetime_years')
+        }),
+        ('Cash Flows', {
+            'classes': ('collapse',),
+            'fields': ('cash_flow_table',)
         })
     )
 
@@ -78,6 +130,176 @@ class FinancialMetricAdmin(admin.ModelAdmin):
     search_fields = ('project__name',)
 
 
+@admin.register(Scenario)
+class ScenarioAdmin(admin.ModelAdmin):
+    list_display = ('name', 'discount_rate', 'inflation_rate', 'debt_ratio', 'interest_rate', 'ppa_price')
+    search_fields = ('name', 'description')
+    actions = ['evaluate_across_projects']
+    fieldsets = (
+        ('Basic Information', {
+            'fields': ('name', 'description')
+        }),
+        ('Rates', {
+            'fields': ('discount_rate', 'inflation_rate', 'debt_ratio', 'interest_rate')
+        }),
+        ('Power Purchase Agreement', {
+            'fields': ('ppa_price', 'ppa_escalation', 'ppa_term')
+        })
+    )
+    
+    @admin.action(description='Evaluate selected scenarios across all projects')
+    def evaluate_across_projects(self, request, queryset):
+        result_set = evaluate_scenarios(queryset, Project.objects.all())
+        return redirect(reverse('projects:scenario_comparison', kwargs={'pk': result_set.pk}))
+
+
+@admin.register(ScenarioResultSet)
+class ScenarioResultSetAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'created_at', 'scenario_count', 'project_count', 'comparison_link')
+    readonly_fields = ('created_at', 'scenario_count', 'project_count', 'comparison_link')
+    exclude = ('scenarios', 'projects', 'metrics', 'data')
+    
+    @admin.display(description='Scenarios')
+    def scenario_count(self, obj):
+        return len(obj.scenarios)
+    
+    @admin.display(description='Projects')
+    def project_count(self, obj):
+        return len(obj.projects)
+    
+    @admin.display(description='Comparison')
+    def comparison_link(self, obj):
+        url = reverse('projects:scenario_comparison', kwargs={'pk': obj.pk})
+        return format_html('<a href="{}">Compare</a>', url)
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('data')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+class ActiveRiskTableReadOnlyMixin:
+    """Active risk table versions are changed by activating a new version, never in place"""
+    
+    extra = 0
+    
+    def has_add_permission(self, request, obj=None):
+        return (obj is None or not obj.is_active) and super().has_add_permission(request, obj)
+    
+    def has_change_permission(self, request, obj=None):
+        return (obj is None or not obj.is_active) and super().has_change_permission(request, obj)
+    
+    def has_delete_permission(self, request, obj=None):
+        return (obj is None or not obj.is_active) and super().has_delete_permission(request, obj)
+
+
+class RiskTableEntryInline(ActiveRiskTableReadOnlyMixin, admin.TabularInline):
+    model = RiskTableEntry
+
+
+class RiskAliasInline(ActiveRiskTableReadOnlyMixin, admin.TabularInline):
+    model = RiskAlias
+
+
+@admin.register(RiskTable)
+class RiskTableAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'kind', 'version', 'is_active', 'activated_at', 'created_at')
+    list_filter = ('kind', 'is_active')
+    readonly_fields = ('is_active', 'activated_at', 'created_at')
+    inlines = [RiskTableEntryInline, RiskAliasInline]
+    actions = ['activate', 'draft_copy']
+    
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return self.readonly_fields + ('kind', 'version')
+        return self.readonly_fields
+    
+    @admin.action(description='Activate selected version and rescore affected projects')
+    def activate(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one risk table version to activate.", messages.ERROR)
+            return
+        table = queryset.get()
+        result = activate_risk_table(table)
+        self.message_user(
+            request,
+            f"Activated {table}. {len(result['changed'])} values changed; rescored {result['projects']} "
+            f"projects, {result['updated']} updated.",
+            messages.SUCCESS
+        )
+    
+    @admin.action(description='Copy the active version of each selected kind as a new draft')
+    def draft_copy(self, request, queryset):
+        for kind in sorted(set(queryset.values_list('kind', flat=True))):
+            table = draft_risk_table(kind, description=f"Draft copied by {request.user}")
+            self.message_user(request, f"Created draft {table}.", messages.SUCCESS)
+
+
+@admin.register(PVWattsResponse)
+class PVWattsResponseAdmin(admin.ModelAdmin):
+    list_display = ('key', 'location', 'hours', 'size_bytes', 'hit_count', 'last_accessed_at', 'expires_at')
+    search_fields = ('key',)
+    readonly_fields = ('key', 'params', 'columns', 'hours', 'outputs', 'meta', 'size_bytes', 'hit_count',
+                       'created_at', 'expires_at', 'last_accessed_at')
+    exclude = ('data',)
+    
+    @admin.display(description='Location')
+    def location(self, obj):
+        return f"{obj.params.get('lat')}, {obj.params.get('lon')}"
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('data')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'kind', 'status', 'progress', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('kind', 'params', 'status', 'progress', 'message', 'result', 'error', 'attempts', 'worker',
+                       'heartbeat_at', 'created_at', 'started_at', 'finished_at')
+    actions = ['retry']
+    
+    @admin.action(description='Retry selected failed jobs')
+    def retry(self, request, queryset):
+        count = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f"Queued {count} jobs again.", messages.SUCCESS)
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(MLModelVersion)
+class MLModelVersionAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'name', 'version', 'is_active', 'size_bytes', 'activated_at', 'created_at')
+    list_filter = ('name', 'is_active')
+    readonly_fields = ('name', 'version', 'artifact', 'sha256', 'size_bytes', 'metrics', 'metadata', 'is_active',
+                       'activated_at', 'created_at')
+    actions = ['activate', 'retrain']
+    
+    @admin.action(description='Serve selected version')
+    def activate(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one model version to activate.", messages.ERROR)
+            return
+        record = activate_model_version(queryset.get())
+        self.message_user(request, f"Activated {record}.", messages.SUCCESS)
+    
+    @admin.action(description='Queue training of a new version of each selected model')
+    def retrain(self, request, queryset):
+        for name in sorted(set(queryset.values_list('name', flat=True))):
+            job = request_training(name)
+            self.message_user(request, f"Training of {name} is job #{job.pk}.", messages.SUCCESS)
+    
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(GeospatialLayer)
 class GeospatialLayerAdmin(admin.ModelAdmin):
     list_display = ('name', 'layer_type', 'enabled')
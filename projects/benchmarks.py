@@ -0,0 +1,356 @@
+"""
+Benchmark harness for the Energy Finance application.
+Times the financial, risk, import, map, solar and ML hot paths against
+generated portfolios, recording wall time, query count and peak memory.
+
+Per-project cases run on a sample of projects from a portfolio of the given
+size, so they show how the per-call cost changes as the tables grow.
+Portfolio cases process the whole portfolio in one call.
+"""
+
+import io
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+import numpy as np
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from pandas import DataFrame
+
+from . import hourly_model, metrics_cache
+from .ml_models import train_power_model
+from .model_registry import RegisteredModel
+from .models import Project, SolarProject
+from .solar_service import SolarRadiationService
+from .utils import (_generate_cash_flows, calculate_financial_metrics, calculate_portfolio_metrics,
+                    calculate_risk_scores, get_project_with_solar, import_project_from_file)
+from .views import map_data_api
+
+
+BENCHMARK_SIZES = [10, 1000, 100000]
+DEFAULT_SAMPLE = 100
+
+# Share of generated projects that are solar
+SOLAR_SHARE = 0.1
+
+# Differences below these are noise, whatever the relative change
+MIN_TIME_DELTA = 0.01           # seconds per call
+MIN_MEMORY_DELTA = 1024 * 1024  # bytes
+
+COUNTRIES = ['United States', 'Germany', 'India', 'Brazil', 'South Africa', 'Vietnam', 'Mexico', 'Kenya']
+STATUSES = ['planning', 'development', 'construction', 'operation']
+TRACKING_TYPES = ['fixed', 'single-axis', 'dual-axis']
+PROJECT_TYPES = ['wind', 'hydro', 'storage', 'other']
+
+
+def build_portfolio(size, rng, batch_size=2000):
+    """
+    Grow the benchmark portfolio to size projects.
+
+    Projects are bulk inserted; solar child rows are saved raw on top of
+    their parent rows, since multi-table models cannot be bulk created.
+
+    Parameters:
+    - size: Total number of projects wanted
+    - rng: numpy.random.Generator used for every generated value
+    - batch_size: Number of rows per INSERT statement
+    """
+    existing = Project.objects.count()
+    missing = size - existing
+    if missing <= 0:
+        return
+
+    solar = rng.random(missing) < SOLAR_SHARE
+    capacity = rng.uniform(1, 200, missing).round(1)
+    projects = [
+        Project(
+            name=f"Benchmark {existing + i}",
+            project_type='solar' if solar[i] else PROJECT_TYPES[i % len(PROJECT_TYPES)],
+            capacity_mw=capacity[i],
+            capex=float(capacity[i] * rng.uniform(0.7e6, 1.3e6)),
+            opex_per_year=float(capacity[i] * rng.uniform(10e3, 25e3)),
+            expected_lifetime_years=int(rng.integers(20, 36)),
+            status=STATUSES[int(rng.integers(len(STATUSES)))],
+            latitude=float(rng.uniform(-40, 60)),
+            longitude=float(rng.uniform(-120, 140)),
+            home_country=COUNTRIES[int(rng.integers(len(COUNTRIES)))],
+            target_country=COUNTRIES[int(rng.integers(len(COUNTRIES)))],
+        )
+        for i in range(missing)
+    ]
+    created = Project.objects.bulk_create(projects, batch_size=batch_size)
+
+    for project in (project for project, is_solar in zip(created, solar) if is_solar):
+        SolarProject(
+            project_ptr_id=project.pk,
+            tracking_type=TRACKING_TYPES[int(rng.integers(len(TRACKING_TYPES)))],
+            degradation_rate=0.5,
+            performance_ratio=float(rng.uniform(0.7, 0.85)),
+        ).save_base(raw=True)
+
+
+def pvwatts_fixture(latitude=35.0):
+    """
+    Hourly PVWatts v8 style response for a 1 kW system.
+
+    Built from the clear-sky solar shape so the solar benchmarks run offline;
+    a recorded response can be passed to run_benchmarks() instead.
+    """
+    shape = hourly_model.solar_shape(latitude)
+    ac = shape / shape.mean() * 0.2 * 1000
+    return {'outputs': {
+        'ac': ac.tolist(),
+        'ac_annual': float(ac.sum() / 1000),
+        'capacity_factor': 20.0,
+    }}
+
+
+def _sample_ids(size, sample):
+    return list(Project.objects.order_by('pk').values_list('pk', flat=True)[:min(size, sample)])
+
+
+def _financial_metrics_case(size, sample, context):
+    projects = [get_project_with_solar(pk) for pk in _sample_ids(size, sample)]
+
+    def run():
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        for project in projects:
+            calculate_financial_metrics(project)
+    return run, len(projects)
+
+
+def _generate_cash_flows_case(size, sample, context):
+    projects = [get_project_with_solar(pk) for pk in _sample_ids(size, sample)]
+
+    def run():
+        for project in projects:
+            _generate_cash_flows(project)
+    return run, len(projects)
+
+
+def _portfolio_metrics_case(size, sample, context):
+    def run():
+        calculate_portfolio_metrics(Project.objects.all())
+    return run, 1
+
+
+def _risk_scores_case(size, sample, context):
+    projects = [Project.objects.get(pk=pk) for pk in _sample_ids(size, sample)]
+
+    def run():
+        for project in projects:
+            calculate_risk_scores(project)
+    return run, len(projects)
+
+
+def _import_case(size, sample, context):
+    buffer = io.StringIO()
+    DataFrame([{
+        'name': 'Imported benchmark', 'capacity_mw': 25.0, 'project_type': 'solar', 'capex': 20000000.0,
+        'opex_per_year': 300000.0, 'expected_lifetime_years': 25, 'status': 'planning',
+        'tracking_type': 'single-axis', 'degradation_rate': 0.5, 'performance_ratio': 0.8,
+    }]).to_csv(buffer, index=False)
+    content = buffer.getvalue().encode()
+    calls = min(size, sample)
+
+    def run():
+        for _ in range(calls):
+            success, message, _ = import_project_from_file(SimpleUploadedFile('projects.csv', content))
+            if not success:
+                raise RuntimeError(message)
+    return run, calls
+
+
+def _map_data_case(size, sample, context):
+    request = RequestFactory().get('/api/map-data/')
+
+    def run():
+        response = map_data_api(request)
+        if response.status_code != 200:
+            raise RuntimeError(response.content.decode())
+    return run, 1
+
+
+def _solar_aggregation_case(size, sample, context):
+    service = SolarRadiationService()
+    fixture = context['pvwatts']
+    # Recorded response instead of the NREL API
+    service.get_solar_data = lambda *args, **kwargs: fixture
+    locations = list(Project.objects.order_by('pk').values_list('latitude', 'longitude')[:min(size, sample)])
+
+    def run():
+        for latitude, longitude in locations:
+            service.get_monthly_solar_data(latitude, longitude, system_capacity=1000.0)
+    return run, len(locations)
+
+
+def _ml_predict_case(size, sample, context):
+    if 'model' not in context:
+        # Trained once, outside the timed runs, and served as the model registry serves it
+        model, metrics, metadata = train_power_model()
+        context['model'] = RegisteredModel('power_generation', 0, model, metrics, metadata)
+    model = context['model']
+    rng = np.random.default_rng(size)
+    features = DataFrame({
+        'solar_irradiance': rng.uniform(0, 1200, size),
+        'temperature': rng.uniform(-10, 45, size),
+        'cloud_cover': rng.uniform(0, 100, size),
+        'system_capacity': rng.uniform(1, 100, size),
+        'tilt_angle': rng.uniform(0, 45, size),
+        'azimuth': rng.uniform(90, 270, size),
+        'panel_efficiency': rng.uniform(15, 25, size),
+        'hour_of_day': rng.integers(0, 24, size),
+        'month': rng.integers(1, 13, size),
+    })
+
+    def run():
+        model.predict(features)
+    return run, 1
+
+
+# Case name -> factory(size, sample, context) returning (callable, calls per run)
+BENCHMARK_CASES = {
+    'financial_metrics': _financial_metrics_case,
+    'generate_cash_flows': _generate_cash_flows_case,
+    'portfolio_metrics': _portfolio_metrics_case,
+    'risk_scores': _risk_scores_case,
+    'import_project': _import_case,
+    'map_data_api': _map_data_case,
+    'solar_aggregation': _solar_aggregation_case,
+    'ml_predict': _ml_predict_case,
+}
+
+
+def measure(func, repeat=3):
+    """
+    Measure a callable.
+
+    Wall time is the best of repeat untraced runs. Queries and peak Python
+    memory (tracemalloc, which includes NumPy buffers) come from one more
+    run, since tracing slows the code down.
+
+    Returns: Dictionary with 'wall_time', 'wall_time_mean', 'queries' and 'peak_memory'
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_time': min(times),
+        'wall_time_mean': sum(times) / len(times),
+        'queries': len(queries),
+        'peak_memory': peak_memory,
+    }
+
+
+def run_benchmarks(sizes=None, cases=None, sample=DEFAULT_SAMPLE, repeat=3, seed=0, pvwatts=None, log=None):
+    """
+    Run benchmark cases at each portfolio size.
+
+    Must run against a disposable database: projects are generated and the
+    cases write cash flows, metrics and imported projects.
+
+    Parameters:
+    - sizes: Portfolio sizes, ascending (default BENCHMARK_SIZES)
+    - cases: Case names from BENCHMARK_CASES (default all)
+    - sample: Maximum projects per per-project case
+    - repeat: Timed runs per case
+    - seed: Seed for the generated portfolio
+    - pvwatts: PVWatts response for the solar case (default pvwatts_fixture())
+    - log: Optional callable for progress messages
+
+    Returns: Dictionary with 'environment' and a list of 'results'
+    """
+    sizes = sorted(sizes or BENCHMARK_SIZES)
+    cases = cases or list(BENCHMARK_CASES)
+    unknown = set(cases) - set(BENCHMARK_CASES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark cases: {', '.join(sorted(unknown))}")
+
+    rng = np.random.default_rng(seed)
+    context = {'pvwatts': pvwatts or pvwatts_fixture()}
+    results = []
+    for size in sizes:
+        build_portfolio(size, rng)
+        for name in cases:
+            func, calls = BENCHMARK_CASES[name](size, sample, context)
+            result = dict(measure(func, repeat=repeat), case=name, size=size, calls=calls)
+            result['per_call'] = result['wall_time'] / max(calls, 1)
+            results.append(result)
+            if log:
+                log(f"{name} @ {size}: {result['wall_time']:.4f}s, {result['queries']} queries, "
+                    f"{result['peak_memory'] / 1e6:.1f} MB")
+
+    return {
+        'environment': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'django': django.get_version(),
+            'numpy': np.__version__,
+            'database': connection.vendor,
+            'sample': sample,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare_to_baseline(report, baseline, threshold=0.25):
+    """
+    Find regressions against a stored report.
+
+    Time and memory regress when they grow by more than threshold (and by
+    more than the noise floors); query counts are deterministic, so any
+    increase in queries per call is a regression.
+
+    Parameters:
+    - report: Report returned by run_benchmarks()
+    - baseline: An earlier report
+    - threshold: Allowed relative increase (default 25%)
+
+    Returns: List of regression descriptions (empty when none)
+    """
+    previous = {(result['case'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        base = previous.get((result['case'], result['size']))
+        if base is None:
+            continue
+        label = f"{result['case']} @ {result['size']}"
+
+        if (result['per_call'] > base['per_call'] * (1 + threshold)
+                and result['per_call'] - base['per_call'] > MIN_TIME_DELTA):
+            regressions.append(f"{label}: time per call {base['per_call']:.4f}s -> {result['per_call']:.4f}s")
+        if result['queries'] / max(result['calls'], 1) > base['queries'] / max(base['calls'], 1):
+            regressions.append(f"{label}: queries {base['queries']} in {base['calls']} calls -> "
+                               f"{result['queries']} in {result['calls']} calls")
+        if (result['peak_memory'] > base['peak_memory'] * (1 + threshold)
+                and result['peak_memory'] - base['peak_memory'] > MIN_MEMORY_DELTA):
+            regressions.append(f"{label}: peak memory {base['peak_memory']} -> {result['peak_memory']} bytes")
+
+    return regressions
+
+
+def load_report(path):
+    """Read a report written by the run_benchmarks command."""
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,692 @@
+"""
+Vectorized cash flow engine for the Energy Finance application.
+Builds (projects x years) cash flow matrices in a single NumPy pass and
+persists them with bulk inserts.
+"""
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from . import financial_kernels, hourly_model, metrics_cache
+from .models import (Project, SolarProject, CashFlow, CashFlowBasis, CashFlowColumns, FinancialMetric, HourlyProfile,
+                     CASH_FLOW_COLUMNS, pack_cash_flow_columns)
+
+
+HOURS_PER_YEAR = 8760
+
+# Base capacity factor by solar tracking type
+SOLAR_CAPACITY_FACTORS = {
+    'fixed': 0.20,
+    'single-axis': 0.25,
+    'dual-axis': 0.30
+}
+DEFAULT_SOLAR_CAPACITY_FACTOR = 0.20    # unknown tracking type
+
+# Simplified modelling assumptions shared by every project
+DEFAULT_CAPACITY_FACTOR = 0.30      # non-solar projects
+BASE_POWER_PRICE = 50.0             # $/MWh in year 1
+MAX_LOAN_TERM = 15                  # years
+MAINTENANCE_SHARE = 0.3             # share of OPEX
+INSURANCE_SHARE = 0.1               # share of OPEX
+INTEREST_DEDUCTIBLE_SHARE = 0.5     # share of debt service deductible for tax
+TAX_RATE = 0.21
+SALVAGE_SHARE = 0.1                 # share of initial CAPEX recovered at end of life
+MAX_MIRR = 100.0                    # percent; higher MIRRs are reported as 0
+
+# CashFlow fields written by the engine, in model order
+CASH_FLOW_FIELDS = CASH_FLOW_COLUMNS[1:]
+
+# Inputs a stored cash flow set depends on (CashFlowBasis fields)
+BASIS_FIELDS = [
+    'capacity_mw', 'capex', 'opex', 'capacity_factor', 'degradation_rate', 'performance_ratio',
+    'lifetime', 'inflation_rate', 'debt_ratio', 'interest_rate', 'ppa_price', 'ppa_escalation', 'ppa_term',
+]
+
+# Basis fields that are None when the project sells at the merchant price
+PPA_FIELDS = ['ppa_price', 'ppa_escalation', 'ppa_term']
+
+# CashFlow columns that change with each input. Taxes and the totals depend on
+# every other column; a lifetime change alters the rows and forces a rebuild.
+_TOTALS = ['taxes', 'net_cash_flow', 'cumulative_cash_flow']
+_ENERGY = ['revenue', 'energy_production_mwh']
+CASH_FLOW_DEPENDENCIES = {
+    'capacity_mw': _ENERGY + _TOTALS,
+    'capacity_factor': _ENERGY + _TOTALS,
+    'degradation_rate': _ENERGY + _TOTALS,
+    'performance_ratio': _ENERGY + _TOTALS,
+    'capex': ['capex', 'debt_service', 'salvage_value'] + _TOTALS,
+    'opex': ['opex', 'maintenance', 'insurance'] + _TOTALS,
+    'inflation_rate': ['revenue', 'opex', 'maintenance', 'insurance'] + _TOTALS,
+    'debt_ratio': ['debt_service'] + _TOTALS,
+    'interest_rate': ['debt_service'] + _TOTALS,
+    'ppa_price': ['revenue'] + _TOTALS,
+    'ppa_escalation': ['revenue'] + _TOTALS,
+    'ppa_term': ['revenue'] + _TOTALS,
+}
+
+
+def project_cash_flow_inputs(projects):
+    """
+    Collect the engine inputs for a sequence of projects.
+
+    Parameters:
+    - projects: Iterable of Project or SolarProject instances
+
+    Returns: Dictionary of 1-D NumPy arrays, one entry per project
+    """
+    rows = [_project_row(project) for project in projects]
+    return _rows_to_inputs(rows)
+
+
+def _project_row(project):
+    """Extract the engine inputs of a single project as a tuple."""
+    capex = project.capex if project.capex else (project.capex_per_mw * project.capacity_mw if project.capex_per_mw else 0)
+    opex = project.opex_per_year if project.opex_per_year else (project.opex_per_mw * project.capacity_mw if project.opex_per_mw else 0)
+
+    if isinstance(project, SolarProject):
+        capacity_factor = SOLAR_CAPACITY_FACTORS.get(project.tracking_type, DEFAULT_SOLAR_CAPACITY_FACTOR)
+        degradation_rate = project.degradation_rate / 100 if project.degradation_rate else 0.005
+        performance_ratio = project.performance_ratio if project.performance_ratio else 0.75
+    else:
+        # Simple estimation for non-solar projects: flat capacity factor, no degradation
+        capacity_factor = DEFAULT_CAPACITY_FACTOR
+        degradation_rate = 0.0
+        performance_ratio = 1.0
+
+    return (project.capacity_mw, capex, opex, project.expected_lifetime_years,
+            capacity_factor, degradation_rate, performance_ratio)
+
+
+def load_cash_flow_inputs(queryset):
+    """
+    Load engine inputs for every project in a queryset with a single query.
+
+    Solar parameters come from a LEFT JOIN on the SolarProject table, so no
+    model instances are created.
+
+    Parameters:
+    - queryset: A Project queryset
+
+    Returns: Tuple of (array of project ids, dictionary of input arrays)
+    """
+    rows = list(queryset.values_list(
+        'id', 'capacity_mw', 'capex', 'capex_per_mw', 'opex_per_year', 'opex_per_mw',
+        'expected_lifetime_years', 'solarproject__project_ptr_id', 'solarproject__tracking_type',
+        'solarproject__degradation_rate', 'solarproject__performance_ratio'
+    ))
+    if not rows:
+        return np.zeros(0, dtype=int), _rows_to_inputs([])
+
+    (ids, capacity, capex, capex_per_mw, opex, opex_per_mw, lifetime,
+     solar_id, tracking_type, degradation_rate, performance_ratio) = zip(*rows)
+
+    def column(values):
+        # None becomes NaN, then falls back like a falsy model value
+        return np.nan_to_num(np.array(values, dtype=float))
+
+    capacity = column(capacity)
+    capex, capex_per_mw = column(capex), column(capex_per_mw)
+    opex, opex_per_mw = column(opex), column(opex_per_mw)
+    capex = np.where(capex != 0, capex, capex_per_mw * capacity)
+    opex = np.where(opex != 0, opex, opex_per_mw * capacity)
+
+    is_solar = np.array([value is not None for value in solar_id])
+    solar_factor = np.array([SOLAR_CAPACITY_FACTORS.get(value, DEFAULT_SOLAR_CAPACITY_FACTOR)
+                             for value in tracking_type])
+    degradation_rate = column(degradation_rate)
+    performance_ratio = column(performance_ratio)
+
+    inputs = {
+        'capacity_mw': capacity,
+        'capex': capex,
+        'opex': opex,
+        'lifetime': np.maximum(np.array(lifetime, dtype=int), 0),
+        'capacity_factor': np.where(is_solar, solar_factor, DEFAULT_CAPACITY_FACTOR),
+        'degradation_rate': np.where(is_solar, np.where(degradation_rate != 0, degradation_rate / 100, 0.005), 0.0),
+        'performance_ratio': np.where(is_solar, np.where(performance_ratio != 0, performance_ratio, 0.75), 1.0),
+    }
+    return np.array(ids, dtype=int), inputs
+
+
+def load_ppa_terms(project_ids):
+    """
+    Load the PPA terms stored with the projects' financial metrics in one query.
+
+    Parameters:
+    - project_ids: Sequence of project ids
+
+    Returns: Dictionary of float arrays keyed by PPA_FIELDS, aligned with
+    project_ids, with NaN where no term is stored
+    """
+    project_ids = [None if project_id is None else int(project_id) for project_id in project_ids]
+    saved = [project_id for project_id in project_ids if project_id is not None]
+    stored = {
+        row[0]: row[1:]
+        for row in FinancialMetric.objects.filter(project_id__in=saved).values_list('project_id', *PPA_FIELDS)
+    } if saved else {}
+    rows = [stored.get(project_id, (None,) * len(PPA_FIELDS)) for project_id in project_ids]
+    return {name: np.array([row[i] for row in rows], dtype=float) for i, name in enumerate(PPA_FIELDS)}
+
+
+# Default of PPA term arguments: each project's stored term. None, in
+# contrast, clears the term for the calculation.
+STORED = object()
+
+
+def resolve_ppa_terms(project_ids, ppa_price=STORED, ppa_escalation=STORED, ppa_term=STORED):
+    """
+    PPA terms for projects: the stored terms with any given terms on top.
+
+    Parameters:
+    - project_ids: Sequence of project ids
+    - ppa_price, ppa_escalation, ppa_term: STORED keeps each project's stored
+      term, None clears it, and a value (scalar or one per project) replaces it
+
+    Returns: Dictionary of float arrays keyed by PPA_FIELDS, aligned with
+    project_ids, with NaN where there is no term
+    """
+    given = {name: value for name, value in zip(PPA_FIELDS, (ppa_price, ppa_escalation, ppa_term))
+             if value is not STORED}
+    # Skip the query when every term is given
+    terms = load_ppa_terms(project_ids) if len(given) < len(PPA_FIELDS) else {}
+    n = len(project_ids)
+    terms.update({name: np.array(_optional_per_project(value, n)[:, 0]) for name, value in given.items()})
+    return {name: terms[name] for name in PPA_FIELDS}
+
+
+def _rows_to_inputs(rows):
+    """Convert a list of input tuples into a dictionary of arrays."""
+    names = ['capacity_mw', 'capex', 'opex', 'lifetime',
+             'capacity_factor', 'degradation_rate', 'performance_ratio']
+    if not rows:
+        return {name: np.zeros(0) for name in names}
+
+    columns = np.array(rows, dtype=float).T
+    inputs = dict(zip(names, columns))
+    inputs['lifetime'] = np.maximum(inputs['lifetime'], 0).astype(int)
+    return inputs
+
+
+def _per_project(value, n):
+    """Broadcast a scalar or per-project sequence to a (n, 1) column."""
+    return np.broadcast_to(np.asarray(value, dtype=float).reshape(-1, 1), (n, 1))
+
+
+def _optional_per_project(value, n):
+    """Like _per_project(), with None entries (no value) as NaN."""
+    if value is None:
+        return np.full((n, 1), np.nan)
+    values = np.asarray(value, dtype=object).reshape(-1)
+    values = np.array([np.nan if v is None else v for v in values], dtype=float)
+    return np.broadcast_to(values.reshape(-1, 1), (n, 1))
+
+
+def build_cash_flow_matrix(inputs, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05,
+                           ppa_price=None, ppa_escalation=None, ppa_term=None):
+    """
+    Compute cash flows for many projects at once.
+
+    Parameters:
+    - inputs: Dictionary of arrays from project_cash_flow_inputs(), optionally
+      with (projects x years) 'energy' and 'price_factor' arrays from
+      add_hourly_overrides(); NaN entries fall back to the annual model, and
+      optionally 'debt_amount' with a positive (projects x years)
+      'debt_service' profile from debt_sizing that replaces the annuity
+    - inflation_rate: Inflation rate, scalar or one value per project (default 2.5%)
+    - debt_ratio: Debt to capital ratio, scalar or one value per project (default 70%)
+    - interest_rate: Interest rate on debt, scalar or one value per project (default 5%)
+    - ppa_price: PPA price in $/MWh, scalar or one value per project; None or
+      NaN sells all energy at the merchant price (default)
+    - ppa_escalation: Annual PPA price escalation (default 0)
+    - ppa_term: PPA term in years; None or NaN covers the whole lifetime
+
+    Returns: Dictionary with 'year' (1-D), 'mask', 'basis' (per-project inputs
+    keyed by BASIS_FIELDS) and one (projects x years) array per CashFlow field.
+    Entries past a project's lifetime are zero and masked out.
+    """
+    lifetime = inputs['lifetime']
+    n = len(lifetime)
+    max_years = int(lifetime.max()) if n else 0
+    year = np.arange(max_years + 1)
+
+    inflation_rate = _per_project(inflation_rate, n)
+    debt_ratio = _per_project(debt_ratio, n)
+    interest_rate = _per_project(interest_rate, n)
+    ppa_price = _optional_per_project(ppa_price, n)
+    ppa_escalation = _optional_per_project(ppa_escalation, n)
+    ppa_term = _optional_per_project(ppa_term, n)
+
+    capex = inputs['capex'][:, None]
+    life = lifetime[:, None]
+    mask = year <= life
+    operating = mask & (year >= 1)
+
+    # Energy production with degradation, unless simulated hourly
+    energy = (inputs['capacity_mw'] * HOURS_PER_YEAR * inputs['capacity_factor']
+              * inputs['performance_ratio'])[:, None]
+    energy = energy * (1 - inputs['degradation_rate'][:, None]) ** (year - 1)
+    if 'energy' in inputs:
+        energy = np.where(np.isnan(inputs['energy']), energy, inputs['energy'][:, :max_years + 1])
+    energy = np.where(operating, energy, 0.0)
+
+    # Inflation-escalated O&M and revenue
+    escalation = (1 + inflation_rate) ** (year - 1)
+    opex = np.where(operating, inputs['opex'][:, None] * escalation, 0.0)
+    maintenance = -opex * MAINTENANCE_SHARE
+    insurance = -opex * INSURANCE_SHARE
+    revenue = energy * BASE_POWER_PRICE * escalation
+    if 'price_factor' in inputs:
+        revenue = revenue * np.nan_to_num(inputs['price_factor'][:, :max_years + 1], nan=1.0)
+
+    # Contracted energy is paid the escalating PPA price, pay-as-produced
+    contracted = ~np.isnan(ppa_price) & (np.isnan(ppa_term) | (year <= np.nan_to_num(ppa_term)))
+    ppa_revenue = energy * np.nan_to_num(ppa_price) * (1 + np.nan_to_num(ppa_escalation)) ** (year - 1)
+    revenue = np.where(contracted, ppa_revenue, revenue)
+
+    # Level annuity over min(15 years, lifetime)
+    debt_amount = capex * debt_ratio
+    equity_amount = capex * (1 - debt_ratio)
+    loan_term = np.minimum(MAX_LOAN_TERM, life)
+    has_loan = (debt_amount > 0) & (interest_rate > 0) & (loan_term > 0)
+    growth = (1 + interest_rate) ** np.where(has_loan, loan_term, 1)
+    annual_debt_service = np.where(
+        has_loan,
+        -debt_amount * interest_rate * growth / np.where(has_loan, growth - 1, 1),
+        0.0
+    )
+    debt_service = np.where(operating & (year <= loan_term), annual_debt_service, 0.0)
+
+    # Sculpted debt from debt_sizing replaces the annuity
+    if 'debt_service' in inputs:
+        debt_amount = inputs['debt_amount'][:, None]
+        equity_amount = capex - debt_amount
+        debt_service = np.where(operating, -inputs['debt_service'][:, :max_years + 1], 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            debt_ratio = np.where(capex > 0, debt_amount / capex, 0.0)
+
+    # Simplified taxes, only on positive taxable income
+    taxable_income = revenue + opex + maintenance + insurance + debt_service * INTEREST_DEDUCTIBLE_SHARE
+    taxes = np.where(taxable_income > 0, -taxable_income * TAX_RATE, 0.0)
+
+    salvage_value = np.where(operating & (year == life), capex * SALVAGE_SHARE, 0.0)
+
+    # Year 0 carries only the equity portion of the investment
+    net_cash_flow = revenue + opex + maintenance + insurance + debt_service + taxes + salvage_value
+    net_cash_flow[:, 0] = -equity_amount[:, 0]
+    cumulative_cash_flow = np.where(mask, np.cumsum(net_cash_flow, axis=1), 0.0)
+
+    capex_column = np.zeros((n, max_years + 1))
+    capex_column[:, 0] = -capex[:, 0]
+
+    basis = {name: inputs[name] for name in BASIS_FIELDS if name in inputs}
+    basis.update(
+        inflation_rate=np.broadcast_to(inflation_rate[:, 0], n),
+        debt_ratio=np.broadcast_to(debt_ratio[:, 0], n),
+        interest_rate=np.broadcast_to(interest_rate[:, 0], n),
+        ppa_price=np.broadcast_to(ppa_price[:, 0], n),
+        ppa_escalation=np.broadcast_to(ppa_escalation[:, 0], n),
+        ppa_term=np.broadcast_to(ppa_term[:, 0], n),
+    )
+
+    return {
+        'year': year,
+        'mask': mask,
+        'basis': basis,
+        'capex': capex_column,
+        'revenue': revenue,
+        'opex': opex,
+        'maintenance': maintenance,
+        'insurance': insurance,
+        'taxes': taxes,
+        'debt_service': debt_service,
+        'incentives': np.zeros((n, max_years + 1)),
+        'salvage_value': salvage_value,
+        'energy_production_mwh': energy,
+        'net_cash_flow': net_cash_flow,
+        'cumulative_cash_flow': cumulative_cash_flow,
+    }
+
+
+def _basis_values(basis, i):
+    """CashFlowBasis field values of schedule row i, with unset PPA terms as None."""
+    values = {name: np.asarray(column)[i].item() for name, column in basis.items()}
+    for name in PPA_FIELDS:
+        if name in values and np.isnan(values[name]):
+            values[name] = None
+    if values.get('ppa_term') is not None:
+        values['ppa_term'] = int(values['ppa_term'])
+    return values
+
+
+def persist_cash_flows(projects, schedule, batch_size=2000):
+    """
+    Replace the stored cash flows of the given projects in one transaction.
+
+    Parameters:
+    - projects: Sequence of projects or project ids, in the same order as the schedule rows
+    - schedule: Dictionary returned by build_cash_flow_matrix()
+    - batch_size: Number of rows per INSERT statement
+
+    Returns: Number of CashFlow rows written
+
+    The packed CashFlowColumns copy is rewritten in the same transaction. The
+    schedule's basis, if present, is stored alongside so that later changes
+    can be applied incrementally by refresh_cash_flows().
+    """
+    project_ids = [getattr(project, 'pk', project) for project in projects]
+    years = schedule['year'].tolist()
+    lifetimes = schedule['mask'].sum(axis=1).tolist()
+    columns = [schedule[field].tolist() for field in CASH_FLOW_FIELDS]
+
+    rows = []
+    for i, project_id in enumerate(project_ids):
+        values = [column[i] for column in columns]
+        for j in range(lifetimes[i]):
+            rows.append(CashFlow(
+                project_id=project_id,
+                year=years[j],
+                **{field: value[j] for field, value in zip(CASH_FLOW_FIELDS, values)}
+            ))
+
+    packed = [
+        CashFlowColumns(
+            project_id=project_id,
+            columns=CASH_FLOW_COLUMNS,
+            years=lifetimes[i],
+            data=pack_cash_flow_columns(dict(
+                {field: schedule[field][i, :lifetimes[i]] for field in CASH_FLOW_FIELDS},
+                year=schedule['year'][:lifetimes[i]]
+            ))
+        )
+        for i, project_id in enumerate(project_ids)
+    ]
+
+    bases = []
+    if 'basis' in schedule:
+        bases = [
+            CashFlowBasis(project_id=project_id, **_basis_values(schedule['basis'], i))
+            for i, project_id in enumerate(project_ids)
+        ]
+
+    with transaction.atomic():
+        CashFlow.objects.filter(project_id__in=project_ids).delete()
+        CashFlow.objects.bulk_create(rows, batch_size=batch_size)
+        CashFlowColumns.objects.filter(project_id__in=project_ids).delete()
+        CashFlowColumns.objects.bulk_create(packed, batch_size=batch_size)
+        CashFlowBasis.objects.filter(project_id__in=project_ids).delete()
+        CashFlowBasis.objects.bulk_create(bases, batch_size=batch_size)
+        # bulk_create() does not send post_save. Invalidate now for this
+        # transaction and again on commit, in case a concurrent reader cached
+        # the old cash flows in between.
+        metrics_cache.invalidate(project_ids)
+        transaction.on_commit(lambda: metrics_cache.invalidate(project_ids))
+
+    return len(rows)
+
+
+HOURLY_OVERRIDE_FIELDS = ['project_id', 'inputs', 'options', 'annual_energy_mwh', 'annual_price_factor']
+
+
+def add_hourly_overrides(project_ids, inputs, profiles=None, persist=False):
+    """
+    Add energy and price overrides from stored hourly profiles to inputs.
+
+    Profiles simulated from different inputs than the current ones are
+    re-simulated in memory with their stored options first.
+
+    Parameters:
+    - project_ids: Sequence of project ids, in the same order as the inputs
+    - inputs: Dictionary of input arrays for those projects
+    - profiles: HourlyProfile rows as dictionaries with HOURLY_OVERRIDE_FIELDS
+      (default: loaded with one query)
+    - persist: Store re-simulated profiles (default False)
+
+    Returns: The inputs, with 'energy' and 'price_factor' arrays (NaN for
+    projects without a profile) when any project has a profile
+    """
+    if profiles is None:
+        profiles = HourlyProfile.objects.filter(project_id__in=list(project_ids)).values(*HOURLY_OVERRIDE_FIELDS)
+    profiles = list(profiles)
+    if not profiles:
+        return inputs
+
+    index = {int(project_id): i for i, project_id in enumerate(project_ids)}
+    years = int(inputs['lifetime'].max()) + 1
+    energy = np.full((len(index), years), np.nan)
+    price_factor = np.full((len(index), years), np.nan)
+
+    for profile in profiles:
+        i = index[profile['project_id']]
+        current = {name: inputs[name][i].item() for name in hourly_model.PROFILE_INPUTS}
+        annual_energy, annual_price_factor = profile['annual_energy_mwh'], profile['annual_price_factor']
+        if profile['inputs'] != current:
+            result = hourly_model.simulate_hourly(current, **profile['options'])
+            if persist:
+                hourly_model.save_hourly_profile(profile['project_id'], current, result, profile['options'])
+            annual_energy, annual_price_factor = result['annual_energy'], result['annual_price_factor']
+        energy[i, 1:len(annual_energy) + 1] = annual_energy
+        price_factor[i, 1:len(annual_price_factor) + 1] = annual_price_factor
+
+    return dict(inputs, energy=energy, price_factor=price_factor)
+
+
+def refresh_cash_flows(project, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05, batch_size=2000,
+                       ppa_price=None, ppa_escalation=None, ppa_term=None):
+    """
+    Bring a project's stored cash flows in line with its current inputs.
+
+    The inputs are compared with the stored CashFlowBasis. Nothing is written
+    when they match, only the dependent columns are updated when some inputs
+    changed, and the rows are rebuilt when the lifetime changed or no basis
+    was recorded.
+
+    Parameters:
+    - project: A Project or SolarProject instance
+    - inflation_rate: Inflation rate (default 2.5%)
+    - debt_ratio: Debt to capital ratio (default 70%)
+    - interest_rate: Interest rate on debt (default 5%)
+    - batch_size: Number of rows per UPDATE statement
+    - ppa_price, ppa_escalation, ppa_term: PPA terms, see build_cash_flow_matrix()
+
+    Projects with an HourlyProfile take their energy and prices from it.
+
+    Returns: List of CashFlow fields that were written (empty when up to date)
+    """
+    # Stored basis and hourly profile in one query, both LEFT JOINed
+    row = Project.objects.filter(pk=project.pk).values(
+        *[f'cash_flow_basis__{name}' for name in BASIS_FIELDS],
+        *[f'hourly_profile__{name}' for name in HOURLY_OVERRIDE_FIELDS]
+    ).get()
+    stored = None
+    if row['cash_flow_basis__lifetime'] is not None:
+        stored = {name: row[f'cash_flow_basis__{name}'] for name in BASIS_FIELDS}
+    profiles = []
+    if row['hourly_profile__project_id'] is not None:
+        profiles = [{name: row[f'hourly_profile__{name}'] for name in HOURLY_OVERRIDE_FIELDS}]
+
+    inputs = add_hourly_overrides([project.pk], project_cash_flow_inputs([project]), profiles, persist=True)
+    schedule = build_cash_flow_matrix(
+        inputs,
+        inflation_rate=inflation_rate,
+        debt_ratio=debt_ratio,
+        interest_rate=interest_rate,
+        ppa_price=ppa_price,
+        ppa_escalation=ppa_escalation,
+        ppa_term=ppa_term
+    )
+    basis = _basis_values(schedule['basis'], 0)
+
+    changed = [name for name in BASIS_FIELDS if stored is None or stored[name] != basis[name]]
+    if not changed:
+        return []
+
+    years = schedule['year'].tolist()
+    rows = list(project.cash_flows.order_by('year').values_list('pk', 'year'))
+    if stored is None or 'lifetime' in changed or [year for _, year in rows] != years:
+        persist_cash_flows([project], schedule, batch_size=batch_size)
+        return list(CASH_FLOW_FIELDS)
+
+    fields = [field for field in CASH_FLOW_FIELDS
+              if any(field in CASH_FLOW_DEPENDENCIES[name] for name in changed)]
+    columns = {field: schedule[field][0].tolist() for field in fields}
+    now = timezone.now()
+    cash_flows = [
+        CashFlow(pk=pk, year=year, updated_at=now, **{field: columns[field][year] for field in fields})
+        for pk, year in rows
+    ]
+
+    arrays = project.get_cash_flow_arrays()
+    arrays.update({field: schedule[field][0] for field in fields})
+
+    with transaction.atomic():
+        CashFlow.objects.bulk_update(cash_flows, fields + ['updated_at'], batch_size=batch_size)
+        # Projects whose cash flows predate the packed copy have no row to update yet
+        CashFlowColumns.objects.update_or_create(project_id=project.pk, defaults={
+            'columns': CASH_FLOW_COLUMNS, 'years': len(rows), 'data': pack_cash_flow_columns(arrays), 'updated_at': now
+        })
+        # A re-simulated profile was stored above, which drops the basis row
+        CashFlowBasis.objects.update_or_create(project_id=project.pk, defaults=dict(basis, updated_at=now))
+        # bulk_update() does not send post_save
+        metrics_cache.invalidate([project.pk])
+        transaction.on_commit(lambda: metrics_cache.invalidate([project.pk]))
+
+    return fields
+
+
+def generate_portfolio_cash_flows(projects, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05,
+                                  chunk_size=5000):
+    """
+    Regenerate and store cash flows for many projects, with their hourly
+    profiles and stored PPA terms.
+
+    Parameters:
+    - projects: Iterable of Project or SolarProject instances
+    - inflation_rate: Inflation rate (default 2.5%)
+    - debt_ratio: Debt to capital ratio (default 70%)
+    - interest_rate: Interest rate on debt (default 5%)
+    - chunk_size: Number of projects computed and written per transaction
+
+    Returns: Number of CashFlow rows written
+    """
+    projects = list(projects)
+    written = 0
+    for start in range(0, len(projects), chunk_size):
+        chunk = projects[start:start + chunk_size]
+        project_ids = [project.pk for project in chunk]
+        schedule = build_cash_flow_matrix(
+            add_hourly_overrides(project_ids, project_cash_flow_inputs(chunk), persist=True),
+            inflation_rate=inflation_rate,
+            debt_ratio=debt_ratio,
+            interest_rate=interest_rate,
+            **load_ppa_terms(project_ids)
+        )
+        written += persist_cash_flows(chunk, schedule)
+    return written
+
+
+def load_cash_flow_schedule(project):
+    """
+    Load the stored cash flows of a project as a one-row schedule.
+
+    Parameters:
+    - project: A Project instance
+
+    Returns: Dictionary in the same layout as build_cash_flow_matrix()
+    """
+    arrays = project.get_cash_flow_arrays()
+    schedule = {
+        'year': arrays['year'].astype(int),
+        'mask': np.ones((1, len(arrays['year'])), dtype=bool),
+    }
+    for field in CASH_FLOW_FIELDS:
+        schedule[field] = arrays[field][None, :]
+    return schedule
+
+
+def sync_cash_flow_columns(project_ids):
+    """
+    Rebuild the packed CashFlowColumns copies from the CashFlow rows.
+
+    Used after individual CashFlow rows are saved; bulk writes through this
+    module keep the packed copy in sync themselves.
+
+    Parameters:
+    - project_ids: Iterable of project ids
+    """
+    project_ids = list(project_ids)
+    rows = CashFlow.objects.filter(project_id__in=project_ids).order_by('project_id', 'year')
+    values = {}
+    for row in rows.values_list('project_id', *CASH_FLOW_COLUMNS):
+        values.setdefault(row[0], []).append(row[1:])
+
+    packed = []
+    for project_id, project_rows in values.items():
+        arrays = dict(zip(CASH_FLOW_COLUMNS, np.array(project_rows, dtype=float).T))
+        packed.append(CashFlowColumns(project_id=project_id, columns=CASH_FLOW_COLUMNS,
+                                      years=len(project_rows), data=pack_cash_flow_columns(arrays)))
+
+    with transaction.atomic():
+        CashFlowColumns.objects.filter(project_id__in=project_ids).delete()
+        CashFlowColumns.objects.bulk_create(packed)
+
+
+def lifetime_lcoe(schedule):
+    """LCOE over undiscounted lifetime costs for every row of a schedule (0 without energy)."""
+    costs = (schedule['capex'] + schedule['opex'] + schedule['maintenance'] + schedule['insurance']).sum(axis=1)
+    energy = schedule['energy_production_mwh'].sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(energy > 0, costs / energy, 0.0)
+
+
+def compute_metrics(schedule, lifetime, discount_rate=0.08, interest_rate=0.05):
+    """
+    Compute FinancialMetric values for every row of a schedule.
+
+    Parameters:
+    - schedule: Dictionary returned by build_cash_flow_matrix() or load_cash_flow_schedule()
+    - lifetime: Project lifetime in years, scalar or one value per row
+    - discount_rate: Discount rate, scalar or one value per row (default 8%)
+    - interest_rate: Interest rate on debt, used as the MIRR finance rate (default 5%)
+
+    Returns: Dictionary of 1-D arrays keyed by FinancialMetric field name.
+    IRR and MIRR are NaN where they are undefined; MIRRs above MAX_MIRR are 0.
+    """
+    mask = schedule['mask']
+    n = mask.shape[0]
+    lengths = mask.sum(axis=1)
+    lifetime = _per_project(lifetime, n)[:, 0]
+    net = np.where(mask, schedule['net_cash_flow'], 0.0)
+
+    npv = financial_kernels.npv(discount_rate, net)
+    npv = np.where(np.isfinite(npv), npv, 0.0)
+    irr = financial_kernels.irr(net) * 100
+    mirr = financial_kernels.mirr(net, interest_rate, discount_rate, lengths=lengths) * 100
+    mirr = np.where(mirr > MAX_MIRR, 0.0, mirr)
+
+    payback = financial_kernels.payback_period(net, lengths=lengths)
+    payback = np.where(np.isnan(payback), lifetime, payback)
+
+    lcoe = lifetime_lcoe(schedule)
+
+    first = net[:, 0] if net.shape[1] else np.zeros(n)
+    initial_investment = np.where(first < 0, np.abs(first), 1.0)
+    profitability_index = (npv + initial_investment) / initial_investment
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annual_debt_service = schedule['debt_service'].sum(axis=1) / np.maximum(lengths, 1)
+        operating_income = schedule['revenue'].sum(axis=1) - schedule['opex'].sum(axis=1)
+        dscr = np.where(annual_debt_service != 0, operating_income / np.abs(annual_debt_service), 0.0)
+
+    # Rows without any cash flow get neutral defaults
+    empty = ~np.any(net != 0, axis=1)
+    zero = np.zeros(n)
+    return {
+        'npv': np.where(empty, zero, npv),
+        'irr': np.where(empty, zero, irr),
+        'payback_period': np.where(empty, lifetime, payback),
+        'lcoe': np.where(empty, zero, lcoe),
+        'mirr': np.where(empty, zero, mirr),
+        'profitability_index': np.where(empty, zero, profitability_index),
+        'debt_service_coverage_ratio': np.where(empty, zero, dscr),
+    }
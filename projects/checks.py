@@ -0,0 +1,38 @@
+"""
+System checks for the Energy Finance application.
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from . import metrics_cache, single_flight
+
+# Cache backends that are not shared between worker processes
+PROCESS_LOCAL_CACHE_BACKENDS = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+# Caches every worker process must share: alias -> (check id, backend setting, consequence)
+SHARED_CACHES = {
+    single_flight.CACHE_ALIAS: ('projects.W001', 'SINGLE_FLIGHT_CACHE_BACKEND',
+                                "identical requests are only coalesced within one process"),
+    metrics_cache.CACHE_ALIAS: ('projects.W002', 'METRICS_CACHE_BACKEND',
+                                "invalidations in one process leave stale metrics cached in the others"),
+}
+
+
+@register()
+def check_shared_caches(app_configs, **kwargs):
+    """Warn when a cache that coordinates worker processes is local to each process."""
+    warnings = []
+    for alias, (check_id, variable, consequence) in SHARED_CACHES.items():
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend in PROCESS_LOCAL_CACHE_BACKENDS:
+            warnings.append(Warning(
+                f"The {alias} cache uses {backend}, so {consequence}.",
+                hint=f"Point {variable} at a backend shared by the worker processes, e.g. "
+                     "django.core.cache.backends.db.DatabaseCache.",
+                id=check_id,
+            ))
+    return warnings
@@ -0,0 +1,331 @@
+"""
+Offline clear-sky solar resource model, usable in place of PVWatts.
+
+Computes hourly solar position, ASHRAE clear-sky irradiance, optional
+monthly clearness-index calibration (Erbs decomposition), Hay-Davies
+transposition onto fixed, single-axis or dual-axis arrays and a PVWatts
+style DC/AC conversion for a typical 8760 hour year. Every step is a NumPy
+array expression; site inputs broadcast against the hours, so many sites
+can be screened in one pass.
+
+Hours are local standard time, with the time zone taken from the longitude
+unless given.
+"""
+
+import numpy as np
+
+from .hourly_model import DAYS_PER_YEAR, HOURS_PER_DAY, HOURS_PER_YEAR
+from .solar_service import DAYS_PER_MONTH, MONTH_START_HOURS
+
+
+SOLAR_CONSTANT = 1367.0                 # W/m2
+DEFAULT_ALBEDO = 0.2
+DEFAULT_AMBIENT_TEMPERATURE = 20.0      # deg C
+DEFAULT_DC_AC_RATIO = 1.2
+INVERTER_EFFICIENCY = 0.96
+MAX_TRACKER_ANGLE = 45.0                # degrees
+SCREENING_CHUNK_SIZE = 256              # sites per array pass
+
+# PVWatts array_type codes
+FIXED_OPEN_RACK, FIXED_ROOF_MOUNT, ONE_AXIS, ONE_AXIS_BACKTRACKING, TWO_AXIS = range(5)
+
+# Cell temperature rise at 1000 W/m2 by array_type
+CELL_TEMPERATURE_RISE = {
+    FIXED_OPEN_RACK: 31.0,
+    FIXED_ROOF_MOUNT: 45.0,
+    ONE_AXIS: 31.0,
+    ONE_AXIS_BACKTRACKING: 31.0,
+    TWO_AXIS: 31.0,
+}
+
+# Power temperature coefficients (1/deg C) by PVWatts module_type:
+# standard, premium, thin film
+TEMPERATURE_COEFFICIENTS = {0: -0.0037, 1: -0.0035, 2: -0.0032}
+
+_HOURS = np.arange(HOURS_PER_YEAR)
+DAY_OF_YEAR = _HOURS // HOURS_PER_DAY + 1
+HOUR_OF_DAY = _HOURS % HOURS_PER_DAY + 0.5       # mid-hour
+MONTH_OF_HOUR = np.repeat(np.arange(12), DAYS_PER_MONTH * HOURS_PER_DAY)
+
+
+def _site(value):
+    """Site input as an array that broadcasts against the hours."""
+    return np.asarray(value, dtype=float)[..., None]
+
+
+def solar_position(latitude, longitude, utc_offset=None):
+    """
+    Hourly solar position for a typical year.
+
+    Parameters:
+    - latitude, longitude: Site coordinates in degrees (scalars or arrays)
+    - utc_offset: Time zone in hours (default: longitude / 15, rounded)
+
+    Returns: Dictionary of cos_zenith, zenith and azimuth (degrees clockwise
+    from north) and the extraterrestrial normal irradiance, each with the
+    hours as the last axis
+    """
+    lat = np.radians(_site(latitude))
+    lon = _site(longitude)
+    utc_offset = np.round(lon / 15) if utc_offset is None else _site(utc_offset)
+
+    # Spencer series for declination, equation of time and sun-earth distance
+    gamma = 2 * np.pi * (DAY_OF_YEAR - 1 + (HOUR_OF_DAY - 12) / HOURS_PER_DAY) / DAYS_PER_YEAR
+    declination = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+                   - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+                   - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                                 - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    extraterrestrial = SOLAR_CONSTANT * (1.00011 + 0.034221 * np.cos(gamma) + 0.00128 * np.sin(gamma)
+                                         + 0.000719 * np.cos(2 * gamma) + 0.000077 * np.sin(2 * gamma))
+
+    solar_time = HOUR_OF_DAY + (equation_of_time + 4 * lon - 60 * utc_offset) / 60
+    hour_angle = np.radians(15 * (solar_time - 12))
+
+    cos_zenith = np.clip(np.sin(lat) * np.sin(declination)
+                         + np.cos(lat) * np.cos(declination) * np.cos(hour_angle), -1, 1)
+    azimuth = np.degrees(np.arctan2(
+        np.sin(hour_angle), np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat)
+    )) + 180
+    return {
+        'cos_zenith': cos_zenith,
+        'zenith': np.degrees(np.arccos(cos_zenith)),
+        'azimuth': azimuth,
+        'extraterrestrial': np.broadcast_to(extraterrestrial, cos_zenith.shape),
+    }
+
+
+def clear_sky_irradiance(position):
+    """
+    ASHRAE clear-sky beam and diffuse irradiance.
+
+    Parameters:
+    - position: Dictionary returned by solar_position()
+
+    Returns: Dictionary of dni, dhi and ghi in W/m2
+    """
+    cos_zenith = position['cos_zenith']
+    sun_up = cos_zenith > 0
+    season = 2 * np.pi / DAYS_PER_YEAR
+    apparent = 1160 + 75 * np.sin(season * (DAY_OF_YEAR - 275))
+    extinction = 0.174 + 0.035 * np.sin(season * (DAY_OF_YEAR - 100))
+    diffuse_factor = 0.095 + 0.04 * np.sin(season * (DAY_OF_YEAR - 100))
+
+    # Kasten-Young air mass
+    zenith = np.minimum(position['zenith'], 90.0)
+    air_mass = 1 / (np.maximum(cos_zenith, 0) + 0.50572 * (96.07995 - zenith) ** -1.6364)
+
+    dni = np.where(sun_up, apparent * np.exp(-extinction * air_mass), 0.0)
+    dhi = diffuse_factor * dni
+    return {'dni': dni, 'dhi': dhi, 'ghi': dni * np.maximum(cos_zenith, 0) + dhi}
+
+
+def calibrate(irradiance, position, clearness_index):
+    """
+    Scale clear-sky irradiance to monthly mean clearness indices.
+
+    Global irradiance is scaled per month so that its ratio to the
+    extraterrestrial horizontal irradiance matches the target, then split
+    into beam and diffuse with the Erbs correlation.
+
+    Parameters:
+    - irradiance: Dictionary returned by clear_sky_irradiance()
+    - position: Dictionary returned by solar_position()
+    - clearness_index: 12 monthly mean clearness indices (0-1), per site
+      along the first axis when screening several sites
+
+    Returns: Dictionary of dni, dhi and ghi in W/m2
+    """
+    target = np.asarray(clearness_index, dtype=float)
+    if target.shape[-1:] != (12,):
+        raise ValueError("clearness_index needs 12 monthly values")
+    cos_zenith = np.maximum(position['cos_zenith'], 0)
+    horizontal = position['extraterrestrial'] * cos_zenith
+
+    monthly_ghi = np.add.reduceat(irradiance['ghi'], MONTH_START_HOURS, axis=-1)
+    monthly_horizontal = np.add.reduceat(horizontal, MONTH_START_HOURS, axis=-1)
+    scale = target / np.where(monthly_horizontal > 0, monthly_ghi / monthly_horizontal, 1.0)
+    ghi = irradiance['ghi'] * np.take(scale, MONTH_OF_HOUR, axis=-1)
+
+    kt = np.clip(np.divide(ghi, horizontal, out=np.zeros_like(ghi), where=horizontal > 0), 0, 1)
+    diffuse_fraction = np.select(
+        [kt <= 0.22, kt <= 0.8],
+        [1 - 0.09 * kt, 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4],
+        0.165
+    )
+    dhi = ghi * diffuse_fraction
+    dni = np.divide(ghi - dhi, cos_zenith, out=np.zeros_like(ghi), where=cos_zenith > 0.0175)
+    return {'dni': np.minimum(dni, position['extraterrestrial']), 'dhi': dhi, 'ghi': ghi}
+
+
+def array_orientation(position, tilt, azimuth, array_type=FIXED_OPEN_RACK):
+    """
+    Surface tilt and azimuth of the array for every hour.
+
+    Single-axis trackers rotate about a horizontal axis along the given
+    azimuth's north-south line, up to MAX_TRACKER_ANGLE; backtracking is not
+    modelled. Dual-axis trackers face the sun.
+
+    Returns: (surface tilt, surface azimuth) in degrees
+    """
+    if array_type in (ONE_AXIS, ONE_AXIS_BACKTRACKING):
+        zenith = np.radians(position['zenith'])
+        axis_azimuth = _site(azimuth) % 180
+        relative = np.radians(position['azimuth'] - axis_azimuth)
+        rotation = np.degrees(np.arctan2(np.sin(zenith) * np.sin(relative), np.cos(zenith)))
+        rotation = np.clip(rotation, -MAX_TRACKER_ANGLE, MAX_TRACKER_ANGLE)
+        return np.abs(rotation), np.where(rotation >= 0, axis_azimuth + 90, axis_azimuth - 90)
+    if array_type == TWO_AXIS:
+        return np.minimum(position['zenith'], 90.0), position['azimuth']
+    return _site(tilt), _site(azimuth)
+
+
+def plane_of_array(irradiance, position, surface_tilt, surface_azimuth, albedo=DEFAULT_ALBEDO):
+    """
+    Hay-Davies transposition of beam, sky diffuse and ground-reflected irradiance.
+
+    Returns: Dictionary of poa, poa_beam and poa_diffuse in W/m2
+    """
+    tilt = np.radians(surface_tilt)
+    cos_zenith = position['cos_zenith']
+    sin_zenith = np.sqrt(1 - cos_zenith ** 2)
+    cos_incidence = np.maximum(
+        cos_zenith * np.cos(tilt)
+        + sin_zenith * np.sin(tilt) * np.cos(np.radians(position['azimuth'] - surface_azimuth)), 0
+    )
+    beam = irradiance['dni'] * cos_incidence * (cos_zenith > 0)
+
+    anisotropy = irradiance['dni'] / position['extraterrestrial']
+    ratio = cos_incidence / np.maximum(cos_zenith, 0.01745)
+    sky = irradiance['dhi'] * (anisotropy * ratio + (1 - anisotropy) * (1 + np.cos(tilt)) / 2)
+    ground = irradiance['ghi'] * albedo * (1 - np.cos(tilt)) / 2
+    return {'poa': beam + sky + ground, 'poa_beam': beam, 'poa_diffuse': sky + ground}
+
+
+def simulate(latitude, longitude, system_capacity=1, tilt=None, azimuth=None, array_type=FIXED_OPEN_RACK,
+             module_type=0, losses=14.0, dc_ac_ratio=DEFAULT_DC_AC_RATIO, clearness_index=None,
+             albedo=DEFAULT_ALBEDO, ambient_temperature=DEFAULT_AMBIENT_TEMPERATURE, utc_offset=None):
+    """
+    Hourly irradiance and output of a PV system for a typical year.
+
+    Parameters:
+    - latitude, longitude: Site coordinates in degrees (scalars or arrays)
+    - system_capacity: DC capacity in kW
+    - tilt: Array tilt in degrees (default: the absolute latitude)
+    - azimuth: Array azimuth in degrees clockwise from north, or the tracker
+      axis azimuth (default: facing the equator)
+    - array_type: PVWatts array type (0 fixed open rack, 1 fixed roof mount,
+      2 one-axis, 3 one-axis backtracking, 4 two-axis)
+    - module_type: PVWatts module type (0 standard, 1 premium, 2 thin film)
+    - losses: System losses in percent
+    - dc_ac_ratio: DC to AC capacity ratio; AC output is clipped at the
+      inverter rating
+    - clearness_index: Optional 12 monthly mean clearness indices to
+      calibrate the clear-sky irradiance to a site's climate
+    - albedo: Ground reflectance
+    - ambient_temperature: Ambient temperature in deg C for cell temperature
+    - utc_offset: Time zone in hours (default: from the longitude)
+
+    Returns: Dictionary of hourly arrays (dni, dhi, ghi, poa in W/m2; dc and
+    ac in W) with the hours as the last axis
+    """
+    if array_type not in CELL_TEMPERATURE_RISE:
+        raise ValueError(f"Unknown array_type: {array_type}")
+    if module_type not in TEMPERATURE_COEFFICIENTS:
+        raise ValueError(f"Unknown module_type: {module_type}")
+    tilt = np.abs(latitude) if tilt is None else tilt
+    azimuth = np.where(np.asarray(latitude) < 0, 0.0, 180.0) if azimuth is None else azimuth
+
+    position = solar_position(latitude, longitude, utc_offset)
+    irradiance = clear_sky_irradiance(position)
+    if clearness_index is not None:
+        irradiance = calibrate(irradiance, position, clearness_index)
+    surface_tilt, surface_azimuth = array_orientation(position, tilt, azimuth, array_type)
+    poa = plane_of_array(irradiance, position, surface_tilt, surface_azimuth, albedo)['poa']
+
+    capacity = _site(system_capacity) * 1000            # W
+    cell_temperature = ambient_temperature + poa / 1000 * CELL_TEMPERATURE_RISE[array_type]
+    temperature_factor = 1 + TEMPERATURE_COEFFICIENTS[module_type] * (cell_temperature - 25)
+    dc = capacity * poa / 1000 * temperature_factor * (1 - _site(losses) / 100)
+    ac = np.minimum(dc * INVERTER_EFFICIENCY, capacity / _site(dc_ac_ratio))
+    return dict(irradiance, poa=poa, dc=dc, ac=ac)
+
+
+def pvwatts_response(params, clearness_index=None, **options):
+    """
+    PVWatts v8 style response computed offline.
+
+    Usable as the fetcher of SolarRadiationService, so every consumer of
+    PVWatts responses works without the NREL API.
+
+    Parameters:
+    - params: Request parameters from pvwatts_cache.request_params()
+    - clearness_index: Optional 12 monthly mean clearness indices
+    - options: Further simulate() arguments
+
+    Returns: Dictionary with inputs, station_info and outputs
+    """
+    capacity = params.get('system_capacity', 1)
+    result = simulate(
+        params['lat'], params['lon'], system_capacity=capacity, tilt=params.get('tilt'),
+        azimuth=params.get('azimuth', 180), array_type=int(params.get('array_type', FIXED_ROOF_MOUNT)),
+        module_type=int(params.get('module_type', 0)), losses=params.get('losses', 14.0),
+        clearness_index=clearness_index, **options
+    )
+    ac_monthly = np.add.reduceat(result['ac'], MONTH_START_HOURS) / 1000
+    poa_monthly = np.add.reduceat(result['poa'], MONTH_START_HOURS) / 1000
+    solrad_monthly = poa_monthly / DAYS_PER_MONTH
+    ac_annual = float(ac_monthly.sum())
+    return {
+        'inputs': dict(params),
+        'errors': [],
+        'warnings': [],
+        'station_info': {
+            'lat': params['lat'],
+            'lon': params['lon'],
+            'solar_resource_data': 'clear_sky' if clearness_index is None else 'clear_sky_calibrated',
+        },
+        'outputs': {
+            'ac': result['ac'].tolist(),
+            'dc': result['dc'].tolist(),
+            'poa': result['poa'].tolist(),
+            'dn': result['dni'].tolist(),
+            'df': result['dhi'].tolist(),
+            'ac_monthly': ac_monthly.tolist(),
+            'poa_monthly': poa_monthly.tolist(),
+            'solrad_monthly': solrad_monthly.tolist(),
+            'ac_annual': ac_annual,
+            'solrad_annual': float(poa_monthly.sum() / DAYS_PER_YEAR),
+            'capacity_factor': ac_annual / (capacity * HOURS_PER_YEAR) * 100,
+        },
+    }
+
+
+def screen_sites(latitudes, longitudes, chunk_size=SCREENING_CHUNK_SIZE, **options):
+    """
+    Annual yield of a 1 kW system at many sites.
+
+    Parameters:
+    - latitudes, longitudes: Arrays of site coordinates
+    - chunk_size: Sites per array pass, bounding memory use
+    - options: Further simulate() arguments; arrays with one value (or one
+      row of 12 clearness indices) per site are sliced with the sites
+
+    Returns: Dictionary of annual_energy (kWh/kW) and capacity_factor (%) arrays
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    per_site = {
+        name for name, value in options.items()
+        if np.ndim(value) == (2 if name == 'clearness_index' else 1) and len(value) == latitudes.size
+    }
+    energy = np.empty(latitudes.size)
+    for start in range(0, latitudes.size, chunk_size):
+        stop = start + chunk_size
+        chunk_options = {
+            name: np.asarray(value)[start:stop] if name in per_site else value
+            for name, value in options.items()
+        }
+        ac = simulate(latitudes[start:stop], longitudes[start:stop], **chunk_options)['ac']
+        energy[start:stop] = ac.sum(axis=-1) / 1000
+    return {'annual_energy': energy, 'capacity_factor': energy / HOURS_PER_YEAR * 100}
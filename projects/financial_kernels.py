@@ -0,0 +1,281 @@
+"""
+Vectorized financial kernels for the Energy Finance application.
+Pure NumPy implementations of NPV, IRR, MIRR, payback and LCOE that work on a
+single cash flow vector or on a (projects x years) matrix at once.
+
+Cash flows follow the numpy-financial convention: the first column is period 0
+and is not discounted. Shorter vectors can be zero-padded on the right; pass
+their true lengths where a kernel depends on the number of periods.
+"""
+
+import numpy as np
+
+
+# Candidate rates used to bracket the IRR before refining it
+IRR_BRACKET_RATES = np.array([
+    -0.99, -0.9, -0.75, -0.5, -0.3, -0.2, -0.1, -0.05, 0.0, 0.025, 0.05, 0.075,
+    0.1, 0.125, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0
+])
+
+
+def _as_matrix(cash_flows):
+    """Return cash flows as a 2-D float array and whether the input was 1-D."""
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    if cash_flows.ndim == 1:
+        return cash_flows[None, :], True
+    return cash_flows, False
+
+
+def _per_row(value, n):
+    """Broadcast a scalar or per-row sequence to a 1-D array of length n."""
+    return np.broadcast_to(np.asarray(value, dtype=float).reshape(-1), (n,)).astype(float)
+
+
+def _lengths(lengths, cash_flows):
+    """Number of periods in each row (defaults to the full width)."""
+    if lengths is None:
+        return np.full(cash_flows.shape[0], cash_flows.shape[1], dtype=int)
+    return _per_row(lengths, cash_flows.shape[0]).astype(int)
+
+
+def _result(values, squeeze):
+    return values[0] if squeeze else values
+
+
+def _horner(cash_flows, v):
+    """
+    Evaluate sum(c_t * v**t) and its derivative with respect to v per row.
+
+    Horner's scheme keeps the cost at a handful of vector operations per
+    period instead of a power per element.
+    """
+    value = np.zeros(cash_flows.shape[0])
+    derivative = np.zeros(cash_flows.shape[0])
+    for t in range(cash_flows.shape[1] - 1, -1, -1):
+        derivative = derivative * v + value
+        value = value * v + cash_flows[:, t]
+    return value, derivative
+
+
+def npv(rate, cash_flows):
+    """
+    Net present value of one or many cash flow vectors.
+
+    Parameters:
+    - rate: Discount rate, scalar or one value per row
+    - cash_flows: 1-D vector or (rows x periods) matrix
+
+    Returns: Float for 1-D input, otherwise an array with one NPV per row
+    """
+    cash_flows, squeeze = _as_matrix(cash_flows)
+    rate = _per_row(rate, cash_flows.shape[0])
+    value, _ = _horner(cash_flows, 1 / (1 + rate))
+    return _result(value, squeeze)
+
+
+def npv_grid(rates, cash_flows):
+    """
+    Net present value of every row at every rate in a 1-D sequence of rates.
+
+    Returns: (rows x rates) array
+    """
+    cash_flows, _ = _as_matrix(cash_flows)
+    rates = np.asarray(rates, dtype=float).reshape(-1)
+    periods = np.arange(cash_flows.shape[1])
+    factors = (1 + rates[None, :]) ** -periods[:, None]
+    return cash_flows @ factors
+
+
+def irr(cash_flows, tol=1e-10, max_iter=100, full_output=False):
+    """
+    Internal rate of return of one or many cash flow vectors.
+
+    The root is bracketed on a fixed ladder of rates between -99% and 1000%,
+    picking the sign change closest to zero when there are several, and then
+    refined with Newton steps that fall back to bisection whenever a step
+    would leave the bracket.
+
+    Parameters:
+    - cash_flows: 1-D vector or (rows x periods) matrix
+    - tol: Convergence tolerance on the rate
+    - max_iter: Maximum number of refinement iterations
+    - full_output: Also return a boolean array flagging converged rows
+
+    Returns: IRR as a fraction, NaN where no root exists in the bracket or the
+    solver did not converge. With full_output, a (rates, converged) tuple.
+    """
+    cash_flows, squeeze = _as_matrix(cash_flows)
+    n = cash_flows.shape[0]
+    rates = np.full(n, np.nan)
+    converged = np.zeros(n, dtype=bool)
+
+    # Bracket the root on the rate ladder
+    ladder = npv_grid(IRR_BRACKET_RATES, cash_flows)
+    exact = ladder == 0
+    sign_change = (np.sign(ladder[:, :-1]) * np.sign(ladder[:, 1:])) < 0
+    midpoints = (IRR_BRACKET_RATES[:-1] + IRR_BRACKET_RATES[1:]) / 2
+    distance = np.where(sign_change, np.abs(midpoints), np.inf)
+    bracket = np.argmin(distance, axis=1)
+    has_bracket = np.isfinite(distance[np.arange(n), bracket])
+
+    # Rates that are exact roots on the ladder need no refinement; all-zero
+    # rows have a root everywhere and therefore no IRR
+    degenerate = ~np.any(cash_flows != 0, axis=1)
+    has_bracket &= ~degenerate
+    exact &= ~degenerate[:, None]
+    exact_distance = np.where(exact, np.abs(IRR_BRACKET_RATES), np.inf)
+    exact_index = np.argmin(exact_distance, axis=1)
+    has_exact = np.isfinite(exact_distance[np.arange(n), exact_index])
+    rates[has_exact] = IRR_BRACKET_RATES[exact_index[has_exact]]
+    converged[has_exact] = True
+
+    active = np.flatnonzero(has_bracket & ~has_exact)
+    if active.size:
+        lo = IRR_BRACKET_RATES[bracket[active]]
+        hi = IRR_BRACKET_RATES[bracket[active] + 1]
+        f_lo = ladder[active, bracket[active]]
+        f_hi = ladder[active, bracket[active] + 1]
+        flows = cash_flows[active]
+
+        # Start from the secant between the bracket ends
+        x = lo - f_lo * (hi - lo) / (f_hi - f_lo)
+        done = np.zeros(active.size, dtype=bool)
+
+        for _ in range(max_iter):
+            todo = np.flatnonzero(~done)
+            if not todo.size:
+                break
+
+            xt = x[todo]
+            v = 1 / (1 + xt)
+            f, dfdv = _horner(flows[todo], v)
+            dfdx = -dfdv * v * v
+
+            # Shrink the bracket around the root
+            same_side = np.sign(f) == np.sign(f_lo[todo])
+            lo[todo] = np.where(same_side, xt, lo[todo])
+            f_lo[todo] = np.where(same_side, f, f_lo[todo])
+            hi[todo] = np.where(same_side, hi[todo], xt)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                step = f / dfdx
+            x_new = xt - step
+            outside = ~np.isfinite(x_new) | (x_new <= lo[todo]) | (x_new >= hi[todo])
+            x_new = np.where(outside, (lo[todo] + hi[todo]) / 2, x_new)
+
+            finished = (f == 0) | (np.abs(x_new - xt) <= tol * (1 + np.abs(xt))) | \
+                       (hi[todo] - lo[todo] <= tol)
+            x[todo] = np.where(f == 0, xt, x_new)
+            done[todo] = finished
+
+        rates[active[done]] = x[done]
+        converged[active[done]] = True
+
+    if full_output:
+        return _result(rates, squeeze), _result(converged, squeeze)
+    return _result(rates, squeeze)
+
+
+def mirr(cash_flows, finance_rate, reinvest_rate, lengths=None):
+    """
+    Modified internal rate of return of one or many cash flow vectors.
+
+    Parameters:
+    - cash_flows: 1-D vector or (rows x periods) matrix
+    - finance_rate: Rate paid on negative cash flows, scalar or per row
+    - reinvest_rate: Rate earned on positive cash flows, scalar or per row
+    - lengths: Number of periods in each row when rows are zero-padded
+
+    Returns: MIRR as a fraction, NaN where it is undefined (no positive or
+    no negative cash flows)
+    """
+    cash_flows, squeeze = _as_matrix(cash_flows)
+    n = cash_flows.shape[0]
+    finance_rate = _per_row(finance_rate, n)
+    reinvest_rate = _per_row(reinvest_rate, n)
+    periods = _lengths(lengths, cash_flows) - 1
+
+    positive = np.where(cash_flows > 0, cash_flows, 0.0)
+    negative = np.where(cash_flows < 0, cash_flows, 0.0)
+    pv_negative, _ = _horner(negative, 1 / (1 + finance_rate))
+    pv_positive, _ = _horner(positive, 1 / (1 + reinvest_rate))
+    fv_positive = pv_positive * (1 + reinvest_rate) ** periods
+
+    valid = (pv_negative < 0) & (fv_positive > 0) & (periods > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = (fv_positive / -pv_negative) ** (1 / np.where(valid, periods, 1)) - 1
+    return _result(np.where(valid, result, np.nan), squeeze)
+
+
+def payback_period(cash_flows, lengths=None):
+    """
+    Simple payback period with linear interpolation inside the payback year.
+
+    A row pays back at the first period where the cumulative cash flow turns
+    positive, provided it is still positive at the end of the row.
+
+    Parameters:
+    - cash_flows: 1-D vector or (rows x periods) matrix
+    - lengths: Number of periods in each row when rows are zero-padded
+
+    Returns: Payback in years, NaN for rows that never pay back
+    """
+    cash_flows, squeeze = _as_matrix(cash_flows)
+    n, width = cash_flows.shape
+    lengths = _lengths(lengths, cash_flows)
+    cumulative = np.cumsum(cash_flows, axis=1)
+    rows = np.arange(n)
+
+    in_range = np.arange(width)[None, :] < lengths[:, None]
+    positive = (cumulative > 0) & in_range
+    first = np.argmax(positive, axis=1)
+    final = cumulative[rows, np.maximum(lengths - 1, 0)]
+    pays_back = positive.any(axis=1) & (final > 0) & (lengths > 0)
+
+    previous = cumulative[rows, np.maximum(first - 1, 0)]
+    current = cumulative[rows, first]
+    gap = current - previous
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(gap != 0, -previous / gap, 0.0)
+    period = np.where(first > 0, first - 1 + fraction, first)
+    return _result(np.where(pays_back, period, np.nan), squeeze)
+
+
+def discounted_payback_period(rate, cash_flows, lengths=None):
+    """
+    Payback period of the discounted cash flows.
+
+    Parameters:
+    - rate: Discount rate, scalar or one value per row
+    - cash_flows: 1-D vector or (rows x periods) matrix
+    - lengths: Number of periods in each row when rows are zero-padded
+
+    Returns: Discounted payback in years, NaN for rows that never pay back
+    """
+    cash_flows, squeeze = _as_matrix(cash_flows)
+    rate = _per_row(rate, cash_flows.shape[0])
+    periods = np.arange(cash_flows.shape[1])
+    discounted = cash_flows * (1 + rate[:, None]) ** -periods[None, :]
+    return _result(payback_period(discounted, lengths), squeeze)
+
+
+def lcoe(costs, energy, rate=0.0):
+    """
+    Levelized cost of energy.
+
+    Parameters:
+    - costs: Costs per period, 1-D vector or (rows x periods) matrix
+    - energy: Energy per period with the same shape as costs
+    - rate: Discount rate, scalar or one value per row (0 for undiscounted)
+
+    Returns: Discounted costs divided by discounted energy, NaN where there is
+    no energy
+    """
+    costs, squeeze = _as_matrix(costs)
+    energy, _ = _as_matrix(energy)
+    v = 1 / (1 + _per_row(rate, costs.shape[0]))
+    pv_costs, _ = _horner(costs, v)
+    pv_energy, _ = _horner(energy, v)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(pv_energy > 0, pv_costs / pv_energy, np.nan)
+    return _result(result, squeeze)
@@ -246,6 +246,11 @@ class ProjectImportForm(forms.Form):
         label="Import File",
         help_text="Select an Excel or CSV file with project data."
     )
+    background = forms.BooleanField(
+        required=False,
+        label="Import in the background",
+        help_text="Recommended for large files; the import runs as a background job."
+    )
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -254,6 +259,7 @@ class ProjectImportForm(forms.Form):
         self.helper.form_enctype = 'multipart/form-data'
         self.helper.layout = Layout(
             'file',
+            'background',
             Div(
                 Submit('submit', 'Import Project', css_class='btn btn-primary'),
                 HTML('<a href="{% url \'projects:project_list\' %}" class="btn btn-secondary ms-3">Cancel</a>'),
@@ -0,0 +1,213 @@
+"""
+Goal seek for the Energy Finance application.
+Finds the PPA price, maximum CAPEX or minimum capacity factor at which a
+project reaches a target NPV or IRR.
+
+Every row (a project, or one bid on a project) is solved at the same time: each
+iteration is a single build_cash_flow_matrix() pass over all rows, refined by
+a vectorized Illinois (modified regula falsi) step inside a per-row bracket.
+"""
+
+import numpy as np
+
+from . import financial_kernels
+from .cash_flow_engine import PPA_FIELDS, add_hourly_overrides, build_cash_flow_matrix, load_cash_flow_inputs, load_ppa_terms
+from .models import Project
+
+
+GOAL_SEEK_METRICS = ['npv', 'irr']
+
+# Default search brackets. CAPEX brackets are multiples of each row's current
+# CAPEX; the others are absolute values.
+GOAL_SEEK_BOUNDS = {
+    'ppa_price': (0.0, 1000.0),
+    'capex': (0.0, 10.0),
+    'capacity_factor': (0.001, 1.0),
+}
+
+# IRR (%) used for cash flows that never recover their investment
+UNDEFINED_IRR = -100.0
+
+# Rates a bid may override, with their defaults
+BID_RATE_DEFAULTS = {
+    'discount_rate': 0.08,
+    'inflation_rate': 0.025,
+    'debt_ratio': 0.7,
+    'interest_rate': 0.05,
+}
+
+MAX_GOAL_SEEK_BIDS = 5000
+
+
+def _apply(inputs, ppa, variable, values):
+    """Inputs and PPA terms with the sought variable set to values (one per row)."""
+    if variable == 'ppa_price':
+        return inputs, dict(ppa, ppa_price=values)
+
+    inputs = dict(inputs, **{variable: values})
+    if variable == 'capacity_factor' and 'energy' in inputs:
+        # Hourly energy scales with the capacity factor it was simulated for
+        ratio = values / np.where(inputs['base_capacity_factor'] > 0, inputs['base_capacity_factor'], 1.0)
+        inputs['energy'] = inputs['energy'] * ratio[:, None]
+    return inputs, ppa
+
+
+def _objective(inputs, ppa, variable, values, metric, target, rates):
+    """Metric minus target for every row at the given variable values."""
+    row_inputs, row_ppa = _apply(inputs, ppa, variable, values)
+    schedule = build_cash_flow_matrix(
+        row_inputs,
+        inflation_rate=rates['inflation_rate'],
+        debt_ratio=rates['debt_ratio'],
+        interest_rate=rates['interest_rate'],
+        **row_ppa
+    )
+    net = np.where(schedule['mask'], schedule['net_cash_flow'], 0.0)
+    if metric == 'npv':
+        achieved = financial_kernels.npv(rates['discount_rate'], net)
+    else:
+        achieved = financial_kernels.irr(net) * 100
+        achieved = np.where(np.isnan(achieved), UNDEFINED_IRR, achieved)
+    return achieved - target, achieved
+
+
+def goal_seek(inputs, variable, metric='npv', target=0.0, discount_rate=0.08, inflation_rate=0.025,
+              debt_ratio=0.7, interest_rate=0.05, ppa_price=None, ppa_escalation=None, ppa_term=None,
+              bounds=None, tolerance=1e-6, max_iterations=100):
+    """
+    Solve for the value of one input that makes a metric hit its target.
+
+    Parameters:
+    - inputs: Dictionary of input arrays, one row per project or bid
+    - variable: 'ppa_price', 'capex' or 'capacity_factor'
+    - metric: 'npv' or 'irr' (IRR targets are in %)
+    - target: Target metric value, scalar or one per row (default NPV = 0)
+    - discount_rate, inflation_rate, debt_ratio, interest_rate: Rates, scalar or one per row
+    - ppa_price, ppa_escalation, ppa_term: PPA terms as for build_cash_flow_matrix();
+      ppa_price is ignored when it is the sought variable
+    - bounds: (low, high) search bracket, default from GOAL_SEEK_BOUNDS
+    - tolerance: Relative tolerance on the solved value
+    - max_iterations: Maximum number of engine passes after the bracket
+
+    Returns: Dictionary of per-row arrays: 'value' (NaN where the target is
+    not reachable within the bracket), 'achieved' metric, 'converged' and
+    'iterations'
+    """
+    if variable not in GOAL_SEEK_BOUNDS:
+        raise ValueError(f"variable must be one of {', '.join(GOAL_SEEK_BOUNDS)}")
+    if metric not in GOAL_SEEK_METRICS:
+        raise ValueError(f"metric must be one of {', '.join(GOAL_SEEK_METRICS)}")
+
+    n = len(inputs['lifetime'])
+    rates = {
+        name: np.broadcast_to(np.asarray(value, dtype=float), n)
+        for name, value in [('discount_rate', discount_rate), ('inflation_rate', inflation_rate),
+                            ('debt_ratio', debt_ratio), ('interest_rate', interest_rate)]
+    }
+    target = np.broadcast_to(np.asarray(target, dtype=float), n)
+    ppa = {'ppa_price': ppa_price, 'ppa_escalation': ppa_escalation, 'ppa_term': ppa_term}
+    if variable == 'capacity_factor':
+        inputs = dict(inputs, base_capacity_factor=inputs['capacity_factor'])
+
+    low, high = bounds or GOAL_SEEK_BOUNDS[variable]
+    low = np.full(n, float(low))
+    high = np.full(n, float(high))
+    if variable == 'capex' and not bounds:
+        low, high = low * inputs['capex'], high * inputs['capex']
+
+    f_low, _ = _objective(inputs, ppa, variable, low, metric, target, rates)
+    f_high, _ = _objective(inputs, ppa, variable, high, metric, target, rates)
+    solvable = np.sign(f_low) != np.sign(f_high)
+    exact_low = f_low == 0
+
+    # Rows converge once the bracket or the residual is small enough
+    x = np.where(exact_low, low, (low + high) / 2)
+    f_scale = np.maximum(np.abs(f_low), np.abs(f_high)) * 1e-12
+    active = solvable & ~exact_low
+    iterations = np.zeros(n, dtype=int)
+    side = np.zeros(n, dtype=int)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+
+        # Regula falsi step, bisection where it is undefined
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = (low * f_high - high * f_low) / (f_high - f_low)
+        step = np.where(np.isfinite(step) & (step > low) & (step < high), step, (low + high) / 2)
+        x = np.where(active, step, x)
+
+        f_x, _ = _objective(inputs, ppa, variable, x, metric, target, rates)
+        iterations += active
+
+        # Keep the root bracketed; halve the retained end's value when the same
+        # end moves twice in a row (Illinois modification)
+        same_as_low = np.sign(f_x) == np.sign(f_low)
+        move_low = active & same_as_low
+        move_high = active & ~same_as_low
+        f_high = np.where(move_low & (side == -1), f_high / 2, f_high)
+        f_low = np.where(move_high & (side == 1), f_low / 2, f_low)
+        low, f_low = np.where(move_low, x, low), np.where(move_low, f_x, f_low)
+        high, f_high = np.where(move_high, x, high), np.where(move_high, f_x, f_high)
+        side = np.where(move_low, -1, np.where(move_high, 1, side))
+
+        done = (np.abs(f_x) <= f_scale) | (high - low <= tolerance * np.maximum(np.abs(x), 1.0))
+        active &= ~done
+
+    _, achieved = _objective(inputs, ppa, variable, x, metric, target, rates)
+    return {
+        'value': np.where(solvable | exact_low, x, np.nan),
+        'achieved': np.where(solvable | exact_low, achieved, np.nan),
+        'converged': (solvable | exact_low) & ~active,
+        'iterations': iterations,
+    }
+
+
+def goal_seek_bids(bids, variable, metric='npv', target=0.0, **defaults):
+    """
+    Goal seek many bids at once, each on a stored project.
+
+    Several bids may refer to the same project with different terms. Each
+    bid's values take precedence over the shared defaults; PPA terms given
+    in neither come from the project's stored FinancialMetric.
+
+    Parameters:
+    - bids: Sequence of dictionaries with a 'project_id' and optional
+      'target', BID_RATE_DEFAULTS and PPA_FIELDS entries
+    - variable, metric: As for goal_seek()
+    - target: Default target for bids without one
+    - defaults: Shared rates and PPA terms
+
+    Returns: Dictionary as returned by goal_seek(), plus 'project_id', one
+    entry per bid in order
+    """
+    if len(bids) > MAX_GOAL_SEEK_BIDS:
+        raise ValueError(f"At most {MAX_GOAL_SEEK_BIDS} bids are supported per request")
+
+    if any('project_id' not in bid for bid in bids):
+        raise ValueError("Every bid needs a project_id")
+    bid_project_ids = [int(bid['project_id']) for bid in bids]
+    project_ids, inputs = load_cash_flow_inputs(Project.objects.filter(pk__in=set(bid_project_ids)))
+    missing = set(bid_project_ids) - set(project_ids.tolist())
+    if missing:
+        raise ValueError(f"Unknown project ids: {', '.join(str(pk) for pk in sorted(missing))}")
+    inputs = add_hourly_overrides(project_ids.tolist(), inputs)
+
+    # One input row per bid
+    index = {project_id: i for i, project_id in enumerate(project_ids.tolist())}
+    rows = np.array([index[project_id] for project_id in bid_project_ids], dtype=int)
+    inputs = {name: values[rows] for name, values in inputs.items()}
+
+    def column(name, fallback):
+        return np.array([
+            bid.get(name, defaults.get(name, fallback[i])) for i, bid in enumerate(bids)
+        ], dtype=float)
+
+    stored = {name: values[rows] for name, values in load_ppa_terms(project_ids).items()}
+    rates = {name: column(name, [value] * len(bids)) for name, value in BID_RATE_DEFAULTS.items()}
+    ppa = {name: column(name, stored[name]) for name in PPA_FIELDS}
+    targets = np.array([bid.get('target', target) for bid in bids], dtype=float)
+
+    result = goal_seek(inputs, variable, metric=metric, target=targets, **rates, **ppa)
+    result['project_id'] = np.array(bid_project_ids, dtype=int)
+    return result
@@ -0,0 +1,405 @@
+"""
+Database-backed background job queue.
+
+Jobs are Job rows naming a registered handler and its JSON parameters.
+Worker processes started by the run_jobs management command claim queued
+jobs with a conditional UPDATE, so several workers never run the same job
+and no broker is needed. While a handler runs, a background thread refreshes
+the job's heartbeat; jobs whose worker stops heartbeating are queued again,
+and a worker that lost its job that way does not overwrite the new attempt.
+Failed attempts are retried with exponential backoff, except for errors
+that retrying cannot fix (JobError, ValueError, TypeError, missing objects).
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+import numpy as np
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.storage import default_storage
+from django.db import connection, DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job, Project, SolarProject
+from .utils import (calculate_financial_metrics, calculate_portfolio_metrics, calculate_risk_scores, filter_projects,
+                    get_project_with_solar, import_project_from_file, PORTFOLIO_PPA_TERMS, PORTFOLIO_RATE_DEFAULTS)
+
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 30.0                    # seconds, doubled per failed attempt
+STALE_TIMEOUT = 600.0                   # seconds without a heartbeat before a running job is requeued
+POLL_INTERVAL = 1.0
+PROGRESS_INTERVAL = 0.5                 # minimum seconds between progress writes
+HEARTBEAT_INTERVAL = 60.0               # seconds between heartbeats while a handler runs
+CLAIM_CANDIDATES = 10
+
+UPLOAD_DIR = 'job_uploads'
+
+METRIC_RESPONSE_FIELDS = ['npv', 'irr', 'payback_period', 'lcoe', 'mirr', 'profitability_index',
+                          'debt_service_coverage_ratio']
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """Raised by a handler to fail its job without retrying"""
+
+
+PERMANENT_ERRORS = (JobError, ValueError, TypeError, ObjectDoesNotExist)
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register a function taking (params, progress) as the handler of a job kind."""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+class JobProgress:
+    """Progress callback passed to handlers; writes are throttled to PROGRESS_INTERVAL"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last_write = 0.0
+
+    def __call__(self, fraction, message=''):
+        now = time.monotonic()
+        if now - self.last_write < PROGRESS_INTERVAL and fraction < 1:
+            return
+        self.last_write = now
+        Job.objects.filter(pk=self.job_id).update(
+            progress=min(max(float(fraction), 0.0), 1.0), message=message[:255], heartbeat_at=timezone.now()
+        )
+
+
+class Heartbeat:
+    """Context manager refreshing a running job's heartbeat from a background thread"""
+
+    def __init__(self, job, interval=None):
+        self.job_id = job.pk
+        self.worker = job.worker
+        self.interval = HEARTBEAT_INTERVAL if interval is None else interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"job-{job.pk}-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def beat(self):
+        """Refresh the heartbeat; False once the job is no longer this worker's."""
+        return bool(Job.objects.filter(pk=self.job_id, status=Job.RUNNING, worker=self.worker)
+                    .update(heartbeat_at=timezone.now()))
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    if not self.beat():
+                        break
+                except DatabaseError:
+                    logger.exception("Could not refresh the heartbeat of job %s", self.job_id)
+        finally:
+            connection.close()
+
+
+def submit(kind, params=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Queue a job.
+
+    Parameters:
+    - kind: Registered handler name
+    - params: JSON-serializable parameters passed to the handler
+    - max_attempts: Attempts before the job is marked failed
+
+    Returns: The new Job
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}. Must be one of {', '.join(sorted(JOB_HANDLERS))}")
+    return Job.objects.create(kind=kind, params=params or {}, max_attempts=max(int(max_attempts), 1))
+
+
+def job_status(job):
+    """JSON-serializable state of a job for the polling API."""
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else None,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def claim(worker):
+    """
+    Mark the next due queued job as running for a worker.
+
+    Returns: The claimed Job, or None when none is due
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'pk')
+    for pk in candidates.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        # Only one worker's UPDATE matches while the job is still queued
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1, started_at=now, heartbeat_at=now,
+            progress=0, message=''
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """
+    Run a claimed job's handler and record its result, retry or failure.
+
+    The outcome is only written while the job is still running under this
+    worker; a job requeued as stale in the meantime is left to its new attempt.
+
+    Returns: The updated Job
+    """
+    handler = JOB_HANDLERS.get(job.kind)
+    worker = job.worker
+    try:
+        if handler is None:
+            raise JobError(f"No handler registered for job kind {job.kind}")
+        with Heartbeat(job):
+            result = handler(job.params, JobProgress(job.pk))
+    except Exception as e:
+        job.error = traceback.format_exc()
+        job.worker = ''
+        if isinstance(e, PERMANENT_ERRORS) or job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BACKOFF * 2 ** (job.attempts - 1))
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.progress = 1.0
+        job.error = ''
+        job.finished_at = timezone.now()
+
+    fields = ['status', 'result', 'progress', 'error', 'worker', 'run_after', 'finished_at']
+    updated = Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=worker).update(
+        **{name: getattr(job, name) for name in fields}
+    )
+    if not updated:
+        logger.warning("Job %s was requeued while %s ran it; discarding its outcome", job.pk, worker)
+        job.refresh_from_db()
+    return job
+
+
+def requeue_stale(timeout=STALE_TIMEOUT):
+    """
+    Queue running jobs again whose worker stopped heartbeating, or fail them
+    when they are out of attempts.
+
+    Returns: Number of jobs requeued or failed
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='Worker stopped responding', worker='', finished_at=now
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='', run_after=now)
+    return failed + requeued
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def work(worker=None, once=False, poll_interval=POLL_INTERVAL, max_jobs=None, stop=None):
+    """
+    Claim and run jobs until stopped.
+
+    Parameters:
+    - worker: Worker name recorded on claimed jobs (default host:pid)
+    - once: Return when no job is due instead of polling
+    - poll_interval: Seconds to sleep when no job is due
+    - max_jobs: Return after running this many jobs
+    - stop: Optional threading.Event that ends the loop when set
+
+    Returns: Number of jobs run
+    """
+    worker = worker or default_worker_name()
+    stop = stop or threading.Event()
+    count = 0
+    last_stale_check = 0.0
+    while not stop.is_set() and (max_jobs is None or count < max_jobs):
+        if time.monotonic() - last_stale_check > poll_interval * 10:
+            requeue_stale()
+            last_stale_check = time.monotonic()
+        job = claim(worker)
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        run_job(job)
+        count += 1
+    return count
+
+
+def run_worker_process(worker, options):
+    """Entry point of a worker process started by run_jobs."""
+    from django.db import connections
+
+    try:
+        work(worker=worker, **options)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connections.close_all()
+
+
+def save_upload(file):
+    """
+    Store an uploaded file for a background import.
+
+    Returns: Storage name of the saved file
+    """
+    return default_storage.save(os.path.join(UPLOAD_DIR, os.path.basename(file.name)), file)
+
+
+@job_handler('import_project')
+def import_project(params, progress=None):
+    """Import a project from a file saved with save_upload()."""
+    path = params['path']
+    try:
+        with default_storage.open(path) as file:
+            success, message, project = import_project_from_file(file)
+        if not success:
+            raise JobError(message)
+        if project:
+            calculate_risk_scores(project)
+    except (JobError, FileNotFoundError):
+        default_storage.delete(path)
+        raise
+    default_storage.delete(path)
+    return {'message': message, 'project_id': project.pk if project else None}
+
+
+@job_handler('calculate_metrics')
+def calculate_metrics(params, progress=None):
+    """Regenerate cash flows and metrics of one project, as calculate_metrics_api."""
+    project = get_project_with_solar(params['project_id'])
+    metrics = calculate_financial_metrics(
+        project,
+        discount_rate=params.get('discount_rate', 0.08),
+        inflation_rate=params.get('inflation_rate', 0.025),
+        debt_ratio=params.get('debt_ratio', 0.7),
+        interest_rate=params.get('interest_rate', 0.05),
+        **{name: params[name] for name in PORTFOLIO_PPA_TERMS if name in params}
+    )
+    return {name: getattr(metrics, name) for name in METRIC_RESPONSE_FIELDS}
+
+
+@job_handler('portfolio_metrics')
+def portfolio_metrics(params, progress=None):
+    """Metrics for many projects, as calculate_portfolio_metrics_api."""
+    # Select projects by explicit ids or by filter
+    project_ids = params.get('project_ids')
+    filters = params.get('filter')
+    if project_ids:
+        projects = Project.objects.filter(pk__in=project_ids)
+    elif filters is not None:
+        projects = filter_projects(Project.objects.all(), filters)
+    else:
+        raise ValueError('project_ids or filter is required')
+
+    # Shared rates plus optional per-project overrides
+    rates = {name: float(params[name]) for name in PORTFOLIO_RATE_DEFAULTS if name in params}
+    rates.update({name: params[name] for name in PORTFOLIO_PPA_TERMS if name in params})
+    results = calculate_portfolio_metrics(
+        projects,
+        rates=rates,
+        project_rates=params.get('project_rates'),
+        persist=bool(params.get('persist', False))
+    )
+
+    fields = [field for field in results if field != 'id']
+    columns = [np.where(np.isnan(results[field]), None, results[field]).tolist() for field in fields]
+    return {
+        'count': len(results['id']),
+        'results': [
+            dict(zip(fields, values), project_id=project_id)
+            for project_id, *values in zip(results['id'].tolist(), *columns)
+        ]
+    }
+
+
+@job_handler('solar_aggregates')
+def solar_aggregates(params, progress=None):
+    """Solar production aggregates of a project, as solar_radiation_api."""
+    from .solar_service import SOLAR_GRANULARITIES, get_solar_service
+
+    project = SolarProject.objects.get(pk=params['project_id'])
+    capacity = float(params.get('capacity') or project.capacity_mw * 1000)  # kW
+    data_type = params.get('data_type', 'monthly')  # daily, monthly, annual, heatmap, all or a comma list
+
+    if data_type == 'all':
+        granularities = SOLAR_GRANULARITIES
+    else:
+        granularities = [name.strip() for name in data_type.split(',') if name.strip()]
+    if not granularities or any(name not in SOLAR_GRANULARITIES for name in granularities):
+        raise ValueError(f"Invalid data_type: {data_type}. Must be 'all' or one or more of "
+                         f"{', '.join(SOLAR_GRANULARITIES)}")
+    if not project.latitude or not project.longitude:
+        raise ValueError('Project does not have geographic coordinates')
+
+    # All granularities come from one fetch of the site's hourly profile
+    service = get_solar_service(params.get('backend'))  # pvwatts or clear_sky
+    data = service.get_solar_aggregates(project.latitude, project.longitude, capacity, granularities)
+    if granularities == ['annual']:
+        data = data['annual']
+    return data
+
+
+@job_handler('prefetch_pvwatts')
+def prefetch_pvwatts(params, progress=None):
+    """Fetch and cache PVWatts responses for solar projects (all, or params['ids'])."""
+    from .solar_service import SolarRadiationService
+
+    projects = SolarProject.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+    if params.get('ids'):
+        projects = projects.filter(pk__in=params['ids'])
+    return SolarRadiationService().prefetch(
+        projects.values_list('latitude', 'longitude'),
+        refresh=bool(params.get('refresh', False)),
+        progress=(lambda done, total: progress(done / total, f"{done}/{total} sites")) if progress else None
+    )
+
+
+@job_handler('train_model')
+def train_model(params, progress=None):
+    """Train a registered model and publish it as a new version (params: name, activate, n_samples, seed)."""
+    from .model_registry import train_model as train_registered_model
+
+    options = {name: int(params[name]) for name in ('n_samples', 'seed') if params.get(name) is not None}
+    if progress:
+        progress(0, f"Training {params['name']}")
+    record = train_registered_model(params['name'], activate=bool(params.get('activate', True)), **options)
+    return {'name': record.name, 'version': record.version, 'active': record.is_active, 'metrics': record.metrics}
@@ -0,0 +1,57 @@
+"""
+Management command to prefetch PVWatts responses for the solar portfolio.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.models import SolarProject
+from projects.pvwatts_prefetch import DEFAULT_BACKOFF, DEFAULT_BURST, DEFAULT_CONCURRENCY, DEFAULT_RETRIES
+from projects.solar_service import SolarRadiationService
+
+
+class Command(BaseCommand):
+    help = "Fetch and cache PVWatts hourly responses for every solar project site, concurrently and rate limited"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help="Solar project ids to prefetch")
+        parser.add_argument('--rate', type=float, help="Requests per second (default PVWATTS_RATE_LIMIT)")
+        parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help="Requests allowed at once after idling")
+        parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Maximum requests in flight")
+        parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help="Retries per site")
+        parser.add_argument('--backoff', type=float, default=DEFAULT_BACKOFF, help="First retry delay in seconds")
+        parser.add_argument('--refresh', action='store_true', help="Refetch sites that are already cached")
+
+    def handle(self, *args, **options):
+        projects = SolarProject.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+        if options['ids']:
+            projects = projects.filter(pk__in=options['ids'])
+        sites = projects.values_list('latitude', 'longitude')
+
+        def progress(done, total):
+            if done % 50 == 0 or done == total:
+                self.stderr.write(f"{done}/{total} sites")
+
+        start = time.perf_counter()
+        try:
+            result = SolarRadiationService().prefetch(
+                sites,
+                rate=options['rate'],
+                burst=options['burst'],
+                concurrency=options['concurrency'],
+                retries=options['retries'],
+                backoff=options['backoff'],
+                refresh=options['refresh'],
+                progress=progress
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        for site, error in result['errors'].items():
+            self.stderr.write(self.style.WARNING(f"{site}: {error}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['sites']} sites in {elapsed:.1f}s: {result['fetched']} fetched, "
+            f"{result['cached']} already cached, {result['failed']} failed"
+        ))
@@ -0,0 +1,71 @@
+"""
+Management command to benchmark the application's hot paths.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from projects.benchmarks import (BENCHMARK_CASES, BENCHMARK_SIZES, DEFAULT_SAMPLE, compare_to_baseline,
+                                 load_report, run_benchmarks)
+
+# Benchmarks clear and fill caches, so they never use the configured backends
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-default'},
+    'financial_metrics': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-metrics'},
+    'single_flight': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-flight'},
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark the financial, risk, import, map, solar and ML hot paths on a throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=BENCHMARK_SIZES,
+                            help=f"Portfolio sizes (default {' '.join(map(str, BENCHMARK_SIZES))})")
+        parser.add_argument('--cases', nargs='+', choices=list(BENCHMARK_CASES), help="Cases to run (default all)")
+        parser.add_argument('--sample', type=int, default=DEFAULT_SAMPLE,
+                            help=f"Projects per per-project case (default {DEFAULT_SAMPLE})")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case (default 3)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the generated portfolio")
+        parser.add_argument('--pvwatts-fixture', help="Recorded PVWatts JSON response for the solar case")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+        parser.add_argument('--baseline', help="Compare against this earlier JSON report")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed relative slowdown or memory growth (default 0.25)")
+
+    def handle(self, *args, **options):
+        pvwatts = None
+        if options['pvwatts_fixture']:
+            with open(options['pvwatts_fixture']) as f:
+                pvwatts = json.load(f)
+        baseline = load_report(options['baseline']) if options['baseline'] else None
+
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                report = run_benchmarks(
+                    sizes=options['sizes'],
+                    cases=options['cases'],
+                    sample=options['sample'],
+                    repeat=options['repeat'],
+                    seed=options['seed'],
+                    pvwatts=pvwatts,
+                    log=self.stderr.write
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare_to_baseline(report, baseline, threshold=options['threshold'])
+            if regressions:
+                raise CommandError("Benchmark regressions:\n" + "\n".join(regressions))
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline"))
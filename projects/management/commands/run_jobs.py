@@ -0,0 +1,51 @@
+"""
+Management command to run background job workers.
+"""
+
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from projects.jobs import POLL_INTERVAL, default_worker_name, run_worker_process, work
+
+
+class Command(BaseCommand):
+    help = "Run background job workers that claim and execute queued jobs from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Worker processes (default 1)")
+        parser.add_argument('--once', action='store_true', help="Exit when no job is due instead of polling")
+        parser.add_argument('--max-jobs', type=int, help="Exit each worker after running this many jobs")
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                            help=f"Seconds between polls when idle (default {POLL_INTERVAL})")
+
+    def handle(self, *args, **options):
+        worker_options = {'once': options['once'], 'max_jobs': options['max_jobs'],
+                          'poll_interval': options['poll_interval']}
+        name = default_worker_name()
+
+        if options['workers'] <= 1:
+            try:
+                count = work(worker=name, **worker_options)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} jobs"))
+            return
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_worker_process, args=(f"{name}/{i}", worker_options), daemon=False)
+            for i in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        self.stderr.write(f"Started {len(processes)} workers")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
@@ -0,0 +1,52 @@
+"""
+Management command to run Monte Carlo risk simulations for a portfolio.
+"""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.models import Project
+from projects.risk_simulation import iter_portfolio_simulation
+from projects.utils import filter_projects, PORTFOLIO_RATE_DEFAULTS
+
+
+class Command(BaseCommand):
+    help = "Run Monte Carlo risk simulations and stream one JSON line of statistics per project"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help="Project ids to simulate")
+        parser.add_argument('--project-type', help="Only projects of this type, e.g. 'solar'")
+        parser.add_argument('--status', help="Only projects with this status")
+        parser.add_argument('--target-country', help="Only projects in this target country")
+        parser.add_argument('--paths', type=int, default=10000, help="Simulated paths per project")
+        parser.add_argument('--seed', type=int, default=0, help="Root random seed")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--hurdle-rate', type=float, default=0.1, help="IRR hurdle rate (default 0.1)")
+        for name, default in PORTFOLIO_RATE_DEFAULTS.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=default,
+                                help=f"{name.replace('_', ' ').capitalize()} (default {default})")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['ids']:
+            projects = projects.filter(pk__in=options['ids'])
+        projects = filter_projects(projects, options)
+
+        start = time.perf_counter()
+        count = 0
+        for project_id, summary in iter_portfolio_simulation(
+            projects,
+            n_paths=options['paths'],
+            seed=options['seed'],
+            workers=options['workers'],
+            hurdle_rate=options['hurdle_rate'],
+            **{name: options[name] for name in PORTFOLIO_RATE_DEFAULTS}
+        ):
+            self.stdout.write(json.dumps(dict(summary, project_id=project_id)))
+            count += 1
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Simulated {count} projects x {options['paths']} paths in {time.perf_counter() - start:.2f}s"
+        ))
@@ -0,0 +1,44 @@
+"""
+Management command to train a machine learning model and publish it to the model registry.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects import jobs
+from projects.model_registry import MODEL_TRAINERS, train_model
+
+
+class Command(BaseCommand):
+    help = "Train a registered machine learning model and publish it as a new, by default active, version"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', default='power_generation', choices=sorted(MODEL_TRAINERS),
+                            help="Registered model name")
+        parser.add_argument('--samples', type=int, help="Number of training samples")
+        parser.add_argument('--seed', type=int, help="Sample generator seed")
+        parser.add_argument('--no-activate', action='store_true', help="Publish without serving the new version")
+        parser.add_argument('--background', action='store_true', help="Queue a train_model job for run_jobs instead")
+
+    def handle(self, *args, **options):
+        params = {'n_samples': options['samples'], 'seed': options['seed']}
+        params = {name: value for name, value in params.items() if value is not None}
+        activate = not options['no_activate']
+
+        if options['background']:
+            job = jobs.submit('train_model', dict(params, name=options['name'], activate=activate))
+            self.stdout.write(self.style.SUCCESS(f"Queued job #{job.pk}"))
+            return
+
+        start = time.perf_counter()
+        try:
+            record = train_model(options['name'], activate=activate, **params)
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        metrics = ', '.join(f"{name}={value:.4f}" for name, value in record.metrics.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {record}{' (active)' if record.is_active else ''} in {elapsed:.1f}s: {metrics}"
+        ))
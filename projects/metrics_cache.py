@@ -0,0 +1,121 @@
+"""
+Result cache for financial metrics.
+Entries are keyed on a hash of a project's financial inputs, the rate
+parameters (including the stored PPA terms) and a per-project generation
+token. Saving a project, its cash flows or its hourly profile replaces the
+token, so stale entries are never read again and age out through the cache
+backend's own TTL/LRU eviction. Tokens only invalidate entries in other
+worker processes when the cache is shared between them, as the default
+database cache is.
+"""
+
+import hashlib
+import json
+import uuid
+
+from django.core.cache import caches
+
+
+CACHE_ALIAS = 'financial_metrics'
+
+HITS_KEY = 'metrics:hits'
+MISSES_KEY = 'metrics:misses'
+INVALIDATIONS_KEY = 'metrics:invalidations'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(project_id):
+    return f'metrics:generation:{project_id}'
+
+
+def _generation(project_id):
+    """Return the project's current generation token, creating one if needed."""
+    cache = _cache()
+    key = _generation_key(project_id)
+    token = cache.get(key)
+    if token is None:
+        # A missing token (new project or evicted key) must never match an
+        # older entry, so always start from a fresh random token
+        cache.add(key, uuid.uuid4().hex, None)
+        token = cache.get(key)
+    return token
+
+
+def invalidate(project_ids):
+    """
+    Invalidate cached metrics for the given projects.
+
+    Parameters:
+    - project_ids: Iterable of project ids
+    """
+    tokens = {_generation_key(project_id): uuid.uuid4().hex for project_id in project_ids}
+    if tokens:
+        _cache().set_many(tokens, None)
+        _increment(INVALIDATIONS_KEY, len(tokens))
+
+
+def metrics_key(project_id, inputs, rates):
+    """
+    Build the cache key for a project's metrics.
+
+    Parameters:
+    - project_id: Project id
+    - inputs: Single-project engine inputs from project_cash_flow_inputs()
+    - rates: Dictionary of rate parameters
+
+    Returns: Cache key string
+    """
+    payload = json.dumps({
+        'inputs': {name: [float(value) for value in values] for name, values in inputs.items()},
+        'rates': {name: None if value is None else float(value) for name, value in rates.items()},
+    }, sort_keys=True)
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    return f'metrics:{project_id}:{_generation(project_id)}:{digest}'
+
+
+def get(key):
+    """Return the cached metrics dictionary for key, or None, counting hits and misses."""
+    metrics = _cache().get(key)
+    _increment(HITS_KEY if metrics is not None else MISSES_KEY)
+    return metrics
+
+
+def set(key, metrics):
+    """Store a metrics dictionary under key with the backend's default timeout."""
+    _cache().set(key, metrics)
+
+
+def _increment(key, delta=1):
+    cache = _cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Counter evicted between add() and incr()
+        cache.set(key, delta, None)
+
+
+def stats():
+    """
+    Cache hit/miss counters.
+
+    Returns: Dictionary with hits, misses, invalidations and hit_rate
+    """
+    counters = _cache().get_many([HITS_KEY, MISSES_KEY, INVALIDATIONS_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'invalidations': counters.get(INVALIDATIONS_KEY, 0),
+        'hit_rate': hits / lookups if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    """Reset the hit/miss counters."""
+    _cache().delete_many([HITS_KEY, MISSES_KEY, INVALIDATIONS_KEY])
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_project_asset_life_years_project_country_risk_score_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowBasis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('capacity_mw', models.FloatField(help_text='Capacity in MW')),
+                ('capex', models.FloatField(help_text='Total capital expenditure')),
+                ('opex', models.FloatField(help_text='Annual operating expenditure in year 1')),
+                ('capacity_factor', models.FloatField(help_text='Capacity factor')),
+                ('degradation_rate', models.FloatField(help_text='Annual degradation rate')),
+                ('performance_ratio', models.FloatField(help_text='Performance ratio')),
+                ('lifetime', models.IntegerField(help_text='Project lifetime in years')),
+                ('inflation_rate', models.FloatField(help_text='Inflation rate used')),
+                ('debt_ratio', models.FloatField(help_text='Debt to total capital ratio used')),
+                ('interest_rate', models.FloatField(help_text='Interest rate on debt used')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cash_flow_basis', to='projects.project')),
+            ],
+        ),
+    ]
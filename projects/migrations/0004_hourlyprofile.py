@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_cashflowbasis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('years', models.IntegerField(help_text='Number of operating years in the profile')),
+                ('data', models.BinaryField(help_text='Compressed hourly energy in MWh')),
+                ('checksum', models.CharField(help_text='SHA-256 of the compressed data', max_length=64)),
+                ('inputs', models.JSONField(help_text='Engine inputs the profile was simulated from')),
+                ('options', models.JSONField(default=dict, help_text='Latitude, tracking, DC/AC ratio, export limit, prices')),
+                ('annual_energy_mwh', models.JSONField(help_text='Energy per operating year in MWh')),
+                ('annual_price_factor', models.JSONField(help_text='Energy-weighted price multiplier per operating year')),
+                ('clipped_mwh', models.FloatField(default=0.0, help_text='Lifetime energy lost to inverter clipping')),
+                ('curtailed_mwh', models.FloatField(default=0.0, help_text='Lifetime energy lost to export curtailment')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_profile', to='projects.project')),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:32
+
+from itertools import groupby
+
+import numpy as np
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+COLUMNS = [
+    'year', 'capex', 'revenue', 'opex', 'maintenance', 'insurance', 'taxes',
+    'debt_service', 'incentives', 'salvage_value', 'energy_production_mwh',
+    'net_cash_flow', 'cumulative_cash_flow'
+]
+
+
+def pack_existing_cash_flows(apps, schema_editor):
+    """Create the packed copy for every project that already has cash flows."""
+    CashFlow = apps.get_model('projects', 'CashFlow')
+    CashFlowColumns = apps.get_model('projects', 'CashFlowColumns')
+
+    rows = CashFlow.objects.order_by('project_id', 'year').values_list('project_id', *COLUMNS)
+    packed = []
+    for project_id, group in groupby(rows.iterator(), key=lambda row: row[0]):
+        values = np.array([row[1:] for row in group], dtype='<f8').T
+        packed.append(CashFlowColumns(project_id=project_id, columns=COLUMNS, years=values.shape[1],
+                                      data=np.ascontiguousarray(values).tobytes()))
+        if len(packed) >= 2000:
+            CashFlowColumns.objects.bulk_create(packed)
+            packed = []
+    CashFlowColumns.objects.bulk_create(packed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_hourlyprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowColumns',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('columns', models.JSONField(help_text='Column names, in packed order')),
+                ('years', models.IntegerField(help_text='Number of values per column')),
+                ('data', models.BinaryField(help_text='Packed cash flow columns')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cash_flow_columns', to='projects.project')),
+            ],
+        ),
+        migrations.RunPython(pack_existing_cash_flows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_cashflowcolumns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashflowbasis',
+            name='ppa_escalation',
+            field=models.FloatField(blank=True, help_text='PPA escalation rate used', null=True),
+        ),
+        migrations.AddField(
+            model_name='cashflowbasis',
+            name='ppa_price',
+            field=models.FloatField(blank=True, help_text='PPA price used ($/MWh)', null=True),
+        ),
+        migrations.AddField(
+            model_name='cashflowbasis',
+            name='ppa_term',
+            field=models.IntegerField(blank=True, help_text='PPA term used in years', null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_cashflowbasis_ppa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Scenario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('discount_rate', models.FloatField(default=0.08, help_text='Discount rate')),
+                ('inflation_rate', models.FloatField(default=0.025, help_text='Inflation rate')),
+                ('debt_ratio', models.FloatField(default=0.7, help_text='Debt to total capital ratio')),
+                ('interest_rate', models.FloatField(default=0.05, help_text='Interest rate on debt')),
+                ('ppa_price', models.FloatField(blank=True, help_text='Power Purchase Agreement price ($/MWh)', null=True)),
+                ('ppa_escalation', models.FloatField(blank=True, help_text='Annual escalation rate for PPA', null=True)),
+                ('ppa_term', models.IntegerField(blank=True, help_text='PPA term in years', null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScenarioResultSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('scenarios', models.JSONField(help_text='[scenario id, name] pairs, in packed order')),
+                ('projects', models.JSONField(help_text='[project id, name] pairs, in packed order')),
+                ('metrics', models.JSONField(help_text='Metric names, in packed order')),
+                ('data', models.BinaryField(help_text='Packed scenario results')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.20 on 2026-10-17 21:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_scenario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name_plural': 'risk aliases',
+                'ordering': ['alias'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RiskTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('country', 'Country'), ('technology', 'Technology'), ('status', 'Project status'), ('off_taker', 'Off-taker rating')], max_length=20)),
+                ('version', models.PositiveIntegerField()),
+                ('description', models.TextField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['kind', '-version'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='home_country',
+            field=models.CharField(blank=True, db_index=True, help_text='Country of origin for investment', max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='off_taker_rating',
+            field=models.CharField(blank=True, db_index=True, help_text='Credit rating of energy buyer (impacts revenue)', max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='project_status_risk',
+            field=models.CharField(blank=True, choices=[('early_stage', 'Early Stage (Higher Risk)'), ('development', 'Development'), ('construction', 'Construction'), ('operational', 'Operational (Lower Risk)')], db_index=True, help_text='Project development status risk level', max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='project_type',
+            field=models.CharField(db_index=True, help_text="e.g., 'solar', 'wind'", max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='target_country',
+            field=models.CharField(blank=True, db_index=True, help_text='Target country for the project', max_length=100, null=True),
+        ),
+        migrations.CreateModel(
+            name='RiskTableEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Normalized country, project type, status or rating', max_length=100)),
+                ('score', models.FloatField(help_text='Risk score (1-5, where 5 is highest risk)')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='projects.risktable')),
+            ],
+            options={
+                'verbose_name_plural': 'risk table entries',
+                'ordering': ['key'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='risktable',
+            constraint=models.UniqueConstraint(fields=('kind', 'version'), name='unique_risk_table_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='risktable',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('kind',), name='unique_active_risk_table'),
+        ),
+        migrations.AddField(
+            model_name='riskalias',
+            name='table',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='projects.risktable'),
+        ),
+        migrations.AddConstraint(
+            model_name='risktableentry',
+            constraint=models.UniqueConstraint(fields=('table', 'key'), name='unique_risk_table_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='riskalias',
+            constraint=models.UniqueConstraint(fields=('table', 'alias'), name='unique_risk_alias'),
+        ),
+    ]
@@ -0,0 +1,153 @@
+"""
+Seed version 1 of every risk table with the scores that used to be
+hard-coded in projects/utils.py.
+
+The values are copied here rather than imported so that later edits to the
+built-in tables do not change what this migration writes.
+"""
+
+from django.db import migrations
+from django.utils import timezone
+
+
+COUNTRY_RISK_SCORES = {
+    # Low risk countries
+    'united states': 1.0,
+    'canada': 1.0,
+    'australia': 1.0,
+    'germany': 1.0,
+    'united kingdom': 1.0,
+    'france': 1.0,
+    'japan': 1.0,
+    'south korea': 1.0,
+    'singapore': 1.0,
+
+    # Medium risk countries
+    'mexico': 2.0,
+    'brazil': 2.5,
+    'china': 2.5,
+    'india': 2.5,
+    'south africa': 2.5,
+    'turkey': 2.5,
+    'thailand': 2.0,
+    'malaysia': 2.0,
+    'indonesia': 2.5,
+    'chile': 2.0,
+
+    # Higher risk countries
+    'nigeria': 3.5,
+    'egypt': 3.0,
+    'pakistan': 3.5,
+    'ukraine': 3.5,
+    'iraq': 4.0,
+    'venezuela': 4.0,
+    'libya': 4.5,
+    'afghanistan': 5.0,
+    'syria': 5.0,
+    'yemen': 5.0,
+}
+
+TECHNOLOGY_RISK_SCORES = {
+    'solar': 1.5,  # Solar is relatively low risk
+    'wind': 1.8,   # Wind slightly higher
+    'hydro': 2.2,  # Hydro has more variables
+    'biomass': 2.5,
+    'geothermal': 2.8,
+    'tidal': 3.5,  # Emerging technologies higher risk
+    'wave': 3.8,
+    'hydrogen': 4.0,
+}
+
+STATUS_RISK_SCORES = {
+    'early_stage': 4.5,     # Highest risk
+    'development': 3.5,
+    'construction': 2.5,
+    'operational': 1.5      # Lowest risk
+}
+
+OFF_TAKER_RISK_SCORES = {
+    'AAA': 1.0,
+    'AA+': 1.1,
+    'AA': 1.2,
+    'AA-': 1.3,
+    'A+': 1.5,
+    'A': 1.7,
+    'A-': 1.9,
+    'BBB+': 2.1,
+    'BBB': 2.3,
+    'BBB-': 2.5,
+    'BB+': 2.7,
+    'BB': 2.9,
+    'BB-': 3.1,
+    'B+': 3.3,
+    'B': 3.5,
+    'B-': 3.7,
+    'CCC+': 4.0,
+    'CCC': 4.3,
+    'CCC-': 4.5,
+    'CC': 4.7,
+    'C': 4.9,
+    'D': 5.0,
+}
+
+RISK_TABLES = {
+    'country': COUNTRY_RISK_SCORES,
+    'technology': TECHNOLOGY_RISK_SCORES,
+    'status': STATUS_RISK_SCORES,
+    'off_taker': OFF_TAKER_RISK_SCORES,
+}
+
+RISK_ALIASES = {
+    'country': {
+        'usa': 'united states',
+        'us': 'united states',
+        'u.s.': 'united states',
+        'u.s.a.': 'united states',
+        'united states of america': 'united states',
+        'uk': 'united kingdom',
+        'great britain': 'united kingdom',
+        'britain': 'united kingdom',
+        'korea': 'south korea',
+        'republic of korea': 'south korea',
+    },
+    'technology': {
+        'pv': 'solar',
+        'photovoltaic': 'solar',
+        'onshore wind': 'wind',
+        'offshore wind': 'wind',
+    },
+    'status': {},
+    'off_taker': {},
+}
+
+
+def seed_risk_tables(apps, schema_editor):
+    RiskTable = apps.get_model('projects', 'RiskTable')
+    RiskTableEntry = apps.get_model('projects', 'RiskTableEntry')
+    RiskAlias = apps.get_model('projects', 'RiskAlias')
+    for kind, scores in RISK_TABLES.items():
+        table = RiskTable.objects.create(
+            kind=kind, version=1, is_active=True, activated_at=timezone.now(),
+            description="Initial scores"
+        )
+        RiskTableEntry.objects.bulk_create([
+            RiskTableEntry(table=table, key=key, score=score) for key, score in scores.items()
+        ])
+        RiskAlias.objects.bulk_create([
+            RiskAlias(table=table, alias=alias, key=key) for alias, key in RISK_ALIASES[kind].items()
+        ])
+
+
+def remove_risk_tables(apps, schema_editor):
+    apps.get_model('projects', 'RiskTable').objects.filter(version=1).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_risk_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_risk_tables, remove_risk_tables),
+    ]
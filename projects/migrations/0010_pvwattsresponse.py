@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-17 21:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_seed_risk_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PVWattsResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('params', models.JSONField(help_text='Request parameters, without the API key')),
+                ('columns', models.JSONField(help_text='Names of the packed hourly outputs, in packed order')),
+                ('hours', models.IntegerField()),
+                ('data', models.BinaryField(help_text='Packed hourly outputs')),
+                ('outputs', models.JSONField(help_text='Annual and monthly outputs')),
+                ('meta', models.JSONField(help_text='Other top-level response fields')),
+                ('size_bytes', models.IntegerField(help_text='Size of the packed hourly outputs')),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('last_accessed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'PVWatts response',
+                'ordering': ['-last_accessed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.20 on 2026-10-17 21:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MLModelVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Registered model name, e.g. power_generation', max_length=50)),
+                ('version', models.PositiveIntegerField()),
+                ('artifact', models.CharField(max_length=255)),
+                ('sha256', models.CharField(max_length=64)),
+                ('size_bytes', models.IntegerField(default=0)),
+                ('metrics', models.JSONField(blank=True, default=dict)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('is_active', models.BooleanField(default=False)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'ML model version',
+                'ordering': ['name', '-version'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mlmodelversion',
+            constraint=models.UniqueConstraint(fields=('name', 'version'), name='unique_ml_model_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='mlmodelversion',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('name',), name='unique_active_ml_model'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+"""
+Publish the power generation model that used to be loaded from
+projects/data/power_generation_model.joblib as version 1 of the registered
+model, so the prediction page works before any training job has run.
+
+The artifact is copied into ML_MODEL_DIR under its content hash, as
+model_registry.publish_model() names artifacts.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+MODEL_NAME = 'power_generation'
+BUNDLED_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+BUNDLED_ARTIFACT = os.path.join(BUNDLED_DIR, 'power_generation_model.joblib')
+BUNDLED_METADATA = os.path.join(BUNDLED_DIR, 'power_generation_model.json')
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def seed_power_model(apps, schema_editor):
+    MLModelVersion = apps.get_model('projects', 'MLModelVersion')
+    if MLModelVersion.objects.filter(name=MODEL_NAME).exists():
+        return
+
+    sha256 = _sha256(BUNDLED_ARTIFACT)
+    artifact = os.path.join(MODEL_NAME, f"{sha256[:16]}.joblib")
+    path = os.path.join(settings.ML_MODEL_DIR, artifact)
+    if not os.path.exists(path) or _sha256(path) != sha256:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(BUNDLED_ARTIFACT, path)
+
+    with open(BUNDLED_METADATA) as f:
+        bundled = json.load(f)
+    MLModelVersion.objects.create(
+        name=MODEL_NAME, version=1, artifact=artifact, sha256=sha256, size_bytes=os.path.getsize(path),
+        metrics=bundled['metrics'], metadata=bundled['metadata'], is_active=True, activated_at=timezone.now()
+    )
+
+
+def remove_power_model(apps, schema_editor):
+    apps.get_model('projects', 'MLModelVersion').objects.filter(
+        name=MODEL_NAME, version=1, sha256=_sha256(BUNDLED_ARTIFACT)
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0012_mlmodelversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_power_model, remove_power_model),
+    ]
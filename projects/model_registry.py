@@ -0,0 +1,279 @@
+"""
+Registry of versioned machine learning models.
+
+Trained models are published as MLModelVersion rows. Each row points at a
+joblib artifact in ML_MODEL_DIR that is named by its content hash, written
+once and never modified, so a version always loads the same model. Each
+process loads the active version of a model once (at startup for the models
+in ML_WARM_MODELS) into a read-only RegisteredModel and reloads only when
+another version is activated anywhere, which it notices by reading the
+active version and its activation time (one query on the partial unique
+index of active versions) on each use.
+
+Training runs in the train_model job or management command, never in a
+request. Jobs are only queued explicitly, from the prediction page's train
+button; the 0013 migration publishes the bundled model as version 1.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from types import MappingProxyType
+
+import joblib
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .ml_models import train_power_model
+from .models import Job, MLModelVersion
+
+
+logger = logging.getLogger(__name__)
+
+# Model name -> training function returning (fitted model, held-out metrics, metadata)
+MODEL_TRAINERS = {
+    'power_generation': train_power_model,
+}
+
+PUBLISH_ATTEMPTS = 5
+HASH_CHUNK = 1024 * 1024
+
+
+class ModelNotAvailable(LookupError):
+    """Raised when a model has no active version or its artifact cannot be loaded"""
+
+
+def _serve_single_threaded(model):
+    """Set every n_jobs parameter of a model to 1."""
+    params = model.get_params() if hasattr(model, 'get_params') else {}
+    n_jobs = {key: 1 for key in params if key == 'n_jobs' or key.endswith('__n_jobs')}
+    if n_jobs:
+        model.set_params(**n_jobs)
+
+
+class RegisteredModel:
+    """
+    Immutable, loaded version of a published model; serves predictions only.
+
+    Predictions run in the calling thread: each request predicts a few rows,
+    where a thread pool costs more than it saves, and the web workers already
+    provide the concurrency.
+    """
+
+    __slots__ = ('name', 'version', 'metrics', 'metadata', '_model')
+
+    def __init__(self, name, version, model, metrics, metadata):
+        _serve_single_threaded(model)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'metrics', MappingProxyType(dict(metrics)))
+        object.__setattr__(self, 'metadata', MappingProxyType(dict(metadata)))
+        object.__setattr__(self, '_model', model)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RegisteredModel is immutable")
+
+    def predict(self, features):
+        """Predictions for a DataFrame of features, taken in the column order the model was trained on."""
+        columns = self.metadata.get('features')
+        if columns:
+            features = features[list(columns)]
+        return self._model.predict(features)
+
+
+def _artifact_path(artifact):
+    return os.path.join(settings.ML_MODEL_DIR, artifact)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_model(name, version=None):
+    """
+    Load a published version of a model from its artifact.
+
+    Parameters:
+    - name: Registered model name
+    - version: Version number (default: the active version)
+
+    Returns: RegisteredModel
+    """
+    versions = MLModelVersion.objects.filter(name=name)
+    record = versions.filter(is_active=True).first() if version is None else versions.filter(version=version).first()
+    if record is None:
+        raise ModelNotAvailable(f"No {'active' if version is None else f'v{version}'} version of the {name} model. "
+                                f"Train one with: python manage.py train_model {name}")
+
+    path = _artifact_path(record.artifact)
+    try:
+        if _file_sha256(path) != record.sha256:
+            raise ModelNotAvailable(f"Artifact of {record} does not match its checksum")
+        model = joblib.load(path)
+    except OSError as e:
+        raise ModelNotAvailable(f"Could not read the artifact of {record}: {e}")
+    return RegisteredModel(name, record.version, model, record.metrics, record.metadata)
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _active_version(name):
+    """(version, activated_at) of a model's active version, or None."""
+    return MLModelVersion.objects.filter(name=name, is_active=True).values_list('version', 'activated_at').first()
+
+
+def get_model(name):
+    """
+    The process-wide RegisteredModel of a model's active version, reloaded
+    after a version is activated anywhere.
+
+    Returns: RegisteredModel; raises ModelNotAvailable when there is no
+    active version
+    """
+    active = _active_version(name)
+    if active is None:
+        _models.pop(name, None)
+        return load_model(name)
+    loaded = _models.get(name)
+    if loaded is None or loaded[0] != active:
+        # One thread loads while the others wait for it
+        with _models_lock:
+            loaded = _models.get(name)
+            if loaded is None or loaded[0] != active:
+                loaded = _models[name] = (active, load_model(name, version=active[0]))
+    return loaded[1]
+
+
+def clear_models():
+    """Drop the models loaded in this process; they are reloaded on next use."""
+    _models.clear()
+
+
+def publish_model(name, model, metrics=None, metadata=None, activate=True):
+    """
+    Store a trained model as a new immutable version.
+
+    Parameters:
+    - name: Registered model name
+    - model: Fitted, picklable model
+    - metrics: Held-out evaluation metrics
+    - metadata: Training details, including the 'features' column order
+    - activate: Make the new version the one served
+
+    Returns: The new MLModelVersion
+    """
+    directory = os.path.join(settings.ML_MODEL_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+    try:
+        joblib.dump(model, tmp_path)
+        sha256 = _file_sha256(tmp_path)
+        size_bytes = os.path.getsize(tmp_path)
+        # Named by content, so an existing artifact is only ever replaced by identical bytes
+        artifact = os.path.join(name, f"{sha256[:16]}.joblib")
+        os.replace(tmp_path, _artifact_path(artifact))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    for attempt in range(PUBLISH_ATTEMPTS):
+        version = (MLModelVersion.objects.filter(name=name).aggregate(Max('version'))['version__max'] or 0) + 1
+        try:
+            with transaction.atomic():
+                record = MLModelVersion.objects.create(
+                    name=name, version=version, artifact=artifact, sha256=sha256, size_bytes=size_bytes,
+                    metrics=metrics or {}, metadata=metadata or {}
+                )
+            break
+        except IntegrityError:
+            # Another process published the same version number first
+            if attempt == PUBLISH_ATTEMPTS - 1:
+                raise
+
+    if activate:
+        activate_model_version(record)
+    return record
+
+
+def activate_model_version(record):
+    """
+    Make a version the active one of its model; every process switches to it on next use.
+
+    Returns: The activated MLModelVersion
+    """
+    with transaction.atomic():
+        MLModelVersion.objects.select_for_update().filter(name=record.name, is_active=True).update(is_active=False)
+        record.is_active = True
+        record.activated_at = timezone.now()
+        record.save(update_fields=['is_active', 'activated_at'])
+    return record
+
+
+def train_model(name, activate=True, **options):
+    """
+    Train a registered model and publish it as a new version.
+
+    Parameters:
+    - name: Registered model name
+    - activate: Make the new version the one served
+    - options: Keyword arguments of the model's training function
+
+    Returns: The new MLModelVersion
+    """
+    if name not in MODEL_TRAINERS:
+        raise ValueError(f"Unknown model: {name}. Must be one of {', '.join(sorted(MODEL_TRAINERS))}")
+    model, metrics, metadata = MODEL_TRAINERS[name](**options)
+    return publish_model(name, model, metrics, metadata, activate=activate)
+
+
+def pending_training(name):
+    """The queued or running train_model job of a model, or None."""
+    return Job.objects.filter(
+        kind='train_model', status__in=[Job.QUEUED, Job.RUNNING], params__name=name
+    ).order_by('pk').first()
+
+
+def request_training(name):
+    """
+    Queue a train_model job for a model unless one is already queued or running.
+
+    Returns: The pending Job
+    """
+    from . import jobs
+
+    return pending_training(name) or jobs.submit('train_model', {'name': name})
+
+
+def warm_models(names=None):
+    """
+    Load the active versions of models into this process, e.g. at worker
+    start-up, so the first request does not pay for loading. Models without an
+    active version are only logged; training is never queued implicitly.
+
+    Parameters:
+    - names: Model names (default ML_WARM_MODELS)
+
+    Returns: Dictionary of model name to the loaded version, or None
+    """
+    loaded = {}
+    for name in settings.ML_WARM_MODELS if names is None else names:
+        try:
+            loaded[name] = get_model(name).version
+        except ModelNotAvailable as e:
+            loaded[name] = None
+            logger.warning("%s", e)
+        except DatabaseError as e:
+            # E.g. migrations not applied yet; models load on first use instead
+            loaded[name] = None
+            logger.warning("Could not warm the %s model: %s", name, e)
+    return loaded
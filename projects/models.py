@@ -4,6 +4,7 @@ These models represent energy projects, financial metrics, and cash flows
 to help energy analysts evaluate project viability with geospatial features.
 """
 
+import numpy as np
 from django.db import models
 from django.utils import timezone
 from datetime import datetime
@@ -17,7 +18,7 @@ class Project(models.Model):
     description = models.TextField(blank=True, null=True)
     location = models.CharField(max_length=100, blank=True, null=True)
     capacity_mw = models.FloatField(help_text="Capacity in megawatts")
-    project_type = models.CharField(max_length=50, help_text="e.g., 'solar', 'wind'")
+    project_type = models.CharField(max_length=50, db_index=True, help_text="e.g., 'solar', 'wind'")
     
     # Financial data
     capex = models.FloatField(blank=True, null=True, help_text="Capital expenditure (total)")
@@ -39,15 +40,15 @@ class Project(models.Model):
     longitude = models.FloatField(blank=True, null=True)
     
     # Risk assessment factors
-    home_country = models.CharField(max_length=100, blank=True, null=True, 
+    home_country = models.CharField(max_length=100, blank=True, null=True, db_index=True,
                                     help_text="Country of origin for investment")
-    target_country = models.CharField(max_length=100, blank=True, null=True,
+    target_country = models.CharField(max_length=100, blank=True, null=True, db_index=True,
                                       help_text="Target country for the project")
     target_state_province = models.CharField(max_length=100, blank=True, null=True,
                                             help_text="State/province within target country")
     technology_risk_factor = models.FloatField(blank=True, null=True,
                                               help_text="Energy yield variability factor (0-1)")
-    project_status_risk = models.CharField(max_length=50, blank=True, null=True,
+    project_status_risk = models.CharField(max_length=50, blank=True, null=True, db_index=True,
                                           choices=[
                                               ('early_stage', 'Early Stage (Higher Risk)'),
                                               ('development', 'Development'),
@@ -57,7 +58,7 @@ class Project(models.Model):
                                           help_text="Project development status risk level")
     asset_life_years = models.IntegerField(blank=True, null=True, 
                                           help_text="Target years of operation")
-    off_taker_rating = models.CharField(max_length=50, blank=True, null=True,
+    off_taker_rating = models.CharField(max_length=50, blank=True, null=True, db_index=True,
                                        help_text="Credit rating of energy buyer (impacts revenue)")
     funding_leverage = models.FloatField(blank=True, null=True,
                                         help_text="Debt to equity ratio (impacts capex and cash flow)")
@@ -83,6 +84,22 @@ class Project(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.capacity_mw} MW {self.project_type})"
+    
+    def get_cash_flow_arrays(self):
+        """
+        Stored cash flows as NumPy arrays, read from the packed columnar copy.
+        
+        Returns: Dictionary of 1-D arrays keyed by CASH_FLOW_COLUMNS, ordered
+        by year (empty when no cash flows are stored)
+        """
+        row = CashFlowColumns.objects.filter(project_id=self.pk).values_list('columns', 'years', 'data').first()
+        if row is not None:
+            return unpack_cash_flow_columns(*row)
+        
+        # Projects without a packed copy fall back to the row table
+        rows = list(self.cash_flows.order_by('year').values_list(*CASH_FLOW_COLUMNS))
+        values = np.array(rows, dtype=float).reshape(len(rows), len(CASH_FLOW_COLUMNS)).T
+        return dict(zip(CASH_FLOW_COLUMNS, values))
 
 
 class SolarProject(Project):
@@ -154,6 +171,101 @@ class CashFlow(models.Model):
         ordering = ['project', 'year']
 
 
+# Columns of the packed cash flow arrays, in CashFlow model order
+CASH_FLOW_COLUMNS = [
+    'year', 'capex', 'revenue', 'opex', 'maintenance', 'insurance', 'taxes',
+    'debt_service', 'incentives', 'salvage_value', 'energy_production_mwh',
+    'net_cash_flow', 'cumulative_cash_flow'
+]
+
+
+def pack_cash_flow_columns(arrays):
+    """Pack a dictionary of equal-length arrays into little-endian float64 bytes (CASH_FLOW_COLUMNS order)."""
+    return np.ascontiguousarray([arrays[name] for name in CASH_FLOW_COLUMNS], dtype='<f8').tobytes()
+
+
+def unpack_cash_flow_columns(columns, years, data):
+    """Unpack CashFlowColumns data into a dictionary of 1-D arrays."""
+    values = np.frombuffer(bytes(data), dtype='<f8').reshape(len(columns), years)
+    return dict(zip(columns, values))
+
+
+class CashFlowColumns(models.Model):
+    """Model storing a project's cash flows as packed per-column arrays"""
+    
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='cash_flow_columns')
+    
+    # Little-endian float64 array, columns x years
+    columns = models.JSONField(help_text="Column names, in packed order")
+    years = models.IntegerField(help_text="Number of values per column")
+    data = models.BinaryField(help_text="Packed cash flow columns")
+    
+    # Metadata
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Cash flow columns for {self.project.name}"
+
+
+class CashFlowBasis(models.Model):
+    """Model recording the inputs a project's stored cash flows were generated from"""
+    
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='cash_flow_basis')
+    
+    # Project inputs
+    capacity_mw = models.FloatField(help_text="Capacity in MW")
+    capex = models.FloatField(help_text="Total capital expenditure")
+    opex = models.FloatField(help_text="Annual operating expenditure in year 1")
+    capacity_factor = models.FloatField(help_text="Capacity factor")
+    degradation_rate = models.FloatField(help_text="Annual degradation rate")
+    performance_ratio = models.FloatField(help_text="Performance ratio")
+    lifetime = models.IntegerField(help_text="Project lifetime in years")
+    
+    # Rate parameters
+    inflation_rate = models.FloatField(help_text="Inflation rate used")
+    debt_ratio = models.FloatField(help_text="Debt to total capital ratio used")
+    interest_rate = models.FloatField(help_text="Interest rate on debt used")
+    
+    # PPA terms, empty for merchant sales
+    ppa_price = models.FloatField(blank=True, null=True, help_text="PPA price used ($/MWh)")
+    ppa_escalation = models.FloatField(blank=True, null=True, help_text="PPA escalation rate used")
+    ppa_term = models.IntegerField(blank=True, null=True, help_text="PPA term used in years")
+    
+    # Metadata
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Cash flow basis for {self.project.name}"
+
+
+class HourlyProfile(models.Model):
+    """Model storing a project's simulated hourly production as a compressed array"""
+    
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='hourly_profile')
+    
+    # zlib-compressed little-endian float32 array of MWh, years x 8760
+    years = models.IntegerField(help_text="Number of operating years in the profile")
+    data = models.BinaryField(help_text="Compressed hourly energy in MWh")
+    checksum = models.CharField(max_length=64, help_text="SHA-256 of the compressed data")
+    
+    # Simulation inputs
+    inputs = models.JSONField(help_text="Engine inputs the profile was simulated from")
+    options = models.JSONField(default=dict, help_text="Latitude, tracking, DC/AC ratio, export limit, prices")
+    
+    # Annual aggregates
+    annual_energy_mwh = models.JSONField(help_text="Energy per operating year in MWh")
+    annual_price_factor = models.JSONField(help_text="Energy-weighted price multiplier per operating year")
+    clipped_mwh = models.FloatField(default=0.0, help_text="Lifetime energy lost to inverter clipping")
+    curtailed_mwh = models.FloatField(default=0.0, help_text="Lifetime energy lost to export curtailment")
+    
+    # Metadata
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Hourly profile for {self.project.name}"
+
+
 class FinancialMetric(models.Model):
     """Model for storing calculated financial metrics for a project"""
     
@@ -189,6 +301,281 @@ class FinancialMetric(models.Model):
         return f"Metrics for {self.project.name}"
 
 
+class Scenario(models.Model):
+    """Model for a named set of financial parameters evaluated across projects"""
+    
+    name = models.CharField(max_length=200, unique=True)
+    description = models.TextField(blank=True, null=True)
+    
+    # Rate parameters
+    discount_rate = models.FloatField(default=0.08, help_text="Discount rate")
+    inflation_rate = models.FloatField(default=0.025, help_text="Inflation rate")
+    debt_ratio = models.FloatField(default=0.7, help_text="Debt to total capital ratio")
+    interest_rate = models.FloatField(default=0.05, help_text="Interest rate on debt")
+    
+    # PPA terms; without a price each project's stored terms apply
+    ppa_price = models.FloatField(blank=True, null=True, help_text="Power Purchase Agreement price ($/MWh)")
+    ppa_escalation = models.FloatField(blank=True, null=True, help_text="Annual escalation rate for PPA")
+    ppa_term = models.IntegerField(blank=True, null=True, help_text="PPA term in years")
+    
+    # Metadata
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.name
+    
+    class Meta:
+        ordering = ['name']
+
+
+# FinancialMetric fields stored for every scenario and project
+SCENARIO_METRICS = [
+    'npv', 'irr', 'payback_period', 'lcoe', 'mirr', 'profitability_index', 'debt_service_coverage_ratio'
+]
+
+
+class ScenarioResultSet(models.Model):
+    """Model storing the metrics of several scenarios across many projects as one packed array"""
+    
+    name = models.CharField(max_length=200, blank=True)
+    
+    # Axes of the packed array, snapshotted at evaluation time
+    scenarios = models.JSONField(help_text="[scenario id, name] pairs, in packed order")
+    projects = models.JSONField(help_text="[project id, name] pairs, in packed order")
+    metrics = models.JSONField(help_text="Metric names, in packed order")
+    
+    # Little-endian float64 array, scenarios x metrics x projects
+    data = models.BinaryField(help_text="Packed scenario results")
+    
+    # Metadata
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return self.name or f"Scenario results {self.pk}"
+    
+    def get_values(self):
+        """Return the results as a read-only (scenarios x metrics x projects) array."""
+        return np.frombuffer(bytes(self.data), dtype='<f8').reshape(
+            len(self.scenarios), len(self.metrics), len(self.projects)
+        )
+    
+    def metric_values(self, metric):
+        """Return one metric as a (scenarios x projects) array."""
+        return self.get_values()[:, self.metrics.index(metric)]
+    
+    class Meta:
+        ordering = ['-created_at']
+
+
+# Kinds of risk table and the Project fields whose values they score
+RISK_TABLE_FIELDS = {
+    'country': ['home_country', 'target_country'],
+    'technology': ['project_type'],
+    'status': ['project_status_risk'],
+    'off_taker': ['off_taker_rating'],
+}
+
+
+def normalize_risk_key(kind, value):
+    """
+    Normalize a project field value into a risk table key.
+    
+    Keys are trimmed with inner whitespace collapsed; credit ratings are upper
+    case and everything else lower case. Empty values return None.
+    """
+    if value is None:
+        return None
+    key = ' '.join(str(value).split())
+    if not key:
+        return None
+    return key.upper() if kind == 'off_taker' else key.lower()
+
+
+class RiskTable(models.Model):
+    """Model for one version of a risk score lookup table"""
+    
+    kind = models.CharField(max_length=20, choices=[
+        ('country', 'Country'),
+        ('technology', 'Technology'),
+        ('status', 'Project status'),
+        ('off_taker', 'Off-taker rating'),
+    ])
+    version = models.PositiveIntegerField()
+    description = models.TextField(blank=True, null=True)
+    
+    # At most one version of each kind is active
+    is_active = models.BooleanField(default=False)
+    activated_at = models.DateTimeField(blank=True, null=True)
+    
+    # Metadata
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} risk table v{self.version}"
+    
+    class Meta:
+        ordering = ['kind', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'version'], name='unique_risk_table_version'),
+            models.UniqueConstraint(fields=['kind'], condition=models.Q(is_active=True),
+                                    name='unique_active_risk_table'),
+        ]
+
+
+class RiskTableEntry(models.Model):
+    """Model for the 1-5 risk score of one key in a risk table"""
+    
+    table = models.ForeignKey(RiskTable, on_delete=models.CASCADE, related_name='entries')
+    key = models.CharField(max_length=100, help_text="Normalized country, project type, status or rating")
+    score = models.FloatField(help_text="Risk score (1-5, where 5 is highest risk)")
+    
+    def save(self, *args, **kwargs):
+        self.key = normalize_risk_key(self.table.kind, self.key)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.key}: {self.score}"
+    
+    class Meta:
+        ordering = ['key']
+        verbose_name_plural = 'risk table entries'
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'key'], name='unique_risk_table_key'),
+        ]
+
+
+class RiskAlias(models.Model):
+    """Model mapping an alternative spelling onto a risk table key, e.g. 'usa' to 'united states'"""
+    
+    table = models.ForeignKey(RiskTable, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=100)
+    key = models.CharField(max_length=100)
+    
+    def save(self, *args, **kwargs):
+        self.alias = normalize_risk_key(self.table.kind, self.alias)
+        self.key = normalize_risk_key(self.table.kind, self.key)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.alias} -> {self.key}"
+    
+    class Meta:
+        ordering = ['alias']
+        verbose_name_plural = 'risk aliases'
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'alias'], name='unique_risk_alias'),
+        ]
+
+
+class PVWattsResponse(models.Model):
+    """Model caching one PVWatts API response, with the hourly outputs packed"""
+    
+    # Hash of the rounded request parameters
+    key = models.CharField(max_length=64, unique=True)
+    params = models.JSONField(help_text="Request parameters, without the API key")
+    
+    # zlib-compressed little-endian float32 array, columns x hours
+    columns = models.JSONField(help_text="Names of the packed hourly outputs, in packed order")
+    hours = models.IntegerField()
+    data = models.BinaryField(help_text="Packed hourly outputs")
+    
+    # Everything else in the response
+    outputs = models.JSONField(help_text="Annual and monthly outputs")
+    meta = models.JSONField(help_text="Other top-level response fields")
+    
+    # Cache bookkeeping
+    size_bytes = models.IntegerField(help_text="Size of the packed hourly outputs")
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"PVWatts {self.params.get('lat')}, {self.params.get('lon')}"
+    
+    class Meta:
+        ordering = ['-last_accessed_at']
+        verbose_name = 'PVWatts response'
+
+
+class Job(models.Model):
+    """Model for a background computation run by the run_jobs workers"""
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=50, help_text="Registered job handler name")
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    
+    # Progress reported by the handler, 0-1
+    progress = models.FloatField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    
+    # Retries: failed attempts are queued again after a backoff until max_attempts
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    
+    # Worker bookkeeping; heartbeat_at is refreshed by progress updates
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+
+class MLModelVersion(models.Model):
+    """Model for one immutable, published version of a trained machine learning model"""
+
+    name = models.CharField(max_length=50, help_text="Registered model name, e.g. power_generation")
+    version = models.PositiveIntegerField()
+
+    # Artifact file, relative to ML_MODEL_DIR, and its SHA-256 checked on load
+    artifact = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64)
+    size_bytes = models.IntegerField(default=0)
+
+    # Held-out evaluation metrics and training details (features, samples, library versions)
+    metrics = models.JSONField(default=dict, blank=True)
+    metadata = models.JSONField(default=dict, blank=True)
+
+    # At most one version of each model is active
+    is_active = models.BooleanField(default=False)
+    activated_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} model v{self.version}"
+
+    class Meta:
+        ordering = ['name', '-version']
+        verbose_name = 'ML model version'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'version'], name='unique_ml_model_version'),
+            models.UniqueConstraint(fields=['name'], condition=models.Q(is_active=True),
+                                    name='unique_active_ml_model'),
+        ]
+
+
 class GeospatialLayer(models.Model):
     """Model for storing geospatial layers for mapping"""
     
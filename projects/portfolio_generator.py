@@ -0,0 +1,294 @@
+"""
+Synthetic portfolio generator for the Energy Finance application.
+Fills a database with a realistic mix of Project and SolarProject rows, with
+coordinates, risk fields, cash flows and financial metrics, for load and
+scale testing.
+
+The portfolio is cut into fixed-size chunks and chunk k always draws from
+child k of SeedSequence(seed), so the same seed and chunk size give the same
+projects whether the chunks run in one process or many. Only the primary
+keys depend on the order in which chunks are written.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+import numpy as np
+from django.db import connection, connections, transaction
+
+from .models import Project, SolarProject
+from .utils import RISK_INPUT_FIELDS, RISK_SCORE_FIELDS, calculate_portfolio_metrics, risk_score_arrays
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Technology mix: (share of projects, median MW, CAPEX per MW, lifetime range)
+PROJECT_TYPES = {
+    'solar': (0.45, 40.0, 0.9e6, (25, 36)),
+    'wind': (0.30, 80.0, 1.4e6, (20, 31)),
+    'hydro': (0.08, 60.0, 2.5e6, (40, 61)),
+    'storage': (0.07, 30.0, 1.0e6, (12, 21)),
+    'biomass': (0.05, 20.0, 3.0e6, (20, 31)),
+    'geothermal': (0.05, 35.0, 4.0e6, (25, 41)),
+}
+OPEX_SHARE = (0.015, 0.03)      # annual OPEX as a share of CAPEX
+
+# Target countries: (share of projects, latitude, longitude)
+COUNTRIES = {
+    'United States': (0.20, 39.8, -98.6),
+    'China': (0.12, 35.0, 103.0),
+    'India': (0.10, 22.0, 79.0),
+    'Germany': (0.06, 51.2, 10.4),
+    'Brazil': (0.06, -10.8, -52.9),
+    'Australia': (0.05, -25.3, 133.8),
+    'Spain': (0.05, 40.4, -3.7),
+    'Mexico': (0.05, 23.6, -102.5),
+    'United Kingdom': (0.04, 54.0, -2.0),
+    'South Africa': (0.04, -29.0, 24.7),
+    'Chile': (0.04, -30.0, -71.0),
+    'Japan': (0.03, 36.2, 138.3),
+    'Turkey': (0.03, 39.0, 35.2),
+    'Indonesia': (0.03, -2.5, 118.0),
+    'Egypt': (0.03, 26.8, 30.8),
+    'Nigeria': (0.03, 9.1, 8.7),
+    'Pakistan': (0.02, 30.4, 69.3),
+    'Canada': (0.02, 56.1, -106.3),
+}
+HOME_COUNTRY_SHARE = 0.6        # projects developed by a sponsor from the target country
+
+STATUSES = {'planning': 0.35, 'construction': 0.2, 'operational': 0.4, 'decommissioned': 0.05}
+STATUS_RISKS = {'early_stage': 0.2, 'development': 0.3, 'construction': 0.2, 'operational': 0.3}
+OFF_TAKER_RATINGS = {
+    'AAA': 0.05, 'AA': 0.1, 'A+': 0.1, 'A': 0.15, 'A-': 0.1, 'BBB+': 0.1,
+    'BBB': 0.15, 'BBB-': 0.1, 'BB': 0.1, 'B': 0.05,
+}
+
+TRACKING_TYPES = {'fixed': 0.5, 'single-axis': 0.4, 'dual-axis': 0.1}
+PANEL_TYPES = {'monocrystalline': 0.7, 'polycrystalline': 0.2, 'thin-film': 0.1}
+
+# Share of projects with a PPA, and the range of their terms
+PPA_SHARE = 0.7
+PPA_PRICE = (30.0, 90.0)        # $/MWh
+PPA_ESCALATION = (0.0, 0.025)
+PPA_TERM = (10, 26)             # years
+
+
+def _choice(rng, options, size):
+    """Draw size keys of a {key: share} dictionary."""
+    keys = list(options)
+    shares = np.array([options[key] if np.isscalar(options[key]) else options[key][0] for key in keys])
+    return np.array(keys, dtype=object)[rng.choice(len(keys), size=size, p=shares / shares.sum())]
+
+
+def generate_chunk(seed_sequence, size):
+    """
+    Draw the attributes of one chunk of synthetic projects.
+
+    Parameters:
+    - seed_sequence: numpy.random.SeedSequence for this chunk
+    - size: Number of projects in the chunk
+
+    Returns: Dictionary of arrays, one entry per project
+    """
+    rng = np.random.default_rng(seed_sequence)
+
+    project_type = _choice(rng, PROJECT_TYPES, size)
+    median_mw = np.array([PROJECT_TYPES[value][1] for value in project_type])
+    capex_per_mw = np.array([PROJECT_TYPES[value][2] for value in project_type])
+    lifetime_low, lifetime_high = np.array([PROJECT_TYPES[value][3] for value in project_type]).T
+
+    capacity = np.clip(median_mw * rng.lognormal(0.0, 0.8, size), 1.0, 1500.0).round(1)
+    capex = capacity * capex_per_mw * rng.uniform(0.8, 1.2, size)
+    opex = capex * rng.uniform(*OPEX_SHARE, size)
+    lifetime = rng.integers(lifetime_low, lifetime_high)
+
+    target_country = _choice(rng, COUNTRIES, size)
+    home_country = np.where(rng.random(size) < HOME_COUNTRY_SHARE, target_country, _choice(rng, COUNTRIES, size))
+    centre = np.array([COUNTRIES[value][1:] for value in target_country])
+    latitude = np.clip(centre[:, 0] + rng.normal(0.0, 3.0, size), -60.0, 70.0).round(4)
+    longitude = (centre[:, 1] + rng.normal(0.0, 4.0, size) + 180.0) % 360.0 - 180.0
+
+    has_ppa = rng.random(size) < PPA_SHARE
+    values = {
+        'project_type': project_type,
+        'capacity_mw': capacity,
+        'capex': capex.round(0),
+        'opex_per_year': opex.round(0),
+        'expected_lifetime_years': lifetime,
+        'status': _choice(rng, STATUSES, size),
+        'latitude': latitude,
+        'longitude': longitude.round(4),
+        'home_country': home_country,
+        'target_country': target_country,
+        'technology_risk_factor': rng.beta(2.0, 5.0, size).round(2),
+        'project_status_risk': _choice(rng, STATUS_RISKS, size),
+        'off_taker_rating': _choice(rng, OFF_TAKER_RATINGS, size),
+        'funding_leverage': rng.uniform(1.0, 4.0, size).round(2),
+        'ppa_price': np.where(has_ppa, rng.uniform(*PPA_PRICE, size).round(2), np.nan),
+        'ppa_escalation': np.where(has_ppa, rng.uniform(*PPA_ESCALATION, size).round(4), np.nan),
+        'ppa_term': np.where(has_ppa, rng.integers(*PPA_TERM, size), np.nan),
+    }
+
+    # Solar parameters are drawn for every row, so the other columns do not
+    # depend on how many rows turn out to be solar
+    panel_capacity = rng.choice([400.0, 450.0, 500.0, 550.0, 600.0], size)
+    values.update({
+        'tracking_type': _choice(rng, TRACKING_TYPES, size),
+        'panel_type': _choice(rng, PANEL_TYPES, size),
+        'panel_efficiency': rng.uniform(17.0, 23.0, size).round(1),
+        'panel_capacity_w': panel_capacity,
+        'num_panels': (capacity * 1e6 / panel_capacity).astype(int),
+        'tilt_angle': (np.abs(latitude) * rng.uniform(0.8, 1.0, size)).round(1),
+        'azimuth': np.where(latitude >= 0, 180.0, 0.0),
+        'degradation_rate': rng.uniform(0.3, 0.8, size).round(2),
+        'performance_ratio': rng.uniform(0.72, 0.86, size).round(3),
+        'land_area_acres': (capacity * rng.uniform(4.0, 7.0, size)).round(1),
+    })
+    return values
+
+
+SOLAR_FIELDS = [
+    'tracking_type', 'panel_type', 'panel_efficiency', 'panel_capacity_w', 'num_panels',
+    'tilt_angle', 'azimuth', 'degradation_rate', 'performance_ratio', 'land_area_acres',
+]
+PROJECT_FIELDS = [
+    'project_type', 'capacity_mw', 'capex', 'opex_per_year', 'expected_lifetime_years', 'status',
+    'latitude', 'longitude', 'home_country', 'target_country', 'technology_risk_factor',
+    'project_status_risk', 'off_taker_rating', 'funding_leverage',
+]
+
+
+def _insert_solar_rows(solar_projects, batch_size):
+    """
+    Insert SolarProject child rows for parents that already exist.
+
+    Multi-table models cannot be bulk created, so the child table is written
+    directly with executemany().
+    """
+    fields = SolarProject._meta.local_concrete_fields
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(SolarProject._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields))
+    )
+    rows = [
+        [field.get_db_prep_save(getattr(solar_project, field.attname), connection) for field in fields]
+        for solar_project in solar_projects
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def write_chunk(seed_sequence, start, size, financials=True, batch_size=2000):
+    """
+    Generate one chunk of projects and write it to the database.
+
+    Parameters:
+    - seed_sequence: numpy.random.SeedSequence for this chunk
+    - start: Index of the chunk's first project, used in the project names
+    - size: Number of projects in the chunk
+    - financials: Also generate and store cash flows and financial metrics
+    - batch_size: Number of rows per INSERT statement
+
+    Returns: Tuple of (projects written, of which solar)
+    """
+    values = generate_chunk(seed_sequence, size)
+    columns = {name: values[name].tolist() for name in PROJECT_FIELDS + SOLAR_FIELDS}
+    scores = risk_score_arrays({name: columns[name] for name in RISK_INPUT_FIELDS})
+    columns.update({name: scores[name].tolist() for name in RISK_SCORE_FIELDS})
+
+    projects = [
+        Project(
+            name=f"Synthetic {columns['project_type'][i].title()} {start + i + 1}",
+            location=columns['target_country'][i],
+            type='solar' if columns['project_type'][i] == 'solar' else 'project',
+            **{name: columns[name][i] for name in PROJECT_FIELDS + RISK_SCORE_FIELDS}
+        )
+        for i in range(size)
+    ]
+
+    with transaction.atomic():
+        projects = Project.objects.bulk_create(projects, batch_size=batch_size)
+        solar_projects = [
+            SolarProject(project_ptr_id=project.pk, **{name: columns[name][i] for name in SOLAR_FIELDS})
+            for i, project in enumerate(projects) if project.project_type == 'solar'
+        ]
+        _insert_solar_rows(solar_projects, batch_size)
+
+        if financials:
+            project_rates = {
+                project.pk: {
+                    name: values[name][i] for name in ['ppa_price', 'ppa_escalation', 'ppa_term']
+                    if not np.isnan(values[name][i])
+                }
+                for i, project in enumerate(projects)
+            }
+            calculate_portfolio_metrics(
+                Project.objects.filter(pk__in=[project.pk for project in projects]),
+                project_rates=project_rates,
+                persist=True,
+                chunk_size=size
+            )
+
+    return len(projects), len(solar_projects)
+
+
+def _write_chunk_task(*args, **kwargs):
+    """Process pool entry point; each worker opens its own connection."""
+    try:
+        return write_chunk(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+def generate_portfolio(count, seed=0, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, financials=True,
+                       batch_size=2000, progress=None):
+    """
+    Generate a synthetic portfolio of count projects.
+
+    Memory is bounded by the chunk size: every chunk is generated, written
+    and released on its own, in one transaction.
+
+    Parameters:
+    - count: Number of projects to generate
+    - seed: Root seed; chunk k always uses child k of SeedSequence(seed)
+    - chunk_size: Number of projects generated and written per transaction
+    - workers: Number of worker processes. SQLite allows a single writer,
+      so it always uses one.
+    - financials: Also generate and store cash flows and financial metrics
+    - batch_size: Number of rows per INSERT statement
+    - progress: Optional callable receiving (projects written, count)
+
+    Returns: Dictionary with the number of 'projects' and 'solar_projects' written
+    """
+    if count < 0 or chunk_size < 1:
+        raise ValueError("count must be non-negative and chunk_size positive")
+    starts = list(range(0, count, chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    tasks = [(seeds[k], start, min(chunk_size, count - start)) for k, start in enumerate(starts)]
+    options = {'financials': financials, 'batch_size': batch_size}
+
+    written = {'projects': 0, 'solar_projects': 0}
+
+    def record(result):
+        written['projects'] += result[0]
+        written['solar_projects'] += result[1]
+        if progress:
+            progress(written['projects'], count)
+
+    if connection.vendor == 'sqlite':
+        workers = 1
+    if workers == 1 or len(tasks) < 2:
+        for task in tasks:
+            record(write_chunk(*task, **options))
+        return written
+
+    # Forked workers must not share the parent's database connection
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        futures = [executor.submit(_write_chunk_task, *task, **options) for task in tasks]
+        for future in as_completed(futures):
+            record(future.result())
+    return written
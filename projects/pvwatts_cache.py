@@ -0,0 +1,237 @@
+"""
+Persistent cache for PVWatts API responses.
+Responses are stored in the database, keyed on a hash of the request
+parameters with the coordinates rounded, so nearby requests for the same
+system share one entry. Hourly outputs are packed as compressed float32
+arrays.
+
+Entries expire after PVWATTS_CACHE_TTL seconds. When the packed outputs
+exceed PVWATTS_CACHE_MAX_BYTES in total, the least recently used entries
+are evicted. Hit, miss and eviction counters are kept in the single_flight
+cache, which is shared between processes by default.
+"""
+
+import hashlib
+import json
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import single_flight
+from .models import PVWattsResponse
+
+
+DEFAULT_TTL = 30 * 24 * 3600            # seconds
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Coordinates are rounded to this many decimals (about 100 m) before the
+# request is made and keyed
+COORDINATE_DECIMALS = 3
+
+# Output arrays at least this long are hourly and get packed
+MIN_HOURLY_LENGTH = 24
+
+HITS_KEY = 'pvwatts:hits'
+MISSES_KEY = 'pvwatts:misses'
+EXPIRED_KEY = 'pvwatts:expired'
+EVICTIONS_KEY = 'pvwatts:evictions'
+COUNTER_KEYS = [HITS_KEY, MISSES_KEY, EXPIRED_KEY, EVICTIONS_KEY]
+
+
+def request_params(latitude, longitude, system_capacity=1, azimuth=180, tilt=40, array_type=1, module_type=1,
+                   losses=10, timeframe='hourly'):
+    """
+    Canonical PVWatts request parameters, without the API key.
+
+    Returns: Dictionary of parameters, with the coordinates rounded
+    """
+    return {
+        'lat': round(float(latitude), COORDINATE_DECIMALS),
+        'lon': round(float(longitude), COORDINATE_DECIMALS),
+        'system_capacity': float(system_capacity),
+        'azimuth': float(azimuth),
+        'tilt': float(tilt),
+        'array_type': int(array_type),
+        'module_type': int(module_type),
+        'losses': float(losses),
+        'timeframe': timeframe,
+    }
+
+
+def cache_key(params):
+    """Hash of canonical request parameters."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def pack_response(response):
+    """
+    Split a PVWatts response into PVWattsResponse fields.
+
+    Returns: Dictionary of columns, hours, data, outputs, meta and size_bytes
+    """
+    outputs = dict(response.get('outputs') or {})
+    columns = [
+        name for name, values in outputs.items()
+        if isinstance(values, list) and len(values) >= MIN_HOURLY_LENGTH
+    ]
+    hours = len(outputs[columns[0]]) if columns else 0
+    columns = [name for name in columns if len(outputs[name]) == hours]
+
+    array = np.array([outputs.pop(name) for name in columns], dtype='<f4').reshape(len(columns), hours)
+    data = zlib.compress(array.tobytes(), 6)
+    return {
+        'columns': columns,
+        'hours': hours,
+        'data': data,
+        'outputs': outputs,
+        'meta': {name: value for name, value in response.items() if name != 'outputs'},
+        'size_bytes': len(data),
+    }
+
+
+def unpack_response(columns, hours, data, outputs, meta):
+    """Rebuild a PVWatts response dictionary from PVWattsResponse fields."""
+    array = np.frombuffer(zlib.decompress(bytes(data)), dtype='<f4').reshape(len(columns), hours)
+    response = dict(meta)
+    response['outputs'] = dict(outputs, **{name: array[i].astype(float).tolist() for i, name in enumerate(columns)})
+    return response
+
+
+def get(params, record=True):
+    """
+    Return the cached response for the request parameters, or None.
+
+    Hits refresh the entry's last access time; expired entries are deleted
+    and count as misses.
+
+    Parameters:
+    - params: Dictionary returned by request_params()
+    - record: Count the lookup in the hit/miss counters; False for a
+      re-check of a lookup that was already counted
+    """
+    key = cache_key(params)
+    now = timezone.now()
+    row = PVWattsResponse.objects.filter(key=key).values_list(
+        'pk', 'expires_at', 'columns', 'hours', 'data', 'outputs', 'meta'
+    ).first()
+    if row is not None and row[1] <= now:
+        PVWattsResponse.objects.filter(pk=row[0]).delete()
+        if record:
+            _increment(EXPIRED_KEY)
+        row = None
+    if row is None:
+        if record:
+            _increment(MISSES_KEY)
+        return None
+
+    PVWattsResponse.objects.filter(pk=row[0]).update(last_accessed_at=now, hit_count=F('hit_count') + 1)
+    if record:
+        _increment(HITS_KEY)
+    return unpack_response(*row[2:])
+
+
+def set(params, response, ttl=None):
+    """
+    Store a response for the request parameters and evict to the size bound.
+
+    Responses reporting errors are not cached.
+
+    Parameters:
+    - params: Dictionary returned by request_params()
+    - response: Decoded PVWatts JSON response
+    - ttl: Lifetime in seconds (default PVWATTS_CACHE_TTL)
+    """
+    if response.get('errors'):
+        return
+    ttl = getattr(settings, 'PVWATTS_CACHE_TTL', DEFAULT_TTL) if ttl is None else ttl
+    now = timezone.now()
+    PVWattsResponse.objects.update_or_create(key=cache_key(params), defaults=dict(
+        pack_response(response),
+        params=params,
+        hit_count=0,
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl),
+        last_accessed_at=now,
+    ))
+    evict()
+
+
+def evict(max_bytes=None):
+    """
+    Delete expired entries, then least recently used ones until the packed
+    outputs fit in max_bytes.
+
+    Parameters:
+    - max_bytes: Size bound (default PVWATTS_CACHE_MAX_BYTES)
+
+    Returns: Number of entries deleted
+    """
+    max_bytes = getattr(settings, 'PVWATTS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES) if max_bytes is None else max_bytes
+    deleted, _ = PVWattsResponse.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    excess = (PVWattsResponse.objects.aggregate(total=Sum('size_bytes'))['total'] or 0) - max_bytes
+    if excess > 0:
+        victims = []
+        for pk, size in PVWattsResponse.objects.order_by('last_accessed_at').values_list('pk', 'size_bytes').iterator():
+            if excess <= 0:
+                break
+            victims.append(pk)
+            excess -= size
+        deleted += PVWattsResponse.objects.filter(pk__in=victims).delete()[0]
+
+    if deleted:
+        _increment(EVICTIONS_KEY, deleted)
+    return deleted
+
+
+def clear():
+    """Delete every cached response."""
+    PVWattsResponse.objects.all().delete()
+
+
+def _cache():
+    return caches[single_flight.CACHE_ALIAS]
+
+
+def _increment(key, delta=1):
+    cache = _cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Counter evicted between add() and incr()
+        cache.set(key, delta, None)
+
+
+def stats():
+    """
+    Cache counters and size.
+
+    Returns: Dictionary with hits, misses, expired, evictions, hit_rate,
+    entries and bytes
+    """
+    counters = _cache().get_many(COUNTER_KEYS)
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    size = PVWattsResponse.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+    return {
+        'hits': hits,
+        'misses': misses,
+        'expired': counters.get(EXPIRED_KEY, 0),
+        'evictions': counters.get(EVICTIONS_KEY, 0),
+        'hit_rate': hits / lookups if lookups else 0.0,
+        'entries': PVWattsResponse.objects.count(),
+        'bytes': size,
+        'max_bytes': getattr(settings, 'PVWATTS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+    }
+
+
+def reset_stats():
+    """Reset the hit/miss counters."""
+    _cache().delete_many(COUNTER_KEYS)
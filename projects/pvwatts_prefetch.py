@@ -0,0 +1,187 @@
+"""
+Concurrent, rate-limited PVWatts prefetch for many sites.
+
+Requests run on a pooled requests.Session from an asyncio event loop in a
+background thread, with a token bucket for the API rate limit, a semaphore
+bounding concurrency and retries with exponential backoff for throttling
+and transient failures. Responses are stored in the persistent PVWatts
+cache by the calling thread as they arrive, so an interrupted prefetch
+resumes where it stopped: sites with a fresh cache entry are skipped.
+"""
+
+import asyncio
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from . import pvwatts_cache
+from .models import PVWattsResponse
+from .solar_service import PVWATTS_URL, fetch_pvwatts
+
+
+# NREL allows 1,000 requests per hour per API key by default
+DEFAULT_RATE = 1000 / 3600              # requests per second
+DEFAULT_BURST = 5
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 2.0                   # seconds, doubled per attempt
+MAX_BACKOFF = 120.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, up to `burst` at once"""
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_delay(error, attempt, backoff):
+    """
+    Seconds to wait before retrying a failed request, or None when the
+    failure is not transient.
+
+    Throttled responses are retried after their Retry-After header when it
+    gives a number of seconds.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        if response.status_code not in RETRY_STATUSES:
+            return None
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(float(retry_after), MAX_BACKOFF)
+    elif not isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return None
+    return min(backoff * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+
+async def _fetch_one(params, fetch, bucket, semaphore, executor, retries, backoff):
+    loop = asyncio.get_running_loop()
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        async with semaphore:
+            try:
+                return await loop.run_in_executor(executor, fetch, params), None
+            except requests.exceptions.RequestException as e:
+                error = e
+        delay = retry_delay(error, attempt, backoff)
+        if delay is None or attempt == retries:
+            return None, str(error)
+        await asyncio.sleep(delay)
+
+
+async def _fetch_all(todo, fetch, rate, burst, concurrency, retries, backoff, deliver):
+    bucket = TokenBucket(rate, burst)
+    semaphore = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def run(params):
+            data, error = await _fetch_one(params, fetch, bucket, semaphore, executor, retries, backoff)
+            deliver((params, data, error))
+
+        await asyncio.gather(*(run(params) for params in todo))
+
+
+def prefetch_pvwatts(sites, api_key=None, fetcher=None, url=PVWATTS_URL, rate=None, burst=DEFAULT_BURST,
+                     concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                     refresh=False, progress=None):
+    """
+    Fetch the 1 kW hourly PVWatts responses of many sites into the cache.
+
+    Parameters:
+    - sites: Iterable of (latitude, longitude) pairs; duplicates after
+      coordinate rounding are fetched once
+    - api_key: NREL API key, used unless a fetcher is given
+    - fetcher: Optional callable taking the request parameters and returning
+      the decoded response, used instead of the HTTP API
+    - url: PVWatts endpoint (default: the NREL API)
+    - rate: Requests per second (default PVWATTS_RATE_LIMIT)
+    - burst: Requests allowed at once after an idle period
+    - concurrency: Maximum requests in flight
+    - retries: Retries per site for throttling and transient errors
+    - backoff: First retry delay in seconds, doubled per attempt
+    - refresh: Refetch sites that already have a fresh cache entry
+    - progress: Optional callable(done, total) called after each site
+
+    Returns: Dictionary with counts of sites, cached, fetched and failed,
+    and the error message of each failed site by 'lat,lon'
+    """
+    rate = getattr(settings, 'PVWATTS_RATE_LIMIT', DEFAULT_RATE) if rate is None else rate
+    unique = {}
+    for latitude, longitude in sites:
+        params = pvwatts_cache.request_params(latitude, longitude)
+        unique.setdefault(pvwatts_cache.cache_key(params), params)
+
+    cached = set()
+    if not refresh:
+        cached = set(PVWattsResponse.objects.filter(
+            key__in=list(unique), expires_at__gt=timezone.now()
+        ).values_list('key', flat=True))
+    todo = [params for key, params in unique.items() if key not in cached]
+    result = {'sites': len(unique), 'cached': len(cached), 'fetched': 0, 'failed': 0, 'errors': {}}
+    if not todo:
+        return result
+
+    if fetcher is None:
+        session = requests.Session()
+        session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+
+        def fetcher(params):
+            return fetch_pvwatts(params, api_key, session=session, url=url)
+
+    # The event loop only does HTTP; the cache is written from this thread,
+    # which owns the database connection
+    results = queue.Queue()
+    done = object()
+
+    def run_loop():
+        try:
+            asyncio.run(_fetch_all(todo, fetcher, rate, burst, concurrency, retries, backoff, results.put))
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(done)
+
+    thread = threading.Thread(target=run_loop, name='pvwatts-prefetch', daemon=True)
+    thread.start()
+    while (item := results.get()) is not done:
+        if isinstance(item, BaseException):
+            raise item
+        params, data, error = item
+        if data is not None and data.get('errors'):
+            data, error = None, '; '.join(data['errors'])
+        if data is None:
+            result['failed'] += 1
+            result['errors'][f"{params['lat']},{params['lon']}"] = error
+        else:
+            pvwatts_cache.set(params, data)
+            result['fetched'] += 1
+        if progress is not None:
+            progress(result['fetched'] + result['failed'], len(todo))
+    thread.join()
+    return result
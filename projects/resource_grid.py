@@ -0,0 +1,147 @@
+"""
+Spatial grid of precomputed hourly solar profiles.
+
+Profiles are fetched for the nodes of a regular latitude/longitude grid,
+one grid per source, system and tilt/azimuth bucket, and any site is served
+by bilinear interpolation of its four surrounding nodes. Nodes are filled
+on first use and stored as float32 .npy files that are memory-mapped on
+read, so sites within the same cells share their upstream fetches.
+"""
+
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .hourly_model import HOURS_PER_YEAR
+from .solar_service import SolarProfile
+
+
+DEFAULT_RESOLUTION = 0.05               # degrees, about 5 km
+DEFAULT_TILT_STEP = 5.0                 # degrees
+DEFAULT_AZIMUTH_STEP = 15.0             # degrees
+
+# Open memory maps kept per process
+MAX_OPEN_NODES = 4096
+
+# Interpolation weights below this are treated as zero, so sites on a node
+# or cell edge need fewer nodes
+WEIGHT_TOLERANCE = 1e-9
+
+_nodes = OrderedDict()
+
+
+def bucket(value, step):
+    """Round an angle to the nearest multiple of step."""
+    return float(round(value / step) * step)
+
+
+class SolarResourceGrid:
+    """Hourly 1 kW profiles at grid nodes, interpolated to any site"""
+
+    def __init__(self, fetch, source='pvwatts', resolution=None, directory=None, array_type=1, module_type=1,
+                 losses=10, tilt_step=DEFAULT_TILT_STEP, azimuth_step=DEFAULT_AZIMUTH_STEP):
+        """
+        Parameters:
+        - fetch: Callable taking (latitude, longitude, system_capacity=1, tilt=...,
+          azimuth=..., array_type=..., module_type=..., losses=...) and returning a
+          PVWatts style response, e.g. SolarRadiationService.get_solar_data
+        - source: Name of the data source, part of the grid's storage key
+        - resolution: Node spacing in degrees (default SOLAR_GRID_RESOLUTION)
+        - directory: Storage directory (default SOLAR_GRID_DIR)
+        - array_type, module_type, losses: PVWatts system parameters
+        - tilt_step, azimuth_step: Tilt and azimuth bucket sizes in degrees
+        """
+        self.fetch = fetch
+        self.source = source
+        self.resolution = float(resolution or getattr(settings, 'SOLAR_GRID_RESOLUTION', 0) or DEFAULT_RESOLUTION)
+        self.directory = directory or settings.SOLAR_GRID_DIR
+        self.system = {'array_type': int(array_type), 'module_type': int(module_type), 'losses': float(losses)}
+        self.tilt_step = tilt_step
+        self.azimuth_step = azimuth_step
+        self.fetches = 0
+
+    def _grid_dir(self, tilt, azimuth):
+        key = dict(self.system, source=self.source, resolution=self.resolution, tilt=tilt, azimuth=azimuth)
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{self.source}-{digest}")
+
+    def cells(self, latitude, longitude):
+        """
+        Grid nodes and bilinear weights around a site.
+
+        Returns: List of ((lat_index, lon_index), weight) with non-zero weights
+        """
+        y = latitude / self.resolution
+        x = longitude / self.resolution
+        i, j = math.floor(y), math.floor(x)
+        fy, fx = y - i, x - j
+        nodes = [((i, j), (1 - fy) * (1 - fx)), ((i + 1, j), fy * (1 - fx)),
+                 ((i, j + 1), (1 - fy) * fx), ((i + 1, j + 1), fy * fx)]
+        return [(node, weight) for node, weight in nodes if weight > WEIGHT_TOLERANCE]
+
+    def node(self, lat_index, lon_index, tilt, azimuth):
+        """
+        Memory-mapped hourly AC output (W for 1 kW) of a grid node, fetched on first use.
+
+        Returns: numpy.memmap of HOURS_PER_YEAR float32 values
+        """
+        grid_dir = self._grid_dir(tilt, azimuth)
+        path = os.path.join(grid_dir, f"{lat_index}_{lon_index}.npy")
+        array = _nodes.get(path)
+        if array is not None:
+            _nodes.move_to_end(path)
+            return array
+
+        if not os.path.exists(path):
+            latitude = min(max(lat_index * self.resolution, -90.0), 90.0)
+            longitude = (lon_index * self.resolution + 180.0) % 360.0 - 180.0
+            response = self.fetch(latitude, longitude, system_capacity=1, tilt=tilt, azimuth=azimuth, **self.system)
+            self.fetches += 1
+            ac = np.asarray(SolarProfile.from_response(response).ac, dtype='<f4')
+
+            os.makedirs(grid_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, ac)
+            os.replace(tmp_path, path)
+
+        array = np.load(path, mmap_mode='r')
+        _nodes[path] = array
+        if len(_nodes) > MAX_OPEN_NODES:
+            _nodes.popitem(last=False)
+        return array
+
+    def hourly(self, latitude, longitude, tilt=40, azimuth=180):
+        """
+        Interpolated hourly AC output (W for 1 kW) of a site.
+
+        Tilt and azimuth are rounded to their buckets.
+
+        Returns: Array of HOURS_PER_YEAR values
+        """
+        tilt = bucket(tilt, self.tilt_step)
+        azimuth = bucket(azimuth, self.azimuth_step) % 360
+        ac = np.zeros(HOURS_PER_YEAR)
+        for (lat_index, lon_index), weight in self.cells(latitude, longitude):
+            ac += weight * self.node(lat_index, lon_index, tilt, azimuth)
+        return ac
+
+    def profile(self, latitude, longitude, tilt=40, azimuth=180):
+        """
+        Interpolated SolarProfile of a site.
+
+        Returns: SolarProfile
+        """
+        ac = self.hourly(latitude, longitude, tilt, azimuth)
+        ac_annual = float(ac.sum() / 1000)
+        return SolarProfile(ac, ac_annual, ac_annual / HOURS_PER_YEAR * 100)
+
+
+def clear_open_nodes():
+    """Drop the per-process memory maps, e.g. after grid files were removed."""
+    _nodes.clear()
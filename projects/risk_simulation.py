@@ -0,0 +1,298 @@
+"""
+Monte Carlo risk simulation for the Energy Finance application.
+Turns a project's risk fields into yield, price, OPEX, off-taker default and
+curtailment distributions and simulates thousands of cash flow paths at once.
+
+Paths are processed in chunks and only aggregate statistics are kept, so
+memory stays flat however many paths are requested. Portfolios fan out across
+a process pool; every project draws from its own child SeedSequence, so
+results do not depend on the number of workers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+import numpy as np
+
+from . import financial_kernels
+from .cash_flow_engine import (add_hourly_overrides, build_cash_flow_matrix, load_cash_flow_inputs, load_ppa_terms,
+                               project_cash_flow_inputs, resolve_ppa_terms, STORED,
+                               MAINTENANCE_SHARE, INSURANCE_SHARE, INTEREST_DEDUCTIBLE_SHARE, TAX_RATE)
+from .risk_tables import get_risk_lookup
+from .utils import (_calculate_country_risk, _calculate_technology_risk, _calculate_status_risk,
+                    _calculate_off_taker_risk)
+
+
+RISK_FIELDS = ['project_type', 'home_country', 'target_country', 'technology_risk_factor',
+               'project_status_risk', 'off_taker_rating']
+
+# Share of revenue still earned after an off-taker default (re-contracting at merchant terms)
+DEFAULT_REVENUE_RECOVERY = 0.6
+
+HISTOGRAM_BINS = 4096
+
+# Upper bound on paths per project for interactive requests
+MAX_SIMULATION_PATHS = 100000
+
+
+def risk_parameters(project_type=None, home_country=None, target_country=None, technology_risk_factor=None,
+                    project_status_risk=None, off_taker_rating=None, lookup=None):
+    """
+    Derive simulation distributions from a project's risk assessment fields.
+
+    Each 1-5 risk score is mapped onto a volatility or an annual event
+    probability, so riskier projects get wider outcome distributions.
+    Pass a RiskLookup when deriving parameters for many projects.
+
+    Returns: Dictionary of distribution parameters
+    """
+    lookup = lookup or get_risk_lookup()
+    country = _calculate_country_risk(home_country, target_country, lookup)
+    technology = _calculate_technology_risk(project_type, technology_risk_factor, lookup)
+    status = _calculate_status_risk(project_status_risk, lookup)
+    off_taker = _calculate_off_taker_risk(off_taker_rating, lookup)
+
+    if technology_risk_factor is not None:
+        yield_sigma = 0.03 + 0.12 * min(max(float(technology_risk_factor), 0), 1)
+    else:
+        yield_sigma = 0.03 + 0.12 * (technology - 1) / 4
+
+    return {
+        'yield_sigma': yield_sigma,
+        'price_sigma': 0.03 + 0.02 * (country - 1),
+        'opex_sigma': 0.05 + 0.10 * (status - 1) / 4,
+        'default_probability': min(0.0002 * np.exp(1.9 * (off_taker - 1)), 1.0),
+        'curtailment_probability': 0.02 * country,
+        'curtailment_loss': (0.05, 0.15),
+    }
+
+
+def _base_case(inputs, rates, ppa_terms):
+    """Build the deterministic cash flows a simulation perturbs."""
+    schedule = build_cash_flow_matrix(
+        inputs,
+        inflation_rate=rates['inflation_rate'],
+        debt_ratio=rates['debt_ratio'],
+        interest_rate=rates['interest_rate'],
+        **ppa_terms
+    )
+    columns = ['revenue', 'opex', 'debt_service', 'salvage_value', 'net_cash_flow']
+    return {name: schedule[name][0] for name in columns}
+
+
+class SimulationStats:
+    """Mergeable running statistics over simulated NPVs"""
+
+    def __init__(self, low, high, bins=HISTOGRAM_BINS):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins + 2, dtype=np.int64)   # plus underflow and overflow
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.below_hurdle = 0
+        self.negative_npv = 0
+
+    def add(self, npv, npv_at_hurdle):
+        """Fold a chunk of path results into the statistics."""
+        n = len(npv)
+        chunk_mean = npv.mean()
+        chunk_m2 = ((npv - chunk_mean) ** 2).sum()
+        self._merge_moments(n, chunk_mean, chunk_m2)
+        self.minimum = min(self.minimum, npv.min())
+        self.maximum = max(self.maximum, npv.max())
+        self.counts += np.bincount(np.searchsorted(self.edges, npv, side='right'), minlength=len(self.counts))
+        # IRR is below the hurdle exactly when the NPV at the hurdle rate is negative
+        self.below_hurdle += int((npv_at_hurdle < 0).sum())
+        self.negative_npv += int((npv < 0).sum())
+
+    def merge(self, other):
+        """Combine with statistics gathered over the same histogram edges."""
+        self._merge_moments(other.count, other.mean, other.m2)
+        self.counts += other.counts
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.below_hurdle += other.below_hurdle
+        self.negative_npv += other.negative_npv
+
+    def _merge_moments(self, n, mean, m2):
+        # Chan et al. parallel update of mean and sum of squared deviations
+        total = self.count + n
+        if not total:
+            return
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def quantile(self, q):
+        """Approximate quantile by interpolating inside the histogram bin."""
+        target = q * self.count
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, target))
+        if index == 0:
+            return float(self.minimum)
+        if index == len(self.counts) - 1:
+            return float(self.maximum)
+        below = cumulative[index - 1]
+        fraction = (target - below) / self.counts[index] if self.counts[index] else 0.0
+        low, high = self.edges[index - 1], self.edges[index]
+        return float(np.clip(low + fraction * (high - low), self.minimum, self.maximum))
+
+    def summary(self):
+        """Aggregate results as plain Python values."""
+        return {
+            'paths': self.count,
+            'npv_mean': float(self.mean),
+            'npv_std': float(np.sqrt(self.m2 / self.count)) if self.count else 0.0,
+            'npv_min': float(self.minimum),
+            'npv_max': float(self.maximum),
+            'npv_p10': self.quantile(0.10),
+            'npv_p50': self.quantile(0.50),
+            'npv_p90': self.quantile(0.90),
+            'probability_npv_negative': self.negative_npv / self.count if self.count else 0.0,
+            'probability_irr_below_hurdle': self.below_hurdle / self.count if self.count else 0.0,
+        }
+
+
+def _simulate_chunk(base, params, rates, n_paths, rng):
+    """Simulate n_paths cash flow paths and return (npv, npv at hurdle)."""
+    revenue = base['revenue'][None, :]
+    years = revenue.shape[1]
+
+    # Energy yield: a persistent resource bias plus year-to-year noise
+    sigma = params['yield_sigma']
+    yield_factor = 1 + sigma / 2 * rng.standard_normal((n_paths, 1)) + sigma * rng.standard_normal((n_paths, years))
+
+    # Power price follows a driftless geometric random walk
+    shocks = params['price_sigma'] * rng.standard_normal((n_paths, years))
+    price_factor = np.exp(np.cumsum(shocks, axis=1) - 0.5 * params['price_sigma'] ** 2 * np.arange(1, years + 1))
+
+    # Curtailment events remove part of the year's energy
+    curtailed = rng.random((n_paths, years)) < params['curtailment_probability']
+    low, high = params['curtailment_loss']
+    curtailment = np.where(curtailed, rng.uniform(low, high, (n_paths, years)), 0.0)
+
+    # Off-taker default: revenue drops to the recovery share from the default year on
+    default_year = rng.geometric(params['default_probability'], n_paths) if params['default_probability'] > 0 \
+        else np.full(n_paths, years + 1)
+    defaulted = np.arange(years)[None, :] >= default_year[:, None]
+    default_factor = np.where(defaulted, DEFAULT_REVENUE_RECOVERY, 1.0)
+
+    opex_factor = np.exp(params['opex_sigma'] * rng.standard_normal((n_paths, 1)) - 0.5 * params['opex_sigma'] ** 2)
+
+    path_revenue = revenue * np.maximum(yield_factor, 0) * price_factor * (1 - curtailment) * default_factor
+    opex = base['opex'][None, :] * opex_factor
+    operating_costs = -opex * (MAINTENANCE_SHARE + INSURANCE_SHARE)
+    debt_service = base['debt_service'][None, :]
+
+    taxable_income = path_revenue + opex + operating_costs + debt_service * INTEREST_DEDUCTIBLE_SHARE
+    taxes = np.where(taxable_income > 0, -taxable_income * TAX_RATE, 0.0)
+    net = path_revenue + opex + operating_costs + debt_service + taxes + base['salvage_value'][None, :]
+    net[:, 0] = base['net_cash_flow'][0]
+
+    return (financial_kernels.npv(rates['discount_rate'], net),
+            financial_kernels.npv(rates['hurdle_rate'], net))
+
+
+def simulate(base, params, rates, n_paths=10000, seed=None, chunk_size=10000):
+    """
+    Run a Monte Carlo simulation for one project.
+
+    Parameters:
+    - base: Deterministic cash flow columns from _base_case()
+    - params: Distribution parameters from risk_parameters()
+    - rates: Dictionary with discount_rate and hurdle_rate
+    - n_paths: Number of simulated paths
+    - seed: Integer seed or numpy SeedSequence for reproducible results
+    - chunk_size: Paths simulated per vectorized chunk
+
+    Returns: SimulationStats instance
+    """
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    # Histogram range scales with the size of the investment
+    scale = max(abs(base['net_cash_flow']).sum(), 1.0)
+    base_npv = financial_kernels.npv(rates['discount_rate'], base['net_cash_flow'])
+    stats = SimulationStats(base_npv - 2 * scale, base_npv + 2 * scale)
+
+    chunks = range(0, n_paths, chunk_size)
+    for start, child in zip(chunks, seed_sequence.spawn(len(chunks))):
+        size = min(chunk_size, n_paths - start)
+        npv, npv_at_hurdle = _simulate_chunk(base, params, rates, size, np.random.default_rng(child))
+        stats.add(npv, npv_at_hurdle)
+    return stats
+
+
+def simulate_project(project, n_paths=10000, seed=None, discount_rate=0.08, inflation_rate=0.025,
+                     debt_ratio=0.7, interest_rate=0.05, hurdle_rate=0.1,
+                     ppa_price=STORED, ppa_escalation=STORED, ppa_term=STORED):
+    """
+    Run a Monte Carlo simulation for a Project or SolarProject instance, on
+    its stored PPA terms unless PPA terms are given (see resolve_ppa_terms()).
+
+    Returns: Dictionary of aggregate statistics (P10/P50/P90 NPV, probability
+    of IRR below the hurdle rate, ...)
+    """
+    rates = {
+        'discount_rate': discount_rate,
+        'inflation_rate': inflation_rate,
+        'debt_ratio': debt_ratio,
+        'interest_rate': interest_rate,
+        'hurdle_rate': hurdle_rate,
+    }
+    base = _base_case(add_hourly_overrides([project.pk], project_cash_flow_inputs([project])), rates,
+                      resolve_ppa_terms([project.pk], ppa_price, ppa_escalation, ppa_term))
+    params = risk_parameters(**{field: getattr(project, field) for field in RISK_FIELDS})
+    return simulate(base, params, rates, n_paths=n_paths, seed=seed).summary()
+
+
+def _simulate_task(project_id, base, params, rates, n_paths, seed_sequence):
+    """Process pool entry point; works on plain arrays only."""
+    return project_id, simulate(base, params, rates, n_paths=n_paths, seed=seed_sequence).summary()
+
+
+def iter_portfolio_simulation(queryset, n_paths=10000, seed=None, workers=None, discount_rate=0.08,
+                              inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05, hurdle_rate=0.1):
+    """
+    Simulate every project in a queryset across a process pool.
+
+    Results are yielded as soon as each project finishes, so callers can
+    stream them instead of waiting for the whole portfolio.
+
+    Parameters:
+    - queryset: A Project queryset
+    - n_paths: Paths per project
+    - seed: Root seed; project i always uses child i of SeedSequence(seed)
+    - workers: Number of worker processes (default: one per CPU)
+
+    Yields: (project_id, summary dictionary) tuples
+    """
+    rates = {
+        'discount_rate': discount_rate,
+        'inflation_rate': inflation_rate,
+        'debt_ratio': debt_ratio,
+        'interest_rate': interest_rate,
+        'hurdle_rate': hurdle_rate,
+    }
+    queryset = queryset.order_by('pk')
+    ids, inputs = load_cash_flow_inputs(queryset)
+    inputs = add_hourly_overrides(ids.tolist(), inputs)
+    ppa_terms = load_ppa_terms(ids)
+    risk_rows = dict((row[0], row[1:]) for row in queryset.values_list('id', *RISK_FIELDS))
+    lookup = get_risk_lookup()
+    seeds = np.random.SeedSequence(seed).spawn(len(ids))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        futures = []
+        for index, project_id in enumerate(ids.tolist()):
+            row_inputs = {name: values[index:index + 1] for name, values in inputs.items()}
+            row_ppa = {name: values[index:index + 1] for name, values in ppa_terms.items()}
+            params = risk_parameters(**dict(zip(RISK_FIELDS, risk_rows[project_id])), lookup=lookup)
+            futures.append(executor.submit(
+                _simulate_task, project_id, _base_case(row_inputs, rates, row_ppa), params, rates, n_paths,
+                seeds[index]
+            ))
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,317 @@
+"""
+Risk score lookup tables for the Energy Finance application.
+
+The country, technology, status and off-taker tables are stored as versioned
+RiskTable rows. Each process loads the active versions once into an immutable
+RiskLookup and reloads only when another version is activated, which it
+notices by comparing the ids and activation times of the active tables (one
+query on the partial unique index of active tables) with those it loaded.
+
+Activating a version rescores only the projects whose country, project type,
+status or rating resolves to an entry whose score changed.
+"""
+
+from types import MappingProxyType
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Project, RiskAlias, RiskTable, RiskTableEntry, RISK_TABLE_FIELDS, normalize_risk_key
+
+
+# Built-in tables, used for any kind without an active RiskTable version and
+# copied into version 1 by the 0009 data migration
+COUNTRY_RISK_SCORES = {
+    # Low risk countries
+    'united states': 1.0,
+    'canada': 1.0,
+    'australia': 1.0,
+    'germany': 1.0,
+    'united kingdom': 1.0,
+    'france': 1.0,
+    'japan': 1.0,
+    'south korea': 1.0,
+    'singapore': 1.0,
+
+    # Medium risk countries
+    'mexico': 2.0,
+    'brazil': 2.5,
+    'china': 2.5,
+    'india': 2.5,
+    'south africa': 2.5,
+    'turkey': 2.5,
+    'thailand': 2.0,
+    'malaysia': 2.0,
+    'indonesia': 2.5,
+    'chile': 2.0,
+
+    # Higher risk countries
+    'nigeria': 3.5,
+    'egypt': 3.0,
+    'pakistan': 3.5,
+    'ukraine': 3.5,
+    'iraq': 4.0,
+    'venezuela': 4.0,
+    'libya': 4.5,
+    'afghanistan': 5.0,
+    'syria': 5.0,
+    'yemen': 5.0,
+}
+
+TECHNOLOGY_RISK_SCORES = {
+    'solar': 1.5,  # Solar is relatively low risk
+    'wind': 1.8,   # Wind slightly higher
+    'hydro': 2.2,  # Hydro has more variables
+    'biomass': 2.5,
+    'geothermal': 2.8,
+    'tidal': 3.5,  # Emerging technologies higher risk
+    'wave': 3.8,
+    'hydrogen': 4.0,
+}
+
+STATUS_RISK_SCORES = {
+    'early_stage': 4.5,     # Highest risk
+    'development': 3.5,
+    'construction': 2.5,
+    'operational': 1.5      # Lowest risk
+}
+
+OFF_TAKER_RISK_SCORES = {
+    'AAA': 1.0,
+    'AA+': 1.1,
+    'AA': 1.2,
+    'AA-': 1.3,
+    'A+': 1.5,
+    'A': 1.7,
+    'A-': 1.9,
+    'BBB+': 2.1,
+    'BBB': 2.3,
+    'BBB-': 2.5,
+    'BB+': 2.7,
+    'BB': 2.9,
+    'BB-': 3.1,
+    'B+': 3.3,
+    'B': 3.5,
+    'B-': 3.7,
+    'CCC+': 4.0,
+    'CCC': 4.3,
+    'CCC-': 4.5,
+    'CC': 4.7,
+    'C': 4.9,
+    'D': 5.0,
+}
+
+BUILTIN_RISK_TABLES = {
+    'country': COUNTRY_RISK_SCORES,
+    'technology': TECHNOLOGY_RISK_SCORES,
+    'status': STATUS_RISK_SCORES,
+    'off_taker': OFF_TAKER_RISK_SCORES,
+}
+
+BUILTIN_RISK_ALIASES = {
+    'country': {
+        'usa': 'united states',
+        'us': 'united states',
+        'u.s.': 'united states',
+        'u.s.a.': 'united states',
+        'united states of america': 'united states',
+        'uk': 'united kingdom',
+        'great britain': 'united kingdom',
+        'britain': 'united kingdom',
+        'korea': 'south korea',
+        'republic of korea': 'south korea',
+    },
+    'technology': {
+        'pv': 'solar',
+        'photovoltaic': 'solar',
+        'onshore wind': 'wind',
+        'offshore wind': 'wind',
+    },
+    'status': {},
+    'off_taker': {},
+}
+
+class RiskLookup:
+    """Immutable risk scores and aliases for every table kind"""
+
+    __slots__ = ('scores', 'aliases', 'versions')
+
+    def __init__(self, scores, aliases, versions):
+        def freeze(tables):
+            return MappingProxyType({kind: MappingProxyType(dict(table)) for kind, table in tables.items()})
+
+        object.__setattr__(self, 'scores', freeze(scores))
+        object.__setattr__(self, 'aliases', freeze(aliases))
+        object.__setattr__(self, 'versions', MappingProxyType(dict(versions)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RiskLookup is immutable")
+
+    def resolve(self, kind, value):
+        """Table key a project field value refers to, or None when it is empty."""
+        key = normalize_risk_key(kind, value)
+        if key is None:
+            return None
+        return self.aliases[kind].get(key, key)
+
+    def score(self, kind, value, default):
+        """Score of a project field value, default when it is empty or unknown."""
+        key = self.resolve(kind, value)
+        if key is None:
+            return default
+        return self.scores[kind].get(key, default)
+
+
+def load_risk_lookup():
+    """
+    Build a RiskLookup from the active RiskTable versions.
+
+    Kinds without an active version use the built-in tables (version 0).
+    """
+    scores = {kind: dict(table) for kind, table in BUILTIN_RISK_TABLES.items()}
+    aliases = {kind: dict(table) for kind, table in BUILTIN_RISK_ALIASES.items()}
+    versions = {kind: 0 for kind in BUILTIN_RISK_TABLES}
+
+    tables = {}
+    for table_id, kind, version in RiskTable.objects.filter(is_active=True).values_list('id', 'kind', 'version'):
+        tables[table_id] = kind
+        scores[kind], aliases[kind], versions[kind] = {}, {}, version
+    for table_id, key, score in RiskTableEntry.objects.filter(table_id__in=tables).values_list('table_id', 'key', 'score'):
+        scores[tables[table_id]][key] = score
+    for table_id, alias, key in RiskAlias.objects.filter(table_id__in=tables).values_list('table_id', 'alias', 'key'):
+        aliases[tables[table_id]][alias] = key
+
+    return RiskLookup(scores, aliases, versions)
+
+
+_lookup = None
+_lookup_token = None
+
+
+def _active_tables_token():
+    """Ids and activation times of the active RiskTable versions."""
+    return frozenset(RiskTable.objects.filter(is_active=True).values_list('id', 'activated_at'))
+
+
+def get_risk_lookup():
+    """
+    The process-wide RiskLookup, reloaded after a version is activated anywhere.
+
+    Costs one query on the active tables per call; callers scoring many
+    projects should fetch the lookup once and pass it on.
+
+    Returns: RiskLookup
+    """
+    global _lookup, _lookup_token
+    token = _active_tables_token()
+    if _lookup is None or token != _lookup_token:
+        _lookup, _lookup_token = load_risk_lookup(), token
+    return _lookup
+
+
+def clear_risk_lookup():
+    """Make this process reload its RiskLookup on next use."""
+    global _lookup
+    _lookup = None
+
+
+def _table_contents(table, kind):
+    """(scores, aliases) of a RiskTable, or of the built-in table when it is None."""
+    if table is None:
+        return dict(BUILTIN_RISK_TABLES[kind]), dict(BUILTIN_RISK_ALIASES[kind])
+    return (dict(table.entries.values_list('key', 'score')),
+            dict(table.aliases.values_list('alias', 'key')))
+
+
+def changed_risk_keys(kind, old_table, new_table):
+    """
+    Normalized values whose score differs between two versions of a table.
+
+    Values are resolved through each version's own aliases, so retargeting
+    an alias counts as a change when it moves the alias to a different score.
+
+    Parameters:
+    - kind: RiskTable kind
+    - old_table, new_table: RiskTable instances, None for the built-in table
+
+    Returns: Set of normalized values
+    """
+    old_scores, old_aliases = _table_contents(old_table, kind)
+    new_scores, new_aliases = _table_contents(new_table, kind)
+    names = set(old_scores) | set(new_scores) | set(old_aliases) | set(new_aliases)
+    return {
+        name for name in names
+        if old_scores.get(old_aliases.get(name, name)) != new_scores.get(new_aliases.get(name, name))
+    }
+
+
+def affected_projects(kind, keys):
+    """
+    Projects whose risk fields of a kind normalize to any of the given values.
+
+    Stored spellings vary ("USA", " usa"), so the distinct values of each
+    field are read first and the matching ones selected with indexed IN
+    lookups.
+
+    Parameters:
+    - kind: RiskTable kind
+    - keys: Set of normalized values, as returned by changed_risk_keys()
+
+    Returns: Project queryset
+    """
+    condition = Q(pk__in=[])
+    for field in RISK_TABLE_FIELDS[kind]:
+        values = Project.objects.exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct()
+        matching = [value for value in values if normalize_risk_key(kind, value) in keys]
+        if matching:
+            condition |= Q(**{f'{field}__in': matching})
+    return Project.objects.filter(condition)
+
+
+def draft_risk_table(kind, description=''):
+    """
+    Copy the active version of a table (or the built-in one) into a new inactive version.
+
+    Returns: The new RiskTable
+    """
+    active = RiskTable.objects.filter(kind=kind, is_active=True).first()
+    scores, aliases = _table_contents(active, kind)
+    version = (RiskTable.objects.filter(kind=kind).aggregate(Max('version'))['version__max'] or 0) + 1
+
+    with transaction.atomic():
+        table = RiskTable.objects.create(kind=kind, version=version, description=description)
+        RiskTableEntry.objects.bulk_create([RiskTableEntry(table=table, key=key, score=score)
+                                            for key, score in scores.items()])
+        RiskAlias.objects.bulk_create([RiskAlias(table=table, alias=alias, key=key)
+                                       for alias, key in aliases.items()])
+    return table
+
+
+def activate_risk_table(table, rescore=True):
+    """
+    Make a table version the active one of its kind and rescore affected projects.
+
+    Parameters:
+    - table: RiskTable to activate
+    - rescore: Recalculate the risk scores of projects that reference changed values
+
+    Returns: Dictionary with the 'changed' values and the number of
+    'projects' rescored and 'updated'
+    """
+    from .utils import rescore_portfolio_risk
+
+    with transaction.atomic():
+        previous = RiskTable.objects.select_for_update().filter(kind=table.kind, is_active=True).first()
+        changed = changed_risk_keys(table.kind, previous, table)
+        RiskTable.objects.filter(kind=table.kind, is_active=True).update(is_active=False)
+        table.is_active = True
+        table.activated_at = timezone.now()
+        table.save(update_fields=['is_active', 'activated_at'])
+
+        clear_risk_lookup()
+
+        result = {'projects': 0, 'updated': 0}
+        if rescore and changed:
+            result = rescore_portfolio_risk(affected_projects(table.kind, changed))
+    return dict(result, changed=sorted(changed))
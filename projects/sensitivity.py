@@ -0,0 +1,160 @@
+"""
+Sensitivity analysis for the Energy Finance application.
+Evaluates parameter grids and one-at-a-time tornado charts for a project in
+a single broadcast computation, without writing anything to the database.
+"""
+
+import numpy as np
+
+from . import financial_kernels
+from .cash_flow_engine import (add_hourly_overrides, build_cash_flow_matrix, compute_metrics, lifetime_lcoe,
+                               project_cash_flow_inputs, resolve_ppa_terms, STORED)
+
+
+SENSITIVITY_PARAMETERS = ['discount_rate', 'inflation_rate', 'debt_ratio', 'interest_rate']
+
+# Default +/- deltas for tornado charts
+DEFAULT_TORNADO_SPANS = {
+    'discount_rate': 0.02,
+    'inflation_rate': 0.01,
+    'debt_ratio': 0.1,
+    'interest_rate': 0.01,
+}
+
+# Upper bound on evaluated grid points to keep requests bounded
+MAX_GRID_POINTS = 1000000
+
+
+def parse_axis(value, base):
+    """
+    Turn an axis specification into a 1-D array of parameter values.
+
+    Parameters:
+    - value: None (use the base value), a number, a list of numbers, or a
+      dictionary with 'start', 'stop' and 'num' for an evenly spaced range
+    - base: Base value used when no axis is given
+
+    Returns: 1-D NumPy array
+    """
+    if value is None:
+        return np.array([base], dtype=float)
+    if isinstance(value, dict):
+        num = int(value.get('num', 10))
+        return np.linspace(float(value['start']), float(value['stop']), num)
+    return np.atleast_1d(np.asarray(value, dtype=float))
+
+
+def _project_inputs(project):
+    """Engine inputs for one project, including any hourly profile."""
+    return add_hourly_overrides([project.pk], project_cash_flow_inputs([project]))
+
+
+def _repeat_inputs(inputs, count):
+    """Repeat a single project's engine inputs count times."""
+    return {name: np.repeat(values, count, axis=0) for name, values in inputs.items()}
+
+
+def sensitivity_grid(project, discount_rates, inflation_rates, debt_ratios, interest_rates,
+                     ppa_price=STORED, ppa_escalation=STORED, ppa_term=STORED):
+    """
+    Evaluate NPV, IRR and LCOE over a full parameter grid for one project.
+
+    Discounting does not change the cash flows, so cash flows are built once
+    per (inflation, debt, interest) combination and every discount rate is
+    applied to them with a single matrix product.
+
+    Parameters:
+    - project: A Project or SolarProject instance
+    - discount_rates, inflation_rates, debt_ratios, interest_rates: 1-D arrays
+    - ppa_price, ppa_escalation, ppa_term: PPA terms as for resolve_ppa_terms()
+
+    Returns: Dictionary with the axes and 'npv' (discount x inflation x debt x
+    interest), 'irr' and 'lcoe' (inflation x debt x interest) surfaces
+    """
+    axes = [np.asarray(axis, dtype=float) for axis in
+            (discount_rates, inflation_rates, debt_ratios, interest_rates)]
+    shape = tuple(len(axis) for axis in axes)
+    if np.prod(shape) > MAX_GRID_POINTS:
+        raise ValueError(f"Grid has {int(np.prod(shape))} points; the maximum is {MAX_GRID_POINTS}")
+
+    discount, inflation, debt, interest = axes
+    inflation_grid, debt_grid, interest_grid = (
+        grid.ravel() for grid in np.meshgrid(inflation, debt, interest, indexing='ij')
+    )
+
+    inputs = _repeat_inputs(_project_inputs(project), len(inflation_grid))
+    schedule = build_cash_flow_matrix(
+        inputs,
+        inflation_rate=inflation_grid,
+        debt_ratio=debt_grid,
+        interest_rate=interest_grid,
+        **resolve_ppa_terms([project.pk], ppa_price, ppa_escalation, ppa_term)
+    )
+    net = np.where(schedule['mask'], schedule['net_cash_flow'], 0.0)
+
+    npv = financial_kernels.npv_grid(discount, net)          # (combinations x discount)
+    irr = financial_kernels.irr(net) * 100
+    lcoe = lifetime_lcoe(schedule)
+
+    return {
+        'discount_rate': discount,
+        'inflation_rate': inflation,
+        'debt_ratio': debt,
+        'interest_rate': interest,
+        'npv': npv.T.reshape(shape),
+        'irr': irr.reshape(shape[1:]),
+        'lcoe': lcoe.reshape(shape[1:]),
+    }
+
+
+def tornado(project, base_rates, spans, ppa_price=STORED, ppa_escalation=STORED, ppa_term=STORED):
+    """
+    One-at-a-time sensitivity of NPV and IRR around a base case.
+
+    Parameters:
+    - project: A Project or SolarProject instance
+    - base_rates: Dictionary of base values for SENSITIVITY_PARAMETERS
+    - spans: Dictionary of absolute +/- deltas per parameter
+    - ppa_price, ppa_escalation, ppa_term: PPA terms as for resolve_ppa_terms()
+
+    Returns: Dictionary with the base metrics and one entry per parameter,
+    sorted by NPV swing (largest first)
+    """
+    # Row 0 is the base case, then a low and a high row per parameter
+    rows = [dict(base_rates)]
+    for name in SENSITIVITY_PARAMETERS:
+        for sign in (-1, 1):
+            rows.append(dict(base_rates, **{name: base_rates[name] + sign * spans[name]}))
+
+    rates = {name: np.array([row[name] for row in rows]) for name in SENSITIVITY_PARAMETERS}
+    inputs = _repeat_inputs(_project_inputs(project), len(rows))
+    schedule = build_cash_flow_matrix(
+        inputs,
+        inflation_rate=rates['inflation_rate'],
+        debt_ratio=rates['debt_ratio'],
+        interest_rate=rates['interest_rate'],
+        **resolve_ppa_terms([project.pk], ppa_price, ppa_escalation, ppa_term)
+    )
+    metrics = compute_metrics(schedule, inputs['lifetime'],
+                              discount_rate=rates['discount_rate'],
+                              interest_rate=rates['interest_rate'])
+
+    bars = []
+    for index, name in enumerate(SENSITIVITY_PARAMETERS):
+        low, high = 1 + 2 * index, 2 + 2 * index
+        bars.append({
+            'parameter': name,
+            'low_value': rows[low][name],
+            'high_value': rows[high][name],
+            'npv_low': metrics['npv'][low],
+            'npv_high': metrics['npv'][high],
+            'irr_low': metrics['irr'][low],
+            'irr_high': metrics['irr'][high],
+            'swing': abs(metrics['npv'][high] - metrics['npv'][low]),
+        })
+    bars.sort(key=lambda bar: bar['swing'], reverse=True)
+
+    return {
+        'base': dict(base_rates, npv=metrics['npv'][0], irr=metrics['irr'][0]),
+        'bars': bars,
+    }
@@ -0,0 +1,58 @@
+"""
+Signal handlers for the Energy Finance application.
+"""
+
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import hourly_model, metrics_cache
+from .cash_flow_engine import sync_cash_flow_columns
+from .models import CashFlow, CashFlowBasis, HourlyProfile, Project, SolarProject
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=SolarProject)
+def invalidate_project_metrics(sender, instance, created, **kwargs):
+    """Drop cached metrics when a project's inputs change."""
+    if not created:
+        metrics_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=CashFlow)
+def sync_cash_flow_changes(sender, instance, **kwargs):
+    """
+    Re-pack the project's columnar copy and drop cached metrics when a single
+    stored cash flow row changes.
+
+    Bulk writes bypass signals; the cash flow engine syncs and invalidates
+    explicitly. A post_delete receiver is deliberately not connected because
+    it would disable Django's fast-path delete for bulk cash flow replacement.
+    """
+    sync_cash_flow_columns([instance.project_id])
+    metrics_cache.invalidate([instance.project_id])
+
+
+@receiver(post_save, sender=HourlyProfile)
+@receiver(post_delete, sender=HourlyProfile)
+def rebuild_after_hourly_profile_change(sender, instance, **kwargs):
+    """
+    Forget the cash flow basis and cached metrics when a profile is replaced
+    or deleted, so the next refresh rebuilds from the new profile or the
+    annual model, and remove memory-mapped cache files of older profiles.
+    """
+    CashFlowBasis.objects.filter(project_id=instance.project_id).delete()
+    metrics_cache.invalidate([instance.project_id])
+    keep = instance.checksum if kwargs.get('signal') is post_save else None
+    hourly_model.remove_cached_energy(instance.project_id, keep=keep)
+
+
+@receiver(post_migrate)
+def create_cache_tables(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Create the tables of database-backed caches, such as the default
+    single_flight cache, whenever migrations run.
+    """
+    if sender.name == 'projects':
+        call_command('createcachetable', database=using, verbosity=0)
@@ -0,0 +1,184 @@
+"""
+Single-flight coalescing of concurrent identical computations.
+
+Only one call per key runs at a time; concurrent callers with the same key
+wait for its result instead of repeating the work. Threads of one process
+wait on an in-memory event. Processes coordinate through a lock taken with
+cache.add() in the 'single_flight' cache: the process holding it publishes
+its result there for the others to pick up. That only spans processes when
+the cache is shared between them: the default database backend, Redis or
+Memcached. With a local-memory cache coalescing is per process, which the
+projects.W001 system check reports.
+"""
+
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+
+
+CACHE_ALIAS = 'single_flight'
+
+WAIT_TIMEOUT = 65.0                     # seconds a caller waits before computing itself
+LOCK_TIMEOUT = 90.0                     # seconds before a crashed leader's lock expires
+RESULT_TIMEOUT = 30.0                   # seconds a published result stays readable
+POLL_INTERVAL = 0.05
+
+LEADERS_KEY = 'single_flight:leaders'
+COLLAPSED_LOCAL_KEY = 'single_flight:collapsed_local'
+COLLAPSED_REMOTE_KEY = 'single_flight:collapsed_remote'
+TIMEOUTS_KEY = 'single_flight:timeouts'
+COUNTER_KEYS = [LEADERS_KEY, COLLAPSED_LOCAL_KEY, COLLAPSED_REMOTE_KEY, TIMEOUTS_KEY]
+
+_MISSING = object()
+
+
+class _Flight:
+    """A computation in progress in this process"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _lock_key(key):
+    return f'single_flight:lock:{key}'
+
+
+def _result_key(key, token):
+    return f'single_flight:result:{key}:{token}'
+
+
+def run(key, func, wait=WAIT_TIMEOUT):
+    """
+    Call func() once for all concurrent callers with the same key.
+
+    Parameters:
+    - key: String identifying the computation; equal keys must mean equal results
+    - func: Callable without arguments; its result must be picklable to be
+      shared across processes
+    - wait: Seconds to wait for another caller before computing anyway
+
+    Returns: func()'s result, possibly computed by another caller. An
+    exception raised by this process's leader is raised in its waiting threads.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        _increment(COLLAPSED_LOCAL_KEY)
+        if not flight.done.wait(wait):
+            _increment(TIMEOUTS_KEY)
+            return func()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _run_shared(key, func, wait)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _run_shared(key, func, wait):
+    """Run func() under the cross-process lock, or take another process's result."""
+    cache = _cache()
+    lock_key = _lock_key(key)
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+
+    while True:
+        if cache.add(lock_key, token, LOCK_TIMEOUT):
+            _increment(LEADERS_KEY)
+            try:
+                result = func()
+                cache.set(_result_key(key, token), result, RESULT_TIMEOUT)
+                return result
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        owner = cache.get(lock_key)
+        if owner is None:
+            # Released between add() and get(); try to take it again
+            continue
+        result = _wait_for(cache, key, owner, deadline)
+        if result is not _MISSING:
+            _increment(COLLAPSED_REMOTE_KEY)
+            return result
+        if time.monotonic() >= deadline:
+            _increment(TIMEOUTS_KEY)
+            return func()
+        # The owner failed or its lock expired without a result
+
+
+def _wait_for(cache, key, owner, deadline):
+    """Poll for the result of owner's flight until it appears, the lock changes or the deadline passes."""
+    lock_key = _lock_key(key)
+    result_key = _result_key(key, owner)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        result = cache.get(result_key, _MISSING)
+        if result is not _MISSING:
+            return result
+        if cache.get(lock_key) != owner:
+            # The result is published before the lock is released
+            return cache.get(result_key, _MISSING)
+    return _MISSING
+
+
+def _increment(key, delta=1):
+    cache = _cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Counter evicted between add() and incr()
+        cache.set(key, delta, None)
+
+
+def stats():
+    """
+    Coalescing counters.
+
+    Returns: Dictionary with leaders (computations run), collapsed_local and
+    collapsed_remote (calls answered by another thread or process),
+    collapsed, timeouts and collapse_rate
+    """
+    counters = _cache().get_many(COUNTER_KEYS)
+    leaders = counters.get(LEADERS_KEY, 0)
+    local = counters.get(COLLAPSED_LOCAL_KEY, 0)
+    remote = counters.get(COLLAPSED_REMOTE_KEY, 0)
+    calls = leaders + local + remote
+    return {
+        'leaders': leaders,
+        'collapsed_local': local,
+        'collapsed_remote': remote,
+        'collapsed': local + remote,
+        'timeouts': counters.get(TIMEOUTS_KEY, 0),
+        'collapse_rate': (local + remote) / calls if calls else 0.0,
+    }
+
+
+def reset_stats():
+    """Reset the coalescing counters."""
+    _cache().delete_many(COUNTER_KEYS)
@@ -5,18 +5,158 @@ Interacts with NREL's PVWatts API to get solar production estimates.
 
 import os
 import json
+import calendar
 import requests
-from datetime import datetime, timedelta
 import logging
 
+import numpy as np
+from django.conf import settings
+
+from . import pvwatts_cache, single_flight
+from .hourly_model import DAYS_PER_YEAR, HOURS_PER_DAY, HOURS_PER_YEAR
+
 logger = logging.getLogger(__name__)
 
+PVWATTS_URL = "https://developer.nrel.gov/api/pvwatts/v8.json"
+
+# PVWatts returns a typical meteorological year of 8760 hours, so months
+# follow a fixed 365 day calendar whatever the current year is
+MONTH_NAMES = list(calendar.month_name)[1:]
+DAYS_PER_MONTH = np.array([calendar.monthrange(2001, month)[1] for month in range(1, 13)])
+MONTH_START_DAYS = np.concatenate([[0], np.cumsum(DAYS_PER_MONTH)[:-1]])
+MONTH_START_HOURS = MONTH_START_DAYS * HOURS_PER_DAY
+
+SOLAR_GRANULARITIES = ['daily', 'monthly', 'annual', 'heatmap']
+
+# 'pvwatts' queries the NREL API; 'clear_sky' computes estimates offline
+SOLAR_BACKENDS = ['pvwatts', 'clear_sky']
+
+
+# Seconds to wait for a PVWatts response (connect, read)
+PVWATTS_TIMEOUT = (5, 60)
+
+
+def fetch_pvwatts(params, api_key, session=None, url=PVWATTS_URL, timeout=PVWATTS_TIMEOUT):
+    """
+    Request one PVWatts v8 response from the NREL API.
+    
+    Parameters:
+    - params: Request parameters from pvwatts_cache.request_params()
+    - api_key: NREL API key
+    - session: requests.Session to reuse connections from (default: a one-off request)
+    - url: PVWatts endpoint (default: PVWATTS_URL)
+    - timeout: Connect and read timeouts in seconds
+    
+    Returns: Decoded JSON response
+    """
+    response = (session or requests).get(url, params=dict(params, api_key=api_key), timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+class SolarProfile:
+    """
+    Hourly AC output of a site for a 1 kW system over a typical year.
+    
+    Every granularity is derived from the same 8760 array with reshapes and
+    np.add.reduceat, scaled to the requested system capacity.
+    """
+    
+    def __init__(self, ac, ac_annual=None, capacity_factor=None):
+        """
+        Parameters:
+        - ac: Hourly AC output in W for a 1 kW system (8760 values)
+        - ac_annual: Annual AC energy in kWh for a 1 kW system (default: sum of ac)
+        - capacity_factor: Capacity factor in percent, if reported
+        """
+        self.ac = np.asarray(ac, dtype=float)
+        if self.ac.shape != (HOURS_PER_YEAR,):
+            raise ValueError(f"Expected {HOURS_PER_YEAR} hourly values, got {self.ac.size}")
+        self.ac_annual = float(self.ac.sum() / 1000) if ac_annual is None else float(ac_annual)
+        self.capacity_factor = capacity_factor
+    
+    @classmethod
+    def from_response(cls, data):
+        """
+        Build a profile from a PVWatts response for a 1 kW system.
+        
+        Raises ValueError when the response reports errors.
+        """
+        if data.get('errors'):
+            error_message = '; '.join(data['errors'])
+            logger.error(f"NREL API returned errors: {error_message}")
+            raise ValueError(f"NREL API error: {error_message}")
+        outputs = data['outputs']
+        return cls(outputs['ac'], outputs.get('ac_annual'), outputs.get('capacity_factor'))
+    
+    def hourly(self, system_capacity):
+        """Hourly AC output in kW for a system of system_capacity kW"""
+        return self.ac * (system_capacity / 1000)
+    
+    def daily(self, system_capacity):
+        """Daily averages [{day: 1, avgPower: 123.45}, ...]"""
+        averages = self.hourly(system_capacity).reshape(DAYS_PER_YEAR, HOURS_PER_DAY).mean(axis=1)
+        return [{'day': day + 1, 'avgPower': power} for day, power in enumerate(averages.tolist())]
+    
+    def monthly(self, system_capacity):
+        """Monthly averages [{month: 'January', avgPower: 123.45, totalEnergy: 91846.8}, ...]"""
+        energy = np.add.reduceat(self.hourly(system_capacity), MONTH_START_HOURS)
+        averages = energy / (DAYS_PER_MONTH * HOURS_PER_DAY)
+        return [
+            {'month': month, 'avgPower': power, 'totalEnergy': total}
+            for month, power, total in zip(MONTH_NAMES, averages.tolist(), energy.tolist())
+        ]
+    
+    def annual(self, system_capacity):
+        """Annual energy in kWh and capacity factor"""
+        return {
+            'annual_energy': self.ac_annual * system_capacity,
+            'capacity_factor': self.capacity_factor
+        }
+    
+    def heatmap(self, system_capacity):
+        """Average output by month (rows) and hour of day (columns)"""
+        days = self.hourly(system_capacity).reshape(DAYS_PER_YEAR, HOURS_PER_DAY)
+        averages = np.add.reduceat(days, MONTH_START_DAYS, axis=0) / DAYS_PER_MONTH[:, None]
+        return {
+            'months': MONTH_NAMES,
+            'hours': list(range(HOURS_PER_DAY)),
+            'avgPower': averages.tolist()
+        }
+    
+    def aggregate(self, system_capacity, granularities=SOLAR_GRANULARITIES):
+        """
+        Several granularities at once.
+        
+        Returns: Dictionary with daily_data, monthly_data, annual and/or heatmap_data
+        """
+        keys = {'daily': 'daily_data', 'monthly': 'monthly_data', 'annual': 'annual', 'heatmap': 'heatmap_data'}
+        unknown = [name for name in granularities if name not in keys]
+        if unknown:
+            raise ValueError(f"Unknown granularity: {', '.join(unknown)}. "
+                             f"Must be one of {', '.join(SOLAR_GRANULARITIES)}")
+        return {keys[name]: getattr(self, name)(system_capacity) for name in granularities}
+
+
 class SolarRadiationService:
     """Service to interact with NREL's PVWatts API for solar radiation data"""
     
-    def __init__(self):
+    def __init__(self, fetcher=None, use_cache=True, grid=None, coalesce=True):
+        """
+        Parameters:
+        - fetcher: Optional callable taking the request parameters and returning
+          the decoded response, used instead of the NREL API (e.g. in tests)
+        - use_cache: Read and store responses in the persistent PVWatts cache
+        - grid: Optional SolarResourceGrid serving site profiles by interpolation
+        - coalesce: Share one fetch between concurrent identical requests
+        """
         self.api_key = os.environ.get('NREL_API_KEY', None)
-        if not self.api_key:
+        self.fetcher = fetcher
+        self.use_cache = use_cache
+        self.grid = grid
+        self.coalesce = coalesce
+        self.session = requests.Session()
+        if not self.api_key and fetcher is None:
             logger.warning("NREL API key is not set in environment variables")
     
     def get_solar_data(self, latitude, longitude, system_capacity=1, azimuth=180, tilt=40, 
@@ -36,31 +176,96 @@ class SolarRadiationService:
         - timeframe: Timeframe for results (default: 'hourly')
         
         Returns: Dictionary with solar data
+        
+        Coordinates are rounded to pvwatts_cache.COORDINATE_DECIMALS before the
+        request, so the cached response is exactly the one requested.
+        """
+        params = pvwatts_cache.request_params(
+            latitude, longitude, system_capacity=system_capacity, azimuth=azimuth, tilt=tilt,
+            array_type=array_type, module_type=module_type, losses=losses, timeframe=timeframe
+        )
+        if self.use_cache:
+            cached = pvwatts_cache.get(params)
+            if cached is not None:
+                return cached
+        
+        if self.coalesce:
+            key = f'pvwatts:{pvwatts_cache.cache_key(params)}'
+            return single_flight.run(key, lambda: self._fetch_coalesced(params))
+        return self._fetch(params)
+    
+    def _fetch_coalesced(self, params):
+        """
+        Fetch a response under the single-flight lock, unless a caller that
+        held the lock before has stored it in the meantime
+        """
+        if self.use_cache:
+            cached = pvwatts_cache.get(params, record=False)
+            if cached is not None:
+                return cached
+        return self._fetch(params)
+    
+    def _fetch(self, params):
+        """Fetch a response on a cache miss and store it"""
+        if self.fetcher is not None:
+            data = self.fetcher(params)
+        else:
+            if not self.api_key:
+                raise ValueError("NREL API key is not set")
+            try:
+                data = fetch_pvwatts(params, self.api_key, session=self.session)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error fetching solar data from NREL API: {str(e)}")
+                raise
+        
+        if self.use_cache:
+            pvwatts_cache.set(params, data)
+        return data
+    
+    def get_solar_profile(self, latitude, longitude):
+        """
+        Get the hourly profile of a site for a 1 kW system with a single request,
+        or from the resource grid when the service has one
+        
+        Parameters:
+        - latitude: Latitude of the location
+        - longitude: Longitude of the location
+        
+        Returns: SolarProfile
+        """
+        if self.grid is not None:
+            return self.grid.profile(latitude, longitude)
+        return SolarProfile.from_response(self.get_solar_data(latitude, longitude, system_capacity=1))
+    
+    def prefetch(self, sites, **options):
+        """
+        Fetch and cache the hourly profiles of many sites concurrently
+        
+        Parameters:
+        - sites: Iterable of (latitude, longitude) pairs
+        - options: Passed to pvwatts_prefetch.prefetch_pvwatts()
+        
+        Returns: Dictionary with counts of sites, cached, fetched and failed
         """
-        if not self.api_key:
+        from .pvwatts_prefetch import prefetch_pvwatts
+        
+        if self.fetcher is None and not self.api_key:
             raise ValueError("NREL API key is not set")
+        return prefetch_pvwatts(sites, api_key=self.api_key, fetcher=self.fetcher, **options)
+    
+    def get_solar_aggregates(self, latitude, longitude, system_capacity=1000.0, granularities=SOLAR_GRANULARITIES):
+        """
+        Get several granularities of solar production estimates from one request
         
-        url = f"https://developer.nrel.gov/api/pvwatts/v8.json"
-        params = {
-            'api_key': self.api_key,
-            'lat': latitude,
-            'lon': longitude,
-            'system_capacity': system_capacity,
-            'azimuth': azimuth,
-            'tilt': tilt,
-            'array_type': array_type,
-            'module_type': module_type,
-            'losses': losses,
-            'timeframe': timeframe
-        }
+        Parameters:
+        - latitude: Latitude of the location
+        - longitude: Longitude of the location
+        - system_capacity: System capacity in kW (default: 1000.0)
+        - granularities: Any of 'daily', 'monthly', 'annual' and 'heatmap' (default: all)
         
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching solar data from NREL API: {str(e)}")
-            raise
+        Returns: Dictionary with daily_data, monthly_data, annual and/or heatmap_data
+        """
+        return self.get_solar_profile(latitude, longitude).aggregate(system_capacity, granularities)
     
     def get_daily_solar_data(self, latitude, longitude, system_capacity=1000.0):
         """
@@ -73,36 +278,7 @@ class SolarRadiationService:
         
         Returns: List of daily averages [{day: 1, avgPower: 123.45}, ...]
         """
-        try:
-            # Get hourly data from NREL API
-            data = self.get_solar_data(latitude, longitude, system_capacity=1)
-            
-            if 'errors' in data:
-                error_message = '; '.join(data['errors'])
-                logger.error(f"NREL API returned errors: {error_message}")
-                raise ValueError(f"NREL API error: {error_message}")
-            
-            # Extract AC power output (in W) and convert to kW
-            ac_power = [power * system_capacity / 1000 for power in data['outputs']['ac']]
-            
-            # Aggregate to daily averages (8760 hours → 365 days)
-            daily_data = []
-            for day in range(365):
-                start_hour = day * 24
-                end_hour = start_hour + 24
-                day_power = ac_power[start_hour:end_hour]
-                avg_power = sum(day_power) / len(day_power) if day_power else 0
-                
-                daily_data.append({
-                    'day': day + 1,
-                    'avgPower': avg_power
-                })
-            
-            return daily_data
-            
-        except Exception as e:
-            logger.error(f"Error in get_daily_solar_data: {str(e)}")
-            raise
+        return self.get_solar_profile(latitude, longitude).daily(system_capacity)
     
     def get_monthly_solar_data(self, latitude, longitude, system_capacity=1000.0):
         """
@@ -115,46 +291,7 @@ class SolarRadiationService:
         
         Returns: List of monthly averages [{month: 'January', avgPower: 123.45}, ...]
         """
-        daily_data = self.get_daily_solar_data(latitude, longitude, system_capacity)
-        
-        # Define month ranges
-        month_ranges = []
-        current_year = datetime.now().year
-        for month in range(1, 13):
-            if month == 12:
-                next_month = 1
-                next_year = current_year + 1
-            else:
-                next_month = month + 1
-                next_year = current_year
-            
-            start_date = datetime(current_year, month, 1)
-            end_date = datetime(next_year, next_month, 1)
-            days_in_month = (end_date - start_date).days
-            
-            month_ranges.append({
-                'name': start_date.strftime('%B'),
-                'start_day': start_date.timetuple().tm_yday,
-                'days': days_in_month
-            })
-        
-        # Calculate monthly averages
-        monthly_data = []
-        for month_info in month_ranges:
-            month_start = month_info['start_day'] - 1  # Adjust for 0-based indexing
-            month_days = daily_data[month_start:month_start + month_info['days']]
-            
-            if month_days:
-                avg_power = sum(day['avgPower'] for day in month_days) / len(month_days)
-                total_energy = avg_power * 24 * month_info['days']  # kWh for the month
-                
-                monthly_data.append({
-                    'month': month_info['name'],
-                    'avgPower': avg_power,
-                    'totalEnergy': total_energy
-                })
-        
-        return monthly_data
+        return self.get_solar_profile(latitude, longitude).monthly(system_capacity)
     
     def get_annual_production(self, latitude, longitude, system_capacity=1000.0):
         """
@@ -167,21 +304,34 @@ class SolarRadiationService:
         
         Returns: Dictionary with annual energy in kWh and capacity factor
         """
-        try:
-            # Get hourly data from NREL API
-            data = self.get_solar_data(latitude, longitude, system_capacity=1)
-            
-            # Calculate total annual energy (kWh)
-            ac_annual = data['outputs']['ac_annual'] * system_capacity
-            
-            # Calculate capacity factor
-            capacity_factor = data['outputs'].get('capacity_factor', None)
-            
-            return {
-                'annual_energy': ac_annual,
-                'capacity_factor': capacity_factor
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in get_annual_production: {str(e)}")
-            raise
\ No newline at end of file
+        return self.get_solar_profile(latitude, longitude).annual(system_capacity)
+
+
+def get_solar_service(backend=None):
+    """
+    Solar radiation service for a resource backend
+    
+    Sites are served from a resource grid of interpolated profiles when the
+    SOLAR_GRID_RESOLUTION setting is non-zero.
+    
+    Parameters:
+    - backend: One of SOLAR_BACKENDS (default: the SOLAR_RESOURCE_BACKEND setting)
+    
+    Returns: SolarRadiationService
+    """
+    backend = backend or getattr(settings, 'SOLAR_RESOURCE_BACKEND', 'pvwatts')
+    if backend == 'pvwatts':
+        service = SolarRadiationService()
+    elif backend == 'clear_sky':
+        from .clear_sky import pvwatts_response
+        
+        # Computed in milliseconds, so never cached or coalesced
+        service = SolarRadiationService(fetcher=pvwatts_response, use_cache=False, coalesce=False)
+    else:
+        raise ValueError(f"Invalid backend: {backend}. Must be one of {', '.join(SOLAR_BACKENDS)}")
+    
+    if getattr(settings, 'SOLAR_GRID_RESOLUTION', 0):
+        from .resource_grid import SolarResourceGrid
+        
+        service.grid = SolarResourceGrid(service.get_solar_data, source=backend)
+    return service
@@ -1,3 +1,1662 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+from sklearn.pipeline import Pipeline
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (clear_sky, financial_kernels, hourly_model, jobs, metrics_cache, model_registry, pvwatts_cache,
+               single_flight)
+from .models import (CashFlow, CashFlowColumns, FinancialMetric, HourlyProfile, Job, MLModelVersion, Project,
+                     PVWattsResponse, RiskTable, Scenario, SolarProject, SCENARIO_METRICS)
+from .benchmarks import compare_to_baseline, pvwatts_fixture, run_benchmarks
+from .cash_flow_engine import build_cash_flow_matrix, compute_metrics, project_cash_flow_inputs, refresh_cash_flows
+from .debt_sizing import size_portfolio_debt, size_project_debt
+from .goal_seek import goal_seek_bids
+from .ml_models import power_model_split, train_power_model
+from .portfolio_generator import generate_portfolio
+from .pvwatts_prefetch import prefetch_pvwatts
+from .resource_grid import SolarResourceGrid, clear_open_nodes
+from .risk_tables import activate_risk_table, clear_risk_lookup, draft_risk_table, get_risk_lookup
+from .risk_simulation import simulate_project
+from .scenarios import evaluate_scenarios
+from .sensitivity import DEFAULT_TORNADO_SPANS, sensitivity_grid, tornado
+from .solar_service import SolarProfile, SolarRadiationService
+from .utils import (RISK_SCORE_FIELDS, _generate_cash_flows, assign_risk_scores, calculate_financial_metrics,
+                    estimate_energy_production, evaluate_financial_metrics, rescore_portfolio_risk,
+                    simulate_hourly_cash_flows)
+
+
+# Process-local copies of the shared caches, for tests of in-process
+# behaviour or of the application's own queries
+LOCMEM_CACHES = dict(settings.CACHES, **{
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'{alias}-tests'}
+    for alias in (metrics_cache.CACHE_ALIAS, single_flight.CACHE_ALIAS)
+})
+
+
+def reference_npv(rate, values):
+    return sum(value / (1 + rate) ** t for t, value in enumerate(values))
+
+
+def reference_irr(values):
+    """Polynomial-root IRR as implemented by numpy-financial."""
+    roots = np.roots(np.asarray(values, dtype=float)[::-1])
+    roots = roots[(roots.imag == 0) & (roots.real > 0)].real
+    if not roots.size:
+        return np.nan
+    rates = 1 / roots - 1
+    return rates[np.argmin(np.abs(rates))]
+
+
+def reference_mirr(values, finance_rate, reinvest_rate):
+    n = len(values)
+    positive = [value if value > 0 else 0 for value in values]
+    negative = [value if value < 0 else 0 for value in values]
+    fv_positive = sum(value * (1 + reinvest_rate) ** (n - 1 - t) for t, value in enumerate(positive))
+    pv_negative = reference_npv(finance_rate, negative)
+    return (fv_positive / -pv_negative) ** (1 / (n - 1)) - 1
+
+
+def reference_payback(values):
+    cumulative = np.cumsum(values)
+    if cumulative[-1] <= 0:
+        return np.nan
+    index = int(np.flatnonzero(cumulative > 0)[0])
+    if index == 0:
+        return 0.0
+    previous, current = cumulative[index - 1], cumulative[index]
+    return index - 1 + -previous / (current - previous)
+
+
+def reference_cash_flows(project, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05):
+    """Per-year cash flow loop of the original _generate_cash_flows, as {field: [year 0, year 1, ...]}."""
+    lifetime = project.expected_lifetime_years
+    capex = project.capex if project.capex else (project.capex_per_mw * project.capacity_mw if project.capex_per_mw else 0)
+    opex = project.opex_per_year if project.opex_per_year else (project.opex_per_mw * project.capacity_mw if project.opex_per_mw else 0)
+    debt_amount = capex * debt_ratio
+    equity_amount = capex * (1 - debt_ratio)
+    loan_term = min(15, lifetime)
+    if debt_amount > 0 and interest_rate > 0:
+        annual_debt_service = -debt_amount * (interest_rate * (1 + interest_rate) ** loan_term) / ((1 + interest_rate) ** loan_term - 1)
+    else:
+        annual_debt_service = 0
+
+    rows = {'capex': [-capex], 'revenue': [0], 'opex': [0], 'maintenance': [0], 'insurance': [0], 'taxes': [0],
+            'debt_service': [0], 'salvage_value': [0], 'energy_production_mwh': [0], 'net_cash_flow': [-equity_amount],
+            'cumulative_cash_flow': [-equity_amount]}
+    cumulative = -equity_amount
+    for year in range(1, lifetime + 1):
+        if isinstance(project, SolarProject):
+            capacity_factor = {'fixed': 0.20, 'single-axis': 0.25, 'dual-axis': 0.30}.get(project.tracking_type, 0.20)
+            degradation = project.degradation_rate / 100 if project.degradation_rate else 0.005
+            performance_ratio = project.performance_ratio if project.performance_ratio else 0.75
+            energy = project.capacity_mw * 8760 * capacity_factor * (1 - degradation) ** (year - 1) * performance_ratio
+        else:
+            energy = project.capacity_mw * 8760 * 0.3
+        annual_opex = opex * (1 + inflation_rate) ** (year - 1)
+        maintenance = -annual_opex * 0.3
+        insurance = -annual_opex * 0.1
+        revenue = energy * 50 * (1 + inflation_rate) ** (year - 1)
+        debt_service = annual_debt_service if year <= loan_term else 0
+        taxable_income = revenue + annual_opex + maintenance + insurance + debt_service * 0.5
+        taxes = -taxable_income * 0.21 if taxable_income > 0 else 0
+        salvage_value = capex * 0.1 if year == lifetime else 0
+        net = revenue + annual_opex + maintenance + insurance + debt_service + taxes + salvage_value
+        cumulative += net
+        for field, value in [('capex', 0), ('revenue', revenue), ('opex', annual_opex), ('maintenance', maintenance),
+                             ('insurance', insurance), ('taxes', taxes), ('debt_service', debt_service),
+                             ('salvage_value', salvage_value), ('energy_production_mwh', energy),
+                             ('net_cash_flow', net), ('cumulative_cash_flow', cumulative)]:
+            rows[field].append(value)
+    return rows
+
+
+class FinancialKernelParityTests(SimpleTestCase):
+    """Compare the vectorized kernels with straightforward reference implementations"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        n, years = 200, 26
+        self.investment = -rng.uniform(1e6, 5e7, n)
+        self.flows = rng.uniform(0.05, 0.25, (n, years - 1)) * -self.investment[:, None]
+        self.cash_flows = np.column_stack([self.investment, self.flows])
+        self.rates = rng.uniform(0.0, 0.15, n)
+
+    def test_npv_matches_reference(self):
+        result = financial_kernels.npv(self.rates, self.cash_flows)
+        expected = [reference_npv(rate, row) for rate, row in zip(self.rates, self.cash_flows)]
+        np.testing.assert_allclose(result, expected, rtol=1e-10)
+        self.assertAlmostEqual(financial_kernels.npv(0.08, self.cash_flows[0]),
+                               reference_npv(0.08, self.cash_flows[0]), delta=1e-4)
+
+    def test_irr_matches_reference(self):
+        result, converged = financial_kernels.irr(self.cash_flows, full_output=True)
+        expected = [reference_irr(row) for row in self.cash_flows]
+        self.assertTrue(converged.all())
+        np.testing.assert_allclose(result, expected, rtol=1e-8, atol=1e-10)
+
+    def test_irr_negative_rate(self):
+        values = [-1000, 100, 100, 100, 100, 100]
+        self.assertAlmostEqual(financial_kernels.irr(values), reference_irr(values), places=10)
+
+    def test_irr_without_sign_change_is_not_converged(self):
+        values = np.array([[100.0, 50.0, 50.0], [-100.0, -50.0, -50.0], [0.0, 0.0, 0.0]])
+        result, converged = financial_kernels.irr(values, full_output=True)
+        self.assertTrue(np.isnan(result).all())
+        self.assertFalse(converged.any())
+
+    def test_irr_zero_padded_rows(self):
+        padded = np.zeros((2, 10))
+        padded[0, :4] = [-100, 40, 40, 40]
+        padded[1, :10] = [-100] + [15] * 9
+        np.testing.assert_allclose(financial_kernels.irr(padded),
+                                   [reference_irr([-100, 40, 40, 40]), reference_irr(padded[1])],
+                                   rtol=1e-9)
+
+    def test_mirr_matches_reference(self):
+        result = financial_kernels.mirr(self.cash_flows, 0.05, self.rates)
+        expected = [reference_mirr(row, 0.05, rate) for rate, row in zip(self.rates, self.cash_flows)]
+        np.testing.assert_allclose(result, expected, rtol=1e-10)
+
+    def test_mirr_respects_lengths(self):
+        padded = np.zeros((1, 8))
+        padded[0, :5] = [-500, 100, 200, 150, 300]
+        result = financial_kernels.mirr(padded, 0.06, 0.1, lengths=[5])
+        self.assertAlmostEqual(result[0], reference_mirr([-500, 100, 200, 150, 300], 0.06, 0.1), places=12)
+        self.assertTrue(np.isnan(financial_kernels.mirr([100, 100], 0.05, 0.05)))
+
+    def test_payback_matches_reference(self):
+        result = financial_kernels.payback_period(self.cash_flows)
+        expected = [reference_payback(row) for row in self.cash_flows]
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+        self.assertTrue(np.isnan(financial_kernels.payback_period([-100, 10, 10])))
+
+    def test_discounted_payback_matches_reference(self):
+        result = financial_kernels.discounted_payback_period(self.rates, self.cash_flows)
+        expected = [
+            reference_payback([value / (1 + rate) ** t for t, value in enumerate(row)])
+            for rate, row in zip(self.rates, self.cash_flows)
+        ]
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+    def test_lcoe_matches_reference(self):
+        costs = np.abs(self.cash_flows)
+        energy = np.full(costs.shape, 1000.0)
+        result = financial_kernels.lcoe(costs, energy, self.rates)
+        expected = [reference_npv(rate, c) / reference_npv(rate, e)
+                    for rate, c, e in zip(self.rates, costs, energy)]
+        np.testing.assert_allclose(result, expected, rtol=1e-10)
+
+
+class CashFlowEngineParityTests(TestCase):
+    """The vectorized cash flow engine reproduces the original per-year loop"""
+
+    def setUp(self):
+        self.projects = [
+            SolarProject(pk=1, name='Fixed', capacity_mw=10, capex=8000000, opex_per_year=100000),
+            SolarProject(pk=2, name='Tracker', capacity_mw=25, capex_per_mw=900000, opex_per_mw=12000,
+                         expected_lifetime_years=30, tracking_type='single-axis', degradation_rate=0.7,
+                         performance_ratio=0.82),
+            SolarProject(pk=3, name='Unknown tracking', capacity_mw=5, capex=4000000, opex_per_year=50000,
+                         expected_lifetime_years=12, tracking_type='bifacial'),
+            Project(pk=4, name='Wind', capacity_mw=50, capex=60000000, opex_per_year=900000, project_type='wind',
+                    expected_lifetime_years=20),
+            Project(pk=5, name='No capex', capacity_mw=1, capex=0, opex_per_year=0, expected_lifetime_years=8),
+        ]
+
+    def test_matrix_matches_reference_loop(self):
+        for rates in [{}, {'inflation_rate': 0.04, 'debt_ratio': 0.5, 'interest_rate': 0.07},
+                      {'debt_ratio': 0.6, 'interest_rate': 0.0}]:
+            schedule = build_cash_flow_matrix(project_cash_flow_inputs(self.projects), **rates)
+            for i, project in enumerate(self.projects):
+                expected = reference_cash_flows(project, **rates)
+                years = project.expected_lifetime_years + 1
+                self.assertEqual(int(schedule['mask'][i].sum()), years)
+                for field, values in expected.items():
+                    np.testing.assert_allclose(schedule[field][i, :years], values, rtol=1e-12, atol=1e-6,
+                                               err_msg=f"{project.name} {field} {rates}")
+
+    def test_stored_cash_flows_match_reference_loop(self):
+        project = self.projects[1]
+        project.pk = None
+        project.save()
+        _generate_cash_flows(project)
+        stored = project.cash_flows.order_by('year')
+        expected = reference_cash_flows(project)
+        self.assertEqual(stored.count(), len(expected['net_cash_flow']))
+        for field, values in expected.items():
+            np.testing.assert_allclose(list(stored.values_list(field, flat=True)), values, rtol=1e-12, atol=1e-6)
+        self.assertAlmostEqual(estimate_energy_production(project, 3), expected['energy_production_mwh'][3], places=6)
+
+
+class FinancialMetricsTests(TestCase):
+    """calculate_financial_metrics stores kernel results on the project"""
+
+    def test_metrics_for_solar_project(self):
+        project = SolarProject.objects.create(
+            name='Test Solar', capacity_mw=10, capex=8000000, opex_per_year=100000
+        )
+        metrics = calculate_financial_metrics(project)
+        net = list(project.cash_flows.order_by('year').values_list('net_cash_flow', flat=True))
+
+        self.assertEqual(len(net), 26)
+        self.assertAlmostEqual(metrics.npv, reference_npv(0.08, net), delta=1e-3)
+        self.assertAlmostEqual(metrics.irr, reference_irr(net) * 100, places=6)
+        self.assertIsNotNone(metrics.mirr)
+
+
+    def test_mirr_above_cap_reported_as_zero(self):
+        schedule = build_cash_flow_matrix(project_cash_flow_inputs([
+            Project(name='A', capacity_mw=10, capex=8000000, opex_per_year=100000, expected_lifetime_years=3),
+            Project(name='B', capacity_mw=10, capex=8000000, opex_per_year=100000, expected_lifetime_years=3),
+        ]))
+        schedule['net_cash_flow'] = np.array([[-100.0, 50.0, 50.0, 50.0], [-1.0, 1000.0, 1000.0, 1000.0]])
+        mirr = compute_metrics(schedule, 3, discount_rate=0.08, interest_rate=0.05)['mirr']
+        self.assertAlmostEqual(mirr[0], reference_mirr([-100, 50, 50, 50], 0.05, 0.08) * 100, places=8)
+        self.assertEqual(mirr[1], 0.0)
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsCacheTests(TestCase):
+    """calculate_financial_metrics reuses cached results until inputs change"""
+
+    def setUp(self):
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        self.project = SolarProject.objects.create(
+            name='Cached Solar', capacity_mw=10, capex=8000000, opex_per_year=100000
+        )
+
+    def test_cache_hit_and_invalidation(self):
+        first = calculate_financial_metrics(self.project)
+        with self.assertNumQueries(2):
+            # FinancialMetric get_or_create and save only
+            second = calculate_financial_metrics(self.project)
+        self.assertEqual(first.npv, second.npv)
+        self.assertEqual(metrics_cache.stats()['hits'], 1)
+
+        # Editing a stored cash flow invalidates the project's entries
+        cash_flow = self.project.cash_flows.get(year=1)
+        cash_flow.net_cash_flow += 1000000
+        cash_flow.save()
+        third = calculate_financial_metrics(self.project)
+        self.assertGreater(third.npv, first.npv)
+
+        # Changed rates are a different key
+        calculate_financial_metrics(self.project, discount_rate=0.1)
+        stats = self.client.get(reverse('projects:metrics_cache_stats_api')).json()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 3))
+
+        self.project.capex = 9000000
+        self.project.save()
+        calculate_financial_metrics(self.project, discount_rate=0.1)
+        self.assertEqual(metrics_cache.stats()['misses'], 4)
+
+    def test_replaced_profile_and_ppa_terms_miss(self):
+        calculate_financial_metrics(self.project)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        with override_settings(HOURLY_PROFILE_CACHE_DIR=cache_dir.name):
+            simulate_hourly_cash_flows(self.project, dc_ac_ratio=1.0)
+            hourly = calculate_financial_metrics(self.project).npv
+
+            # Replacing the profile outside the cash flow engine
+            profile = HourlyProfile.objects.get(project=self.project)
+            current = {name: profile.inputs[name] for name in hourly_model.PROFILE_INPUTS}
+            options = dict(profile.options, dc_ac_ratio=2.0)
+            hourly_model.save_hourly_profile(self.project.pk, current,
+                                             hourly_model.simulate_hourly(current, **options), options)
+            clipped = calculate_financial_metrics(self.project).npv
+            self.assertLess(clipped, hourly)
+            self.assertAlmostEqual(clipped, evaluate_financial_metrics(self.project)[0]['npv'], delta=1e-3)
+
+            HourlyProfile.objects.get(project=self.project).delete()
+            annual = calculate_financial_metrics(self.project).npv
+            self.assertAlmostEqual(annual, evaluate_financial_metrics(self.project)[0]['npv'], delta=1e-3)
+
+        # Stored PPA terms changed without saving through the model
+        FinancialMetric.objects.filter(project=self.project).update(ppa_price=90, ppa_term=10)
+        contracted = calculate_financial_metrics(self.project).npv
+        self.assertGreater(contracted, annual)
+        self.assertAlmostEqual(contracted, evaluate_financial_metrics(self.project)[0]['npv'], delta=1e-3)
+
+
+class IncrementalCashFlowTests(TestCase):
+    """Stored cash flows follow rate and input changes with minimal writes"""
+
+    def setUp(self):
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        self.project = SolarProject.objects.create(
+            name='Incremental Solar', capacity_mw=10, capex=8000000, opex_per_year=100000
+        )
+        calculate_financial_metrics(self.project)
+
+    def stored(self, field):
+        return list(self.project.cash_flows.order_by('year').values_list(field, flat=True))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_discount_rate_only_rediscounts(self):
+        ids = self.stored('id')
+        with self.assertNumQueries(4):
+            # Metric lookup, basis lookup, cash flow load and metric save
+            metrics = calculate_financial_metrics(self.project, discount_rate=0.06)
+        self.assertEqual(self.stored('id'), ids)
+        expected, _ = evaluate_financial_metrics(self.project, discount_rate=0.06)
+        self.assertAlmostEqual(metrics.npv, expected['npv'], places=4)
+
+    def test_rate_change_updates_dependent_columns(self):
+        energy = self.stored('energy_production_mwh')
+        self.assertEqual(refresh_cash_flows(self.project, debt_ratio=0.5),
+                         ['taxes', 'debt_service', 'net_cash_flow', 'cumulative_cash_flow'])
+        self.assertEqual(refresh_cash_flows(self.project, debt_ratio=0.5), [])
+
+        metrics = calculate_financial_metrics(self.project, inflation_rate=0.03, debt_ratio=0.5)
+        expected, schedule = evaluate_financial_metrics(self.project, inflation_rate=0.03, debt_ratio=0.5)
+        self.assertEqual(self.stored('energy_production_mwh'), energy)
+        np.testing.assert_allclose(self.stored('net_cash_flow'), schedule['net_cash_flow'][0], rtol=1e-12)
+        self.assertAlmostEqual(metrics.npv, expected['npv'], places=4)
+        self.assertAlmostEqual(metrics.irr, expected['irr'], places=6)
+
+    def test_lifetime_change_rebuilds(self):
+        self.project.expected_lifetime_years = 30
+        self.project.save()
+        metrics = calculate_financial_metrics(self.project)
+        self.assertEqual(self.project.cash_flows.count(), 31)
+        expected, _ = evaluate_financial_metrics(self.project)
+        self.assertAlmostEqual(metrics.npv, expected['npv'], places=4)
+
+
+class HourlyModelTests(TestCase):
+    """Hourly simulation, compressed storage and annual aggregation"""
+
+    def setUp(self):
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        self.project = SolarProject.objects.create(
+            name='Hourly Solar', capacity_mw=10, capex=8000000, opex_per_year=100000,
+            latitude=30.0, tracking_type='single-axis'
+        )
+
+    def test_without_clipping_matches_annual_model(self):
+        flat_prices = np.ones(hourly_model.HOURS_PER_DAY)
+        simulate_hourly_cash_flows(self.project, dc_ac_ratio=0.5, price_shape=flat_prices)
+        _, schedule = evaluate_financial_metrics(SolarProject(
+            name='Annual', capacity_mw=10, capex=8000000, opex_per_year=100000, tracking_type='single-axis'
+        ))
+        np.testing.assert_allclose(
+            list(self.project.cash_flows.order_by('year').values_list('revenue', flat=True)),
+            schedule['revenue'][0], rtol=1e-9
+        )
+
+    def test_clipping_curtailment_and_storage(self):
+        with override_settings(HOURLY_PROFILE_CACHE_DIR=self.cache_dir.name):
+            profile = simulate_hourly_cash_flows(self.project, dc_ac_ratio=2.0, export_limit=0.45)
+            energy = hourly_model.load_hourly_energy(profile)
+
+        self.assertEqual(energy.shape, (25, hourly_model.HOURS_PER_YEAR))
+        self.assertEqual(energy.dtype, np.float32)
+        self.assertLessEqual(energy.max(), 10 * 0.45 + 1e-5)
+        self.assertGreater(profile.clipped_mwh, 0)
+        self.assertGreater(profile.curtailed_mwh, 0)
+        self.assertLess(len(bytes(profile.data)), energy.nbytes)
+
+        stored = list(self.project.cash_flows.filter(year__gte=1).order_by('year')
+                      .values_list('energy_production_mwh', flat=True))
+        np.testing.assert_allclose(stored, energy.sum(axis=1), rtol=1e-5)
+
+        # Rate changes keep the hourly energy; deleting the profile reverts to the annual model
+        calculate_financial_metrics(self.project, inflation_rate=0.03)
+        self.assertEqual(list(self.project.cash_flows.filter(year__gte=1).order_by('year')
+                              .values_list('energy_production_mwh', flat=True)), stored)
+        HourlyProfile.objects.filter(project=self.project).delete()
+        calculate_financial_metrics(self.project, inflation_rate=0.03)
+        _, schedule = evaluate_financial_metrics(self.project, inflation_rate=0.03)
+        self.assertAlmostEqual(self.project.cash_flows.get(year=1).energy_production_mwh,
+                               schedule['energy_production_mwh'][0, 1])
+
+    def test_cache_files_removed_on_replace_and_delete(self):
+        cache_files = lambda: sorted(os.listdir(self.cache_dir.name))
+        with override_settings(HOURLY_PROFILE_CACHE_DIR=self.cache_dir.name):
+            first = simulate_hourly_cash_flows(self.project, dc_ac_ratio=1.2)
+            hourly_model.load_hourly_energy(first)
+            self.assertEqual(cache_files(), [os.path.basename(hourly_model._cache_path(first))])
+
+            second = simulate_hourly_cash_flows(self.project, dc_ac_ratio=2.0)
+            self.assertNotEqual(first.checksum, second.checksum)
+            self.assertEqual(cache_files(), [])
+            hourly_model.load_hourly_energy(second)
+            self.assertEqual(cache_files(), [os.path.basename(hourly_model._cache_path(second))])
+
+            second.delete()
+            self.assertEqual(cache_files(), [])
+
+    def test_hourly_api(self):
+        url = reverse('projects:hourly_profile_api', kwargs={'pk': self.project.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.post(url, json.dumps({'dc_ac_ratio': 1.3}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['annual_energy_mwh']), 25)
+
+        with override_settings(HOURLY_PROFILE_CACHE_DIR=self.cache_dir.name):
+            response = self.client.get(url, {'year': 2})
+        self.assertEqual(len(response.json()['hourly_mwh']), hourly_model.HOURS_PER_YEAR)
+
+
+class CalculateMetricsApiTests(TestCase):
+    """Tests for /api/calculate-metrics/"""
+
+    def setUp(self):
+        self.project = SolarProject.objects.create(
+            name='API Solar', capacity_mw=20, capex=16000000, opex_per_year=200000
+        )
+        self.url = reverse('projects:calculate_metrics_api')
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_dry_run_does_not_write(self):
+        with self.assertNumQueries(3):
+            # Project, hourly profile and stored PPA term lookups only
+            response = self.post({'project_id': self.project.pk, 'discount_rate': 0.06, 'dry_run': True})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['dry_run'])
+        self.assertFalse(CashFlow.objects.exists())
+        self.assertFalse(FinancialMetric.objects.exists())
+
+        stored = calculate_financial_metrics(self.project, discount_rate=0.06)
+        self.assertAlmostEqual(data['npv'], stored.npv, delta=1e-3)
+        self.assertAlmostEqual(data['irr'], stored.irr, places=6)
+
+    def test_batch_matches_single_project_metrics(self):
+        other = SolarProject.objects.create(
+            name='API Solar 2', capacity_mw=5, capex_per_mw=900000, opex_per_mw=12000,
+            tracking_type='single-axis', expected_lifetime_years=30
+        )
+        response = self.client.post(
+            reverse('projects:calculate_portfolio_metrics_api'),
+            json.dumps({
+                'filter': {'project_type': 'solar'},
+                'discount_rate': 0.07,
+                'project_rates': {str(other.pk): {'debt_ratio': 0.5}},
+                'persist': True
+            }),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = {row['project_id']: row for row in response.json()['results']}
+        self.assertEqual(set(results), {self.project.pk, other.pk})
+        self.assertEqual(CashFlow.objects.filter(project=other).count(), 31)
+
+        for project, debt_ratio in ((self.project, 0.7), (other, 0.5)):
+            expected, _ = evaluate_financial_metrics(project, discount_rate=0.07, debt_ratio=debt_ratio)
+            stored = FinancialMetric.objects.get(project=project)
+            for field, value in expected.items():
+                self.assertAlmostEqual(results[project.pk][field], value, places=6)
+                self.assertAlmostEqual(getattr(stored, field), value, places=6)
+
+    def test_solar_inputs_on_every_path(self):
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        tracker = SolarProject.objects.create(
+            name='API Tracker', capacity_mw=8, capex=7000000, opex_per_year=90000, latitude=30.0,
+            tracking_type='single-axis', degradation_rate=0.8, performance_ratio=0.82
+        )
+        payload = {'project_id': tracker.pk, 'discount_rate': 0.07}
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        with override_settings(HOURLY_PROFILE_CACHE_DIR=cache_dir.name):
+            simulate_hourly_cash_flows(tracker)
+        profile_written = HourlyProfile.objects.get(project=tracker).updated_at
+        energy = list(tracker.cash_flows.order_by('year').values_list('energy_production_mwh', flat=True))
+
+        dry_run = self.post(dict(payload, dry_run=True)).json()
+        persisted = self.post(payload).json()
+        job = jobs.calculate_metrics(dict(payload, debt_ratio=0.5))
+        batch = self.client.post(
+            reverse('projects:calculate_portfolio_metrics_api'),
+            json.dumps({'project_ids': [tracker.pk], 'discount_rate': 0.07, 'persist': True}),
+            content_type='application/json'
+        ).json()['results'][0]
+        persisted_again = self.post(payload).json()
+
+        for result in (persisted, batch, persisted_again):
+            for field in ('npv', 'irr', 'lcoe'):
+                self.assertAlmostEqual(result[field], dry_run[field], places=6)
+        expected, _ = evaluate_financial_metrics(tracker, discount_rate=0.07, debt_ratio=0.5)
+        self.assertAlmostEqual(job['npv'], expected['npv'], places=6)
+
+        # Switching paths neither flips the stored energy nor rewrites the profile
+        self.assertEqual(
+            list(tracker.cash_flows.order_by('year').values_list('energy_production_mwh', flat=True)), energy
+        )
+        self.assertEqual(HourlyProfile.objects.get(project=tracker).updated_at, profile_written)
+
+
+class SensitivityTests(TestCase):
+    """Tests for the sensitivity grid and tornado analysis"""
+
+    def setUp(self):
+        self.project = SolarProject.objects.create(
+            name='Sensitivity Solar', capacity_mw=15, capex=11000000, opex_per_year=150000
+        )
+
+    def test_grid_matches_point_evaluation(self):
+        result = sensitivity_grid(self.project, [0.05, 0.1], [0.02, 0.03], [0.6], [0.04, 0.06])
+        self.assertEqual(result['npv'].shape, (2, 2, 1, 2))
+        self.assertEqual(result['irr'].shape, (2, 1, 2))
+
+        expected, _ = evaluate_financial_metrics(
+            self.project, discount_rate=0.1, inflation_rate=0.03, debt_ratio=0.6, interest_rate=0.04
+        )
+        self.assertAlmostEqual(result['npv'][1, 1, 0, 0], expected['npv'], places=4)
+        self.assertAlmostEqual(result['irr'][1, 0, 0], expected['irr'], places=6)
+        self.assertAlmostEqual(result['lcoe'][1, 0, 0], expected['lcoe'], places=6)
+
+    def test_tornado_api_and_analysis_page(self):
+        response = self.client.post(
+            reverse('projects:sensitivity_api', kwargs={'pk': self.project.pk}),
+            json.dumps({'mode': 'tornado'}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        bars = response.json()['bars']
+        self.assertEqual(len(bars), 4)
+        self.assertEqual([bar['swing'] for bar in bars], sorted((bar['swing'] for bar in bars), reverse=True))
+
+        page = self.client.get(reverse('projects:financial_analysis', kwargs={'pk': self.project.pk}))
+        self.assertContains(page, 'tornadoChart')
+
+
+class RiskSimulationTests(TestCase):
+    """Tests for the Monte Carlo risk simulation"""
+
+    def setUp(self):
+        self.project = SolarProject.objects.create(
+            name='Risk Solar', capacity_mw=12, capex=9000000, opex_per_year=120000,
+            home_country='Germany', target_country='India'
+        )
+
+    def test_simulation_is_reproducible(self):
+        first = simulate_project(self.project, n_paths=5000, seed=11)
+        second = simulate_project(self.project, n_paths=5000, seed=11)
+        self.assertEqual(first, second)
+        self.assertEqual(first['paths'], 5000)
+        self.assertLessEqual(first['npv_p10'], first['npv_p50'])
+        self.assertLessEqual(first['npv_p50'], first['npv_p90'])
+        self.assertTrue(0 <= first['probability_npv_negative'] <= 1)
+
+    def test_risk_simulation_api(self):
+        url = reverse('projects:risk_simulation_api', kwargs={'pk': self.project.pk})
+        response = self.client.post(url, json.dumps({'paths': 2000, 'seed': 3}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), simulate_project(self.project, n_paths=2000, seed=3))
+
+        response = self.client.post(url, json.dumps({'paths': 10 ** 7}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CashFlowColumnsTests(TestCase):
+    """The packed columnar copy mirrors the CashFlow rows"""
+
+    def setUp(self):
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        self.project = SolarProject.objects.create(
+            name='Columnar Solar', capacity_mw=8, capex=6000000, opex_per_year=90000, expected_lifetime_years=40
+        )
+        calculate_financial_metrics(self.project)
+
+    def assertColumnsMatchRows(self):
+        arrays = self.project.get_cash_flow_arrays()
+        rows = list(self.project.cash_flows.order_by('year').values_list('year', 'revenue', 'net_cash_flow'))
+        self.assertEqual(len(arrays['year']), 41)
+        np.testing.assert_array_equal(np.column_stack([arrays['year'], arrays['revenue'], arrays['net_cash_flow']]),
+                                      np.array(rows, dtype=float))
+
+    def test_columns_follow_every_write_path(self):
+        self.assertColumnsMatchRows()
+
+        refresh_cash_flows(self.project, inflation_rate=0.04)
+        self.assertColumnsMatchRows()
+
+        cash_flow = self.project.cash_flows.get(year=3)
+        cash_flow.revenue = 1.0
+        cash_flow.save()
+        self.assertColumnsMatchRows()
+
+    def test_refresh_creates_missing_packed_row(self):
+        CashFlowColumns.objects.filter(project=self.project).delete()
+        refresh_cash_flows(self.project, inflation_rate=0.04)
+        self.assertTrue(CashFlowColumns.objects.filter(project=self.project).exists())
+        self.assertColumnsMatchRows()
+
+    def test_detail_page_reads_one_packed_row(self):
+        with self.assertNumQueries(2):
+            # Project with its solar row and metrics, then the packed cash flows
+            response = self.client.get(reverse('projects:project_detail', kwargs={'pk': self.project.pk}))
+        self.assertEqual(len(response.context['cash_flows']), 41)
+        self.assertEqual(response.context['chart_data']['years'][-1], 40)
+
+
+class DebtSizingTests(TestCase):
+    """Tests for sculpted debt sizing against a DSCR target"""
+
+    def setUp(self):
+        self.project = SolarProject.objects.create(
+            name='Sculpted Solar', capacity_mw=20, capex=12000000, opex_per_year=150000,
+            home_country='Germany', target_country='India'
+        )
+
+    def test_sculpted_debt_meets_target_dscr(self):
+        sizing, schedule = size_project_debt(self.project, target_dscr=1.35, tenor=12, max_gearing=1.0)
+        service = -schedule['debt_service'][0]
+        self.assertEqual(int((service > 0).sum()), 12)
+
+        # Rebuilding the levered schedule gives exactly the target in every tenor year
+        ebitda = sum(schedule[name][0] for name in ['revenue', 'opex', 'maintenance', 'insurance'])
+        cfads = ebitda + schedule['taxes'][0]
+        np.testing.assert_allclose(cfads[service > 0] / service[service > 0], 1.35)
+        self.assertAlmostEqual(sizing['min_dscr'][0], 1.35)
+
+        # The debt is fully repaid and equals the present value of its service
+        self.assertAlmostEqual(sizing['balance'][0, 12], 0.0, delta=1e-3)
+        discount = 1.05 ** -schedule['year']
+        self.assertAlmostEqual(sizing['debt_amount'][0], float((service * discount).sum()), places=2)
+        self.assertAlmostEqual(schedule['net_cash_flow'][0, 0], -(12000000 - sizing['debt_amount'][0]))
+
+    def test_gearing_cap_scales_profile(self):
+        uncapped, _ = size_project_debt(self.project, target_dscr=1.2, max_gearing=1.0)
+        capped, _ = size_project_debt(self.project, target_dscr=1.2, max_gearing=0.3)
+        self.assertAlmostEqual(capped['gearing'][0], 0.3)
+        self.assertGreater(capped['min_dscr'][0], 1.2)
+        self.assertLess(capped['debt_amount'][0], uncapped['debt_amount'][0])
+
+    def test_portfolio_api_matches_single_project(self):
+        other = SolarProject.objects.create(name='Other Solar', capacity_mw=5, capex=6000000,
+                                            opex_per_year=90000)
+        response = self.client.post(
+            reverse('projects:portfolio_debt_sizing_api'),
+            data=json.dumps({'project_ids': [self.project.pk, other.pk], 'target_dscr': 1.3}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        results = {row['project_id']: row for row in response.json()['results']}
+        single, _ = size_project_debt(self.project, target_dscr=1.3)
+        self.assertAlmostEqual(results[self.project.pk]['debt_amount'], single['debt_amount'][0], places=2)
+        self.assertIn(other.pk, results)
+
+
+class PPAGoalSeekTests(TestCase):
+    """PPA terms in the engine and vectorized goal seek"""
+
+    def setUp(self):
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        self.project = SolarProject.objects.create(
+            name='PPA Solar', capacity_mw=15, capex=11000000, opex_per_year=140000
+        )
+
+    def test_stored_ppa_terms_drive_revenue(self):
+        FinancialMetric.objects.create(project=self.project, ppa_price=70, ppa_escalation=0.02, ppa_term=10)
+        calculate_financial_metrics(self.project)
+        revenue = list(self.project.cash_flows.order_by('year').values_list('revenue', flat=True))
+        energy = list(self.project.cash_flows.order_by('year').values_list('energy_production_mwh', flat=True))
+        self.assertAlmostEqual(revenue[1], energy[1] * 70)
+        self.assertAlmostEqual(revenue[10], energy[10] * 70 * 1.02 ** 9)
+        self.assertAlmostEqual(revenue[11], energy[11] * 50 * 1.025 ** 10)
+
+        # Changing only the PPA rewrites revenue and the totals
+        self.assertEqual(refresh_cash_flows(self.project, ppa_price=80, ppa_escalation=0.02, ppa_term=10),
+                         ['revenue', 'taxes', 'net_cash_flow', 'cumulative_cash_flow'])
+
+    def test_every_entry_point_uses_stored_ppa_terms(self):
+        wind = Project.objects.create(name='PPA Wind', project_type='wind', capacity_mw=30, capex=40000000,
+                                      opex_per_year=900000)
+        FinancialMetric.objects.create(project=wind, ppa_price=90, ppa_escalation=0.01, ppa_term=20)
+        terms = {'ppa_price': 90, 'ppa_escalation': 0.01, 'ppa_term': 20}
+        contracted, _ = evaluate_financial_metrics(wind)
+        merchant, _ = evaluate_financial_metrics(wind, ppa_price=None)
+        self.assertAlmostEqual(contracted['npv'], evaluate_financial_metrics(wind, **terms)[0]['npv'], places=6)
+        self.assertGreater(contracted['npv'], merchant['npv'])
+
+        base_rates = {'discount_rate': 0.08, 'inflation_rate': 0.025, 'debt_ratio': 0.7, 'interest_rate': 0.05}
+        base = tornado(wind, base_rates, DEFAULT_TORNADO_SPANS)['base']
+        grid = sensitivity_grid(wind, [0.08], [0.025], [0.7], [0.05])
+        stored = calculate_financial_metrics(wind)
+        for npv in (base['npv'], grid['npv'].item(), stored.npv):
+            self.assertAlmostEqual(npv, contracted['npv'], delta=1e-3)
+
+        simulated = simulate_project(wind, n_paths=2000, seed=5)
+        self.assertEqual(simulated, simulate_project(wind, n_paths=2000, seed=5, **terms))
+        self.assertNotEqual(simulated, simulate_project(wind, n_paths=2000, seed=5, ppa_price=None))
+
+        sizing, _ = size_project_debt(wind)
+        self.assertAlmostEqual(sizing['npv'][0], size_project_debt(wind, **terms)[0]['npv'][0], delta=1e-3)
+        self.assertGreater(sizing['npv'][0], size_project_debt(wind, ppa_price=None)[0]['npv'][0])
+        portfolio = size_portfolio_debt(Project.objects.filter(pk=wind.pk))
+        self.assertAlmostEqual(portfolio['npv'][0], sizing['npv'][0], delta=1e-3)
+
+    def test_null_ppa_term_clears_stored_term(self):
+        FinancialMetric.objects.create(project=self.project, ppa_price=70, ppa_escalation=0.02, ppa_term=10)
+        url = reverse('projects:calculate_metrics_api')
+        contracted, _ = evaluate_financial_metrics(self.project)
+        merchant, _ = evaluate_financial_metrics(self.project, ppa_price=None)
+
+        def post(payload):
+            response = self.client.post(url, json.dumps(dict(payload, project_id=self.project.pk)),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            return response.json()
+
+        self.assertAlmostEqual(post({'ppa_price': None, 'dry_run': True})['npv'], merchant['npv'], delta=1e-3)
+        self.assertEqual(FinancialMetric.objects.get(project=self.project).ppa_price, 70)
+        self.assertAlmostEqual(post({'ppa_price': None})['npv'], merchant['npv'], delta=1e-3)
+        self.assertIsNone(FinancialMetric.objects.get(project=self.project).ppa_price)
+
+        # Absent terms keep the stored ones
+        FinancialMetric.objects.filter(project=self.project).update(ppa_price=70)
+        self.assertAlmostEqual(post({})['npv'], contracted['npv'], delta=1e-3)
+        self.assertAlmostEqual(post({'dry_run': True})['npv'], contracted['npv'], delta=1e-3)
+
+    def test_break_even_ppa_price(self):
+        result = goal_seek_bids([{'project_id': self.project.pk}], 'ppa_price')
+        self.assertTrue(result['converged'][0])
+        metrics, _ = evaluate_financial_metrics(self.project, ppa_price=result['value'][0])
+        self.assertAlmostEqual(metrics['npv'], 0.0, delta=1e-3)
+
+    def test_goal_seek_api_solves_many_bids(self):
+        bids = [{'project_id': self.project.pk, 'target': target, 'ppa_term': 15} for target in (6, 8, 10)]
+        bids.append({'project_id': self.project.pk, 'target': 10, 'ppa_term': 15, 'debt_ratio': 0.5})
+        response = self.client.post(
+            reverse('projects:goal_seek_api'),
+            data=json.dumps({'bids': bids, 'variable': 'ppa_price', 'metric': 'irr'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        prices = [row['ppa_price'] for row in results]
+        self.assertLess(prices[0], prices[1])
+        self.assertLess(prices[1], prices[2])
+        for row, bid in zip(results, bids):
+            self.assertTrue(row['converged'])
+            self.assertAlmostEqual(row['achieved'], bid['target'], places=4)
+
+        response = self.client.post(
+            reverse('projects:goal_seek_api'),
+            data=json.dumps({'bids': [{'project_id': 0}], 'variable': 'capex'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ScenarioTests(TestCase):
+    """Scenario x project evaluation and packed result storage"""
+
+    def setUp(self):
+        self.projects = [
+            SolarProject.objects.create(name=f'Scenario Solar {i}', capacity_mw=5 + i, capex=4000000 + 500000 * i,
+                                        opex_per_year=60000)
+            for i in range(3)
+        ]
+        FinancialMetric.objects.create(project=self.projects[0], ppa_price=65, ppa_term=12)
+        self.scenarios = [
+            Scenario.objects.create(name='Base'),
+            Scenario.objects.create(name='High rates', discount_rate=0.1, interest_rate=0.07),
+            Scenario.objects.create(name='PPA', ppa_price=55, ppa_escalation=0.01),
+        ]
+
+    def test_results_match_single_evaluations(self):
+        result_set = evaluate_scenarios(self.scenarios, Project.objects.all())
+        values = result_set.get_values()
+        self.assertEqual(values.shape, (3, len(SCENARIO_METRICS), 3))
+
+        stored_ppa = {'ppa_price': 65, 'ppa_term': 12}
+        for s, scenario in enumerate(self.scenarios):
+            for p, project in enumerate(self.projects):
+                ppa = {name: getattr(scenario, name) for name in ['ppa_price', 'ppa_escalation', 'ppa_term']}
+                if scenario.ppa_price is None and p == 0:
+                    ppa.update(stored_ppa)
+                expected, _ = evaluate_financial_metrics(
+                    project, discount_rate=scenario.discount_rate, inflation_rate=scenario.inflation_rate,
+                    debt_ratio=scenario.debt_ratio, interest_rate=scenario.interest_rate, **ppa
+                )
+                self.assertAlmostEqual(result_set.metric_values('npv')[s, p], expected['npv'], places=4)
+
+    def test_comparison_page_loads_with_one_query(self):
+        result_set = evaluate_scenarios(self.scenarios, Project.objects.all(), name='Board pack')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('projects:scenario_comparison', kwargs={'pk': result_set.pk}),
+                                       {'metric': 'irr'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['rows']), 3)
+        self.assertContains(response, 'High rates')
+
+
+class BenchmarkTests(TestCase):
+    """Benchmark harness smoke test and baseline comparison"""
+
+    def test_report_and_baseline_comparison(self):
+        report = run_benchmarks(sizes=[5], cases=['financial_metrics', 'portfolio_metrics', 'solar_aggregation'],
+                                sample=2, repeat=1)
+        self.assertEqual(Project.objects.count(), 5)
+        results = {result['case']: result for result in report['results']}
+        self.assertEqual(results['financial_metrics']['calls'], 2)
+        self.assertGreater(results['financial_metrics']['queries'], 0)
+        self.assertEqual(results['solar_aggregation']['queries'], 0)
+        json.dumps(report)
+
+        self.assertEqual(compare_to_baseline(report, report), [])
+        slower = json.loads(json.dumps(report))
+        for result in slower['results']:
+            result['per_call'] += 1.0
+            result['queries'] += 1
+        regressions = compare_to_baseline(slower, report)
+        self.assertEqual(len(regressions), 6)
+
+
+class PortfolioGeneratorTests(TestCase):
+    """Synthetic portfolios are complete and reproducible from their seed"""
+
+    def snapshot(self):
+        return list(Project.objects.order_by('name').values_list(
+            'name', 'capex', 'latitude', 'target_country', 'off_taker_rating', 'overall_risk_score',
+            'solarproject__tracking_type', 'financial_metrics__npv', 'financial_metrics__ppa_price'
+        ))
+
+    def test_generated_portfolio(self):
+        written = generate_portfolio(25, seed=7, chunk_size=10)
+        self.assertEqual(written['projects'], 25)
+        self.assertEqual(Project.objects.count(), 25)
+        self.assertEqual(SolarProject.objects.count(), written['solar_projects'])
+        self.assertEqual(Project.objects.filter(project_type='solar').count(), written['solar_projects'])
+        self.assertEqual(FinancialMetric.objects.count(), 25)
+        self.assertEqual(CashFlowColumns.objects.count(), 25)
+        self.assertFalse(Project.objects.filter(overall_risk_score=None).exists())
+        self.assertFalse(Project.objects.filter(latitude=None).exists())
+
+        first = self.snapshot()
+        Project.objects.all().delete()
+        generate_portfolio(25, seed=7, chunk_size=10)
+        self.assertEqual(self.snapshot(), first)
+
+        Project.objects.all().delete()
+        generate_portfolio(25, seed=8, chunk_size=10)
+        self.assertNotEqual(self.snapshot(), first)
+
+
+class RiskRescoringTests(TestCase):
+    """Bulk rescoring matches calculate_risk_scores() and writes only changed scores"""
+
+    def setUp(self):
+        cases = [
+            ('solar', 'USA', 'India', 0.2, 'development', 'bbb+'),
+            ('wind', None, 'Nigeria', None, 'operational', 'AA'),
+            ('hydro', 'Germany', None, 1.7, None, None),
+            ('tidal', '', '', -0.5, 'early_stage', ''),
+            ('Storage', 'Atlantis', 'Narnia', 0.9, 'unknown', 'Z'),
+        ]
+        for i, (project_type, home, target, factor, status_risk, rating) in enumerate(cases):
+            Project.objects.create(
+                name=f"Risk {i}", capacity_mw=10, project_type=project_type, home_country=home,
+                target_country=target, technology_risk_factor=factor, project_status_risk=status_risk,
+                off_taker_rating=rating
+            )
+
+    def test_matches_per_project_scores(self):
+        result = rescore_portfolio_risk(Project.objects.all(), chunk_size=2)
+        self.assertEqual(result, {'projects': 5, 'updated': 5})
+        for project in Project.objects.all():
+            stored = [getattr(project, field) for field in RISK_SCORE_FIELDS]
+            expected = assign_risk_scores(project)
+            for field, value in zip(RISK_SCORE_FIELDS, stored):
+                self.assertAlmostEqual(value, getattr(expected, field), places=12, msg=f"{project.name} {field}")
+
+    def test_writes_only_changed_score_fields(self):
+        rescore_portfolio_risk(Project.objects.all())
+        project = Project.objects.get(name='Risk 1')
+        updated_at = project.updated_at
+
+        Project.objects.filter(pk=project.pk).update(off_taker_rating='D')
+        with CaptureQueriesContext(connection) as queries:
+            result = rescore_portfolio_risk(Project.objects.all())
+        statements = [query['sql'] for query in queries.captured_queries]
+        # The active risk table check and one read of the projects
+        self.assertEqual(len([sql for sql in statements if sql.startswith('SELECT')]), 2)
+        self.assertEqual(len([sql for sql in statements if 'UPDATE' in sql]), 1)
+        self.assertEqual(result['updated'], 1)
+        project.refresh_from_db()
+        self.assertEqual(project.off_taker_risk_score, 5.0)
+        self.assertEqual(project.updated_at, updated_at)
+        self.assertEqual(rescore_portfolio_risk(Project.objects.all(), dry_run=True)['updated'], 0)
+
+
+class RiskTableTests(TestCase):
+    """Versioned risk tables, alias normalization and targeted rescoring"""
+
+    def setUp(self):
+        clear_risk_lookup()
+        for name, home, target, rating in [('Delhi', 'USA', ' india ', 'A'), ('Berlin', 'Germany', 'Germany', 'A'),
+                                           ('Texas', 'United States', 'united  states', 'bbb'),
+                                           ('Lagos', None, 'Nigeria', 'BB')]:
+            Project.objects.create(name=name, capacity_mw=10, project_type='solar', home_country=home,
+                                   target_country=target, off_taker_rating=rating)
+        rescore_portfolio_risk(Project.objects.all())
+
+    def tearDown(self):
+        clear_risk_lookup()
+
+    def test_seeded_lookup_with_aliases(self):
+        lookup = get_risk_lookup()
+        self.assertEqual(lookup.versions['country'], 1)
+        self.assertEqual(lookup.score('country', ' USA ', 3.0), 1.0)
+        self.assertEqual(lookup.score('country', 'Great  Britain', 3.0), 1.0)
+        self.assertEqual(lookup.score('off_taker', 'bbb', 3.0), 2.3)
+        self.assertEqual(lookup.score('country', '', 3.0), 3.0)
+        with self.assertRaises(TypeError):
+            lookup.scores['country']['india'] = 5.0
+        with self.assertRaises(AttributeError):
+            lookup.scores = {}
+        with self.assertNumQueries(1):
+            self.assertIs(get_risk_lookup(), lookup)
+
+    def test_activation_by_another_process_reloads(self):
+        lookup = get_risk_lookup()
+        draft = draft_risk_table('country')
+        draft.entries.filter(key='india').update(score=4.0)
+        # Activate without going through this process's activate_risk_table()
+        RiskTable.objects.filter(kind='country', is_active=True).update(is_active=False)
+        RiskTable.objects.filter(pk=draft.pk).update(is_active=True, activated_at=timezone.now())
+
+        reloaded = get_risk_lookup()
+        self.assertIsNot(reloaded, lookup)
+        self.assertEqual(reloaded.versions['country'], 2)
+        self.assertEqual(reloaded.score('country', 'India', 3.0), 4.0)
+
+    def test_activation_rescores_only_affected_projects(self):
+        draft = draft_risk_table('country')
+        self.assertFalse(draft.is_active)
+        draft.entries.filter(key='india').update(score=4.0)
+        draft.aliases.filter(alias='usa').update(key='nigeria')
+        untouched = dict(Project.objects.values_list('name', 'updated_at'))
+
+        result = activate_risk_table(draft)
+        self.assertEqual(result['changed'], ['india', 'usa'])
+        self.assertEqual(result['projects'], 1)
+        self.assertEqual(get_risk_lookup().versions['country'], 2)
+        self.assertEqual(RiskTable.objects.filter(kind='country', is_active=True).get(), draft)
+
+        for project in Project.objects.all():
+            stored = [getattr(project, field) for field in RISK_SCORE_FIELDS]
+            expected = assign_risk_scores(project)
+            self.assertEqual(stored, [getattr(expected, field) for field in RISK_SCORE_FIELDS])
+            self.assertEqual(project.updated_at, untouched[project.name])
+        delhi = Project.objects.get(name='Delhi')
+        self.assertAlmostEqual(delhi.country_risk_score, 3.5 * 0.3 + 4.0 * 0.7)
+
+
+class PVWattsCacheTests(TestCase):
+    """Persistent PVWatts response cache keyed on rounded request parameters"""
+
+    def setUp(self):
+        pvwatts_cache.reset_stats()
+        self.requests = []
+        self.service = SolarRadiationService(fetcher=self.fetch)
+
+    def fetch(self, params):
+        # Stand-in for the NREL API
+        self.requests.append(params)
+        return dict(pvwatts_fixture(params['lat']), inputs=params)
+
+    def test_hit_miss_and_round_trip(self):
+        daily = self.service.get_daily_solar_data(35.0, -106.0)
+        monthly = self.service.get_monthly_solar_data(35.0, -106.0)
+        annual = self.service.get_annual_production(35.00004, -106.00004)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len(daily), 365)
+        self.assertEqual(len(monthly), 12)
+
+        expected = pvwatts_fixture(35.0)['outputs']
+        self.assertAlmostEqual(annual['annual_energy'], expected['ac_annual'] * 1000.0)
+        cached = self.service.get_solar_data(35.0, -106.0)
+        np.testing.assert_allclose(cached['outputs']['ac'], expected['ac'], rtol=1e-6)
+        self.assertEqual(cached['inputs']['lat'], 35.0)
+        entry = PVWattsResponse.objects.get()
+        self.assertLess(entry.size_bytes, 8760 * 4)
+
+        # Other system parameters are a different entry
+        self.service.get_solar_data(35.0, -106.0, tilt=20)
+        self.assertEqual(len(self.requests), 2)
+        stats = self.client.get(reverse('projects:pvwatts_cache_stats_api')).json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (3, 2, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 0.6)
+
+        # Error responses are not cached
+        SolarRadiationService(fetcher=lambda params: {'errors': ['bad key']}).get_solar_data(10.0, 10.0)
+        self.assertEqual(PVWattsResponse.objects.count(), 2)
+
+    def test_expiry_and_lru_eviction(self):
+        self.service.get_solar_data(35.0, -106.0)
+        PVWattsResponse.objects.update(expires_at=timezone.now())
+        self.service.get_solar_data(35.0, -106.0)
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(pvwatts_cache.stats()['expired'], 1)
+
+        size = PVWattsResponse.objects.get().size_bytes
+        with override_settings(PVWATTS_CACHE_MAX_BYTES=int(size * 2.5)):
+            self.service.get_solar_data(40.0, -100.0)
+            self.service.get_solar_data(35.0, -106.0)
+            self.service.get_solar_data(45.0, -90.0)
+        # The least recently used site was evicted
+        self.assertEqual(sorted(PVWattsResponse.objects.values_list('params__lat', flat=True)), [35.0, 45.0])
+        self.assertEqual(pvwatts_cache.stats()['evictions'], 1)
+        self.service.get_solar_data(40.0, -100.0)
+        self.assertEqual(len(self.requests), 5)
+
+    def test_shared_counters_and_recheck_under_lock(self):
+        params = pvwatts_cache.request_params(35.0, -106.0)
+        pvwatts_cache.set(params, pvwatts_fixture(35.0))
+        stored = pvwatts_cache.get(params, record=False)
+
+        # Another caller stored the response between this caller's miss and its lock
+        with mock.patch.object(pvwatts_cache, 'get', side_effect=[None, stored]) as get:
+            data = self.service.get_solar_data(35.0, -106.0)
+        self.assertEqual(get.call_args_list[1], mock.call(params, record=False))
+        self.assertEqual(data, stored)
+        self.assertEqual(self.requests, [])
+
+        self.service.get_solar_data(35.0, -106.0)
+        self.assertEqual(caches[single_flight.CACHE_ALIAS].get(pvwatts_cache.HITS_KEY), 1)
+        caches['default'].clear()
+        self.assertEqual(pvwatts_cache.stats()['hits'], 1)
+
+
+class SolarProfileTests(TestCase):
+    """Daily, monthly, annual and heatmap aggregates from one hourly profile"""
+
+    def test_aggregates_match_hourly_sums(self):
+        response = pvwatts_fixture(35.0)
+        profile = SolarProfile.from_response(response)
+        hourly = np.asarray(response['outputs']['ac']) * 2.0  # 2000 kW system
+
+        daily = profile.daily(2000.0)
+        self.assertEqual(len(daily), 365)
+        self.assertAlmostEqual(daily[40]['avgPower'], hourly[40 * 24:41 * 24].mean())
+
+        # Fixed 365 day calendar: February is hours 744-1415 in every year
+        monthly = profile.monthly(2000.0)
+        self.assertEqual([month['month'] for month in monthly][:2], ['January', 'February'])
+        self.assertAlmostEqual(monthly[1]['totalEnergy'], hourly[744:1416].sum())
+        self.assertAlmostEqual(monthly[1]['avgPower'], hourly[744:1416].mean())
+        self.assertAlmostEqual(sum(month['totalEnergy'] for month in monthly), hourly.sum())
+
+        heatmap = profile.heatmap(2000.0)
+        self.assertEqual(np.shape(heatmap['avgPower']), (12, 24))
+        self.assertAlmostEqual(heatmap['avgPower'][11][12], hourly[334 * 24 + 12::24].mean())
+        self.assertAlmostEqual(profile.annual(2000.0)['annual_energy'], response['outputs']['ac_annual'] * 2000.0)
+
+        with self.assertRaises(ValueError):
+            SolarProfile.from_response({'errors': ['bad key']})
+        with self.assertRaises(ValueError):
+            profile.aggregate(1000.0, ['weekly'])
+
+    def test_api_returns_all_granularities_from_one_fetch(self):
+        project = SolarProject.objects.create(name='Mapped Solar', capacity_mw=5, latitude=35.0, longitude=-106.0)
+        pvwatts_cache.set(pvwatts_cache.request_params(35.0, -106.0), pvwatts_fixture(35.0))
+        url = reverse('projects:solar_radiation_api', kwargs={'pk': project.pk})
+        pvwatts_cache.reset_stats()
+
+        data = self.client.get(url, {'data_type': 'all'}).json()
+        self.assertEqual(set(data), {'daily_data', 'monthly_data', 'annual', 'heatmap_data'})
+        self.assertEqual(len(data['daily_data']), 365)
+        self.assertAlmostEqual(data['annual']['annual_energy'], pvwatts_fixture(35.0)['outputs']['ac_annual'] * 5000)
+        self.assertEqual(pvwatts_cache.stats()['hits'], 1)
+
+        self.assertEqual(set(self.client.get(url, {'data_type': 'monthly,heatmap'}).json()),
+                         {'monthly_data', 'heatmap_data'})
+        self.assertIn('annual_energy', self.client.get(url, {'data_type': 'annual'}).json())
+        self.assertEqual(self.client.get(url, {'data_type': 'weekly'}).status_code, 400)
+
+
+class MockPVWattsHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the PVWatts API: throttles each site's first request"""
+
+    def do_GET(self):
+        server = self.server
+        params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+        site = (params['lat'], params['lon'])
+        with server.lock:
+            server.requests.append(site)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            first = server.requests.count(site) == 1
+        try:
+            time.sleep(0.02)
+            if float(params['lat']) < 0:
+                status, body = 422, {'errors': ['lat must be positive']}
+            elif first:
+                status, body = 429, {'errors': ['rate limited']}
+            else:
+                status, body = 200, dict(pvwatts_fixture(float(params['lat'])), inputs=params)
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PVWattsPrefetchTests(TestCase):
+    """Concurrent, rate-limited prefetch with retries against a local mock API"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockPVWattsHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.in_flight = self.server.max_in_flight = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/pvwatts/v8.json'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_prefetch_retries_and_resumes(self):
+        sites = [(30.0 + i, -100.0) for i in range(6)] + [(30.00001, -100.0), (-10.0, 20.0)]
+        start = time.perf_counter()
+        result = prefetch_pvwatts(sites, api_key='test', url=self.url, rate=100, burst=4, concurrency=3,
+                                  backoff=0.01)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual((result['sites'], result['fetched'], result['failed']), (7, 6, 1))
+        self.assertEqual(list(result['errors']), ['-10.0,20.0'])
+        self.assertIn('422', result['errors']['-10.0,20.0'])
+        # Each good site was throttled once and retried; the rejected one was not retried
+        self.assertEqual(len(self.server.requests), 13)
+        self.assertLessEqual(self.server.max_in_flight, 3)
+        self.assertGreater(self.server.max_in_flight, 1)
+        # 13 requests at 100/s with a burst of 4
+        self.assertGreaterEqual(elapsed, 0.08)
+        self.assertEqual(PVWattsResponse.objects.count(), 6)
+
+        # A rerun only retries the site that is not cached yet
+        result = prefetch_pvwatts(sites, api_key='test', url=self.url, rate=100, backoff=0.01)
+        self.assertEqual((result['cached'], result['failed']), (6, 1))
+        self.assertEqual(len(self.server.requests), 14)
+
+        profile = SolarRadiationService(fetcher=self.fail).get_solar_profile(33.0, -100.0)
+        self.assertEqual(profile.ac.shape, (8760,))
+
+    def fail(self, params):
+        raise AssertionError("prefetched site was fetched again")
+
+
+class ClearSkyModelTests(TestCase):
+    """Offline clear-sky irradiance and output model"""
+
+    def test_geometry_tracking_and_calibration(self):
+        fixed = clear_sky.simulate(35.0, -105.0, tilt=35)
+        ac = fixed['ac'].reshape(365, 24)
+        # Output peaks at solar noon and is zero at night
+        self.assertEqual(ac[172].argmax(), 12)
+        self.assertEqual(ac[172, :4].sum(), 0)
+        self.assertTrue(np.all(fixed['poa'] >= 0))
+        annual = fixed['ac'].sum() / 1000
+        self.assertTrue(1500 < annual < 2500)
+
+        # Equator-facing by default in either hemisphere
+        self.assertLess(clear_sky.simulate(35.0, -105.0, tilt=35, azimuth=0)['ac'].sum() / 1000, annual / 1.5)
+        self.assertAlmostEqual(clear_sky.simulate(-35.0, -105.0)['ac'].sum() / 1000, annual, delta=annual * 0.05)
+
+        single = clear_sky.simulate(35.0, -105.0, array_type=clear_sky.ONE_AXIS)['ac'].sum() / 1000
+        dual = clear_sky.simulate(35.0, -105.0, array_type=clear_sky.TWO_AXIS)['ac'].sum() / 1000
+        self.assertLess(annual, single)
+        self.assertLess(single, dual)
+
+        # Calibrated global irradiance matches the monthly clearness indices
+        target = np.linspace(0.4, 0.7, 12)
+        position = clear_sky.solar_position(35.0, -105.0)
+        calibrated = clear_sky.calibrate(clear_sky.clear_sky_irradiance(position), position, target)
+        horizontal = position['extraterrestrial'] * np.maximum(position['cos_zenith'], 0)
+        starts = np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30]) * 24
+        achieved = np.add.reduceat(calibrated['ghi'], starts) / np.add.reduceat(horizontal, starts)
+        np.testing.assert_allclose(achieved, target)
+
+        # Screening many sites at once matches one at a time
+        latitudes, longitudes = [10.0, 35.0, -30.0], [0.0, -105.0, 150.0]
+        screened = clear_sky.screen_sites(latitudes, longitudes, chunk_size=2, tilt=[10, 35, 30])
+        for i, (latitude, longitude, tilt) in enumerate(zip(latitudes, longitudes, [10, 35, 30])):
+            single_site = clear_sky.simulate(latitude, longitude, tilt=tilt)['ac'].sum() / 1000
+            self.assertAlmostEqual(screened['annual_energy'][i], single_site)
+
+    def test_api_backend(self):
+        project = SolarProject.objects.create(name='Offline Solar', capacity_mw=2, latitude=35.0, longitude=-105.0)
+        url = reverse('projects:solar_radiation_api', kwargs={'pk': project.pk})
+        with self.settings(SOLAR_RESOURCE_BACKEND='clear_sky'):
+            data = self.client.get(url, {'data_type': 'all'}).json()
+        expected = clear_sky.pvwatts_response(pvwatts_cache.request_params(35.0, -105.0))['outputs']
+        self.assertAlmostEqual(data['annual']['annual_energy'], expected['ac_annual'] * 2000)
+        self.assertEqual(len(data['heatmap_data']['avgPower']), 12)
+        self.assertEqual(PVWattsResponse.objects.count(), 0)
+
+        data = self.client.get(url, {'data_type': 'annual', 'backend': 'clear_sky'}).json()
+        self.assertAlmostEqual(data['capacity_factor'], expected['capacity_factor'])
+        self.assertEqual(self.client.get(url, {'backend': 'satellite'}).status_code, 400)
+
+
+class ResourceGridTests(TestCase):
+    """Interpolated site profiles from a lazily filled grid of stored profiles"""
+
+    def setUp(self):
+        self.grid_dir = tempfile.TemporaryDirectory()
+        self.requests = []
+        clear_open_nodes()
+
+    def tearDown(self):
+        clear_open_nodes()
+        self.grid_dir.cleanup()
+
+    def fetch(self, params):
+        self.requests.append(params)
+        return clear_sky.pvwatts_response(params)
+
+    def grid(self, fetcher):
+        service = SolarRadiationService(fetcher=fetcher, use_cache=False)
+        return SolarResourceGrid(service.get_solar_data, source='clear_sky', resolution=0.05,
+                                 directory=self.grid_dir.name)
+
+    def test_clustered_sites_share_nodes(self):
+        grid = self.grid(self.fetch)
+        rng = np.random.default_rng(0)
+        sites = np.column_stack([rng.uniform(35.01, 35.09, 200), rng.uniform(-105.09, -105.01, 200)])
+        profiles = [grid.profile(latitude, longitude, tilt=41, azimuth=178) for latitude, longitude in sites]
+        # 3 x 3 nodes cover every site; tilt and azimuth were bucketed
+        self.assertEqual(len(self.requests), 9)
+        self.assertEqual({(params['tilt'], params['azimuth']) for params in self.requests}, {(40.0, 180.0)})
+
+        exact = clear_sky.simulate(sites[0][0], sites[0][1], tilt=40, azimuth=180,
+                                   array_type=1, module_type=1, losses=10)['ac'].sum() / 1000
+        self.assertAlmostEqual(profiles[0].ac_annual, exact, delta=exact * 0.005)
+
+        # A site on a node needs that node only; a cell centre averages its corners
+        node = grid.hourly(35.05, -105.05)
+        self.assertEqual(len(grid.cells(35.05, -105.05)), 1)
+        corners = [grid.hourly(35.05 + dy, -105.05 + dx) for dy in (0, 0.05) for dx in (0, 0.05)]
+        np.testing.assert_allclose(grid.hourly(35.075, -105.025), np.mean(corners, axis=0), rtol=1e-5)
+        np.testing.assert_allclose(node, corners[0])
+
+        # Stored nodes are reused by a new grid without fetching, in well under a millisecond each
+        clear_open_nodes()
+        stored = self.grid(lambda params: self.fail("stored node was fetched"))
+        stored.profile(35.02, -105.02)
+        start = time.perf_counter()
+        for latitude, longitude in sites:
+            stored.hourly(latitude, longitude)
+        self.assertLess((time.perf_counter() - start) / len(sites), 0.001)
+
+    def test_api_uses_grid_when_enabled(self):
+        project = SolarProject.objects.create(name='Gridded Solar', capacity_mw=1, latitude=35.02, longitude=-105.02)
+        url = reverse('projects:solar_radiation_api', kwargs={'pk': project.pk})
+        with self.settings(SOLAR_GRID_RESOLUTION=0.05, SOLAR_GRID_DIR=self.grid_dir.name):
+            gridded = self.client.get(url, {'data_type': 'annual', 'backend': 'clear_sky'}).json()
+        exact = self.client.get(url, {'data_type': 'annual', 'backend': 'clear_sky'}).json()
+        self.assertNotEqual(gridded['annual_energy'], exact['annual_energy'])
+        self.assertAlmostEqual(gridded['annual_energy'], exact['annual_energy'], delta=exact['annual_energy'] * 0.005)
+        self.assertEqual(len(os.listdir(os.path.join(self.grid_dir.name, os.listdir(self.grid_dir.name)[0]))), 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightTests(SimpleTestCase):
+    """Concurrent identical calls share one computation"""
+
+    def setUp(self):
+        caches[single_flight.CACHE_ALIAS].clear()
+
+    def run_threads(self, count, target):
+        results = [None] * count
+        barrier = threading.Barrier(count)
+
+        def call(i):
+            barrier.wait()
+            results[i] = target()
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_threads_collapse_onto_one_call(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'npv': len(calls)}
+
+        results = self.run_threads(8, lambda: single_flight.run('project:1', compute))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'npv': 1}] * 8)
+        stats = single_flight.stats()
+        self.assertEqual((stats['leaders'], stats['collapsed_local']), (1, 7))
+
+        # Sequential calls are not coalesced
+        single_flight.run('project:1', compute)
+        self.assertEqual(len(calls), 2)
+
+        # Solar fetches for one site share a request
+        requests = []
+
+        def fetch(params):
+            requests.append(params)
+            time.sleep(0.1)
+            return pvwatts_fixture(params['lat'])
+        service = SolarRadiationService(fetcher=fetch, use_cache=False)
+        results = self.run_threads(6, lambda: service.get_solar_data(35.0, -106.0))
+        self.assertEqual(len(requests), 1)
+        self.assertIs(results[0], results[5])
+
+    def test_waits_for_other_process(self):
+        cache = caches[single_flight.CACHE_ALIAS]
+        key = 'project:2'
+
+        # Another worker holds the lock and publishes its result
+        cache.add(single_flight._lock_key(key), 'worker-b', 60)
+
+        def finish():
+            cache.set(single_flight._result_key(key, 'worker-b'), 'from worker b', 30)
+            cache.delete(single_flight._lock_key(key))
+        threading.Timer(0.2, finish).start()
+        self.assertEqual(single_flight.run(key, lambda: 'computed here'), 'from worker b')
+        self.assertEqual(single_flight.stats()['collapsed_remote'], 1)
+
+        # A worker that fails releases the lock without a result
+        cache.add(single_flight._lock_key(key), 'worker-c', 60)
+        threading.Timer(0.2, cache.delete, args=[single_flight._lock_key(key)]).start()
+        self.assertEqual(single_flight.run(key, lambda: 'computed here'), 'computed here')
+
+        # A worker that hangs is waited on until the timeout only
+        cache.add(single_flight._lock_key(key), 'worker-d', 60)
+        self.assertEqual(single_flight.run(key, lambda: 'computed here', wait=0.2), 'computed here')
+        self.assertEqual(single_flight.stats()['timeouts'], 1)
+
+        # Errors reach every waiting thread
+        calls = []
+
+        def fail():
+            calls.append(1)
+            time.sleep(0.1)
+            raise ValueError("no data")
+
+        def call():
+            try:
+                return single_flight.run('project:3', fail)
+            except ValueError as e:
+                return e
+        errors = self.run_threads(3, call)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+
+
+class SharedCacheTests(TestCase):
+    """The single_flight and financial_metrics caches are shared between worker processes by default"""
+
+    def test_database_backends_and_check(self):
+        for alias in (single_flight.CACHE_ALIAS, metrics_cache.CACHE_ALIAS):
+            self.assertEqual(settings.CACHES[alias]['BACKEND'], 'django.core.cache.backends.db.DatabaseCache')
+        cache = caches[single_flight.CACHE_ALIAS]
+        self.assertEqual(single_flight.run('project:4', lambda: 'computed'), 'computed')
+        self.assertTrue(cache.add(single_flight._lock_key('project:4'), 'worker-b', 60))
+        self.assertFalse(cache.add(single_flight._lock_key('project:4'), 'worker-c', 60))
+
+        project = SolarProject.objects.create(name='Shared Solar', capacity_mw=5, capex=4000000)
+        caches[metrics_cache.CACHE_ALIAS].clear()
+        calculate_financial_metrics(project)
+        calculate_financial_metrics(project)
+        self.assertEqual(metrics_cache.stats()['hits'], 1)
+
+        check_ids = ['projects.W001', 'projects.W002']
+        self.assertFalse([message for message in checks.run_checks() if message.id in check_ids])
+        with override_settings(CACHES=LOCMEM_CACHES):
+            self.assertEqual(sorted(message.id for message in checks.run_checks() if message.id in check_ids),
+                             check_ids)
+
+
+class JobQueueTests(TestCase):
+    """Background jobs: submission, polling, retries and worker claims"""
+
+    def setUp(self):
+        self.project = SolarProject.objects.create(
+            name='Queued Solar', capacity_mw=10, capex=8000000, opex_per_year=100000
+        )
+        self.attempts = []
+        jobs.JOB_HANDLERS['flaky'] = self.flaky
+        self.addCleanup(jobs.JOB_HANDLERS.pop, 'flaky')
+
+    def flaky(self, params, progress):
+        self.attempts.append(params)
+        progress(0.5, 'halfway')
+        if len(self.attempts) < params['failures'] + 1:
+            raise RuntimeError("upstream timed out")
+        if params.get('invalid'):
+            raise ValueError("bad input")
+        return {'attempts': len(self.attempts)}
+
+    def test_offloaded_metrics_and_polling(self):
+        payload = {'project_id': self.project.pk, 'discount_rate': 0.07}
+        response = self.client.post(reverse('projects:calculate_metrics_api'),
+                                    json.dumps(dict(payload, background=True)), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(FinancialMetric.objects.exists())
+        url = response.json()['url']
+        self.assertEqual(self.client.get(url).json()['status'], 'queued')
+
+        call_command('run_jobs', '--once', stdout=open(os.devnull, 'w'))
+        status = self.client.get(url).json()
+        self.assertEqual((status['status'], status['progress'], status['attempts']), ('succeeded', 1.0, 1))
+        inline = self.client.post(reverse('projects:calculate_metrics_api'), json.dumps(payload),
+                                  content_type='application/json').json()
+        self.assertEqual(status['result'], inline)
+
+        response = self.client.post(reverse('projects:jobs_api'), json.dumps({'kind': 'unknown'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_retries_claims_and_stale_workers(self):
+        job = jobs.submit('flaky', {'failures': 1})
+        claimed = jobs.claim('worker-a')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(jobs.claim('worker-b'))
+
+        # A transient failure is retried after a backoff
+        jobs.run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.message), ('queued', 1, 'halfway'))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(jobs.work(once=True), 0)
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(jobs.work(once=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), ('succeeded', {'attempts': 2}, 2))
+
+        # Invalid input fails at once
+        jobs.submit('flaky', {'failures': 0, 'invalid': 1})
+        failed = jobs.run_job(jobs.claim('worker-a'))
+        self.assertEqual((failed.status, failed.attempts), ('failed', 1))
+        self.assertIn('bad input', self.client.get(reverse('projects:job_detail_api', kwargs={'pk': failed.pk})
+                                                   ).json()['error'])
+
+        # A worker that stops heartbeating loses its job
+        stale = jobs.submit('flaky', {'failures': 0})
+        jobs.claim('worker-c')
+        Job.objects.filter(pk=stale.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker), ('queued', ''))
+
+    def test_requeued_job_keeps_new_attempt(self):
+        def requeued(params, progress):
+            # Another worker's stale check requeues the job while this one still runs it
+            Job.objects.filter(pk=job.pk).update(status=Job.QUEUED, worker='')
+            return {'done': True}
+
+        jobs.JOB_HANDLERS['requeued'] = requeued
+        self.addCleanup(jobs.JOB_HANDLERS.pop, 'requeued')
+        job = jobs.submit('requeued')
+        result = jobs.run_job(jobs.claim('worker-a'))
+        self.assertEqual((result.status, result.result, result.worker), ('queued', None, ''))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.finished_at), ('queued', None, None))
+
+    def test_background_import(self):
+        upload = SimpleUploadedFile('plant.csv', b'name,capacity_mw,project_type,target_country\nQueued Plant,25,solar,Chile\n')
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            response = self.client.post(reverse('projects:project_import'), {'file': upload, 'background': 'on'})
+            self.assertRedirects(response, reverse('projects:project_list'), fetch_redirect_response=False)
+            job = Job.objects.get(kind='import_project')
+            self.assertTrue(os.path.exists(os.path.join(media, job.params['path'])))
+
+            jobs.work(once=True)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'succeeded')
+            project = SolarProject.objects.get(pk=job.result['project_id'])
+            self.assertEqual(project.name, 'Queued Plant')
+            self.assertIsNotNone(project.overall_risk_score)
+            self.assertFalse(os.path.exists(os.path.join(media, job.params['path'])))
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    """Heartbeats of long-running handlers that never report progress"""
+
+    def test_slow_handler_keeps_heartbeating(self):
+        jobs.JOB_HANDLERS['slow'] = lambda params, progress: time.sleep(0.5) or {'slept': True}
+        self.addCleanup(jobs.JOB_HANDLERS.pop, 'slow')
+        job = jobs.submit('slow')
+        claimed = jobs.claim('worker-a')
+
+        with mock.patch.object(jobs, 'HEARTBEAT_INTERVAL', 0.05):
+            result = jobs.run_job(claimed)
+        self.assertEqual((result.status, result.result), ('succeeded', {'slept': True}))
+        job.refresh_from_db()
+        # Without the heartbeat thread the job would look stale 0.3 s into the handler
+        self.assertGreaterEqual(job.heartbeat_at - job.started_at, timedelta(seconds=0.3))
+
+
+class ModelRegistryTests(TestCase):
+    """Versioned model artifacts served read-only, with training kept in jobs"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.trained = train_power_model(n_samples=300)
+
+    def setUp(self):
+        model_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(model_dir.cleanup)
+        settings_override = override_settings(ML_MODEL_DIR=model_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        model_registry.clear_models()
+        self.addCleanup(model_registry.clear_models)
+        # Drop the bundled version published by the 0013 migration
+        MLModelVersion.objects.all().delete()
+
+    def test_bundled_model_seed(self):
+        seed = importlib.import_module('projects.migrations.0013_seed_power_model')
+        seed.seed_power_model(django_apps, None)
+        served = model_registry.get_model('power_generation')
+        self.assertEqual(served.version, 1)
+        self.assertGreater(served.metrics['r_squared'], 0.5)
+        self.assertEqual(len(served.metadata['demo_samples']['power']), 100)
+        self.assertEqual(self.client.get(reverse('projects:ml_power_prediction')).context['model_version'], 1)
+
+    def test_publish_load_and_activate(self):
+        model, metrics, metadata = self.trained
+        first = model_registry.publish_model('power_generation', model, metrics, metadata)
+        served = model_registry.get_model('power_generation')
+        self.assertEqual(served.version, 1)
+        self.assertIs(model_registry.get_model('power_generation'), served)
+        self.assertGreater(served.metrics['r_squared'], 0.5)
+        with self.assertRaises(AttributeError):
+            served.version = 2
+
+        # Columns are reordered to the training order
+        _, X, _, _ = power_model_split(n_samples=300)
+        np.testing.assert_allclose(served.predict(X[X.columns[::-1]]), model.predict(X[metadata['features']]))
+
+        # Republishing identical bytes reuses the artifact; activation switches the served model
+        second = model_registry.publish_model('power_generation', model, metrics, metadata)
+        self.assertEqual((second.version, second.artifact), (2, first.artifact))
+        self.assertEqual(model_registry.get_model('power_generation').version, 2)
+        model_registry.activate_model_version(first)
+        self.assertEqual(model_registry.get_model('power_generation').version, 1)
+        self.assertEqual(MLModelVersion.objects.filter(is_active=True).count(), 1)
+
+        # Another process activates version 2 without this process clearing its models
+        MLModelVersion.objects.filter(pk=first.pk).update(is_active=False)
+        MLModelVersion.objects.filter(pk=second.pk).update(is_active=True, activated_at=timezone.now())
+        self.assertEqual(model_registry.get_model('power_generation').version, 2)
+        with self.assertNumQueries(1):
+            model_registry.get_model('power_generation')
+
+        with open(model_registry._artifact_path(first.artifact), 'ab') as f:
+            f.write(b'tampered')
+        with self.assertRaises(model_registry.ModelNotAvailable):
+            model_registry.load_model('power_generation', version=1)
+
+    def test_view_never_trains(self):
+        url = reverse('projects:ml_power_prediction')
+        split = mock.patch('projects.ml_models.power_model_split', side_effect=AssertionError("split in a request"))
+        with mock.patch.object(Pipeline, 'fit', side_effect=AssertionError("trained in a request")), split:
+            # Without an active version the page only reports it
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNotNone(response.context['model_error'])
+            self.assertIsNone(response.context['training_job'])
+            self.assertFalse(Job.objects.exists())
+
+            # Training is queued explicitly, once
+            for _ in range(2):
+                self.assertRedirects(self.client.post(url), url)
+            self.assertEqual(Job.objects.filter(kind='train_model', status=Job.QUEUED).count(), 1)
+            self.assertIsNotNone(self.client.get(url).context['training_job'])
+
+        job = Job.objects.get(kind='train_model')
+        job.params['n_samples'] = 300
+        job.save(update_fields=['params'])
+        jobs.work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED, job.error)
+        self.assertEqual(job.result['version'], 1)
+
+        with mock.patch.object(Pipeline, 'fit', side_effect=AssertionError("trained in a request")), split:
+            # Demonstration rows come from the published version
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['model_version'], 1)
+        self.assertEqual(len(response.context['prediction_examples']), 5)
+        self.assertEqual(len(response.context['visualization_data']['irradiance_vs_power']), 60)
+        self.assertEqual(model_registry.warm_models(['power_generation']), {'power_generation': 1})
@@ -22,6 +22,9 @@ urlpatterns = [
     # Financial analysis
     path('projects/<int:pk>/analyze/', views.FinancialAnalysisView.as_view(), name='financial_analysis'),
     
+    # Scenario analysis
+    path('scenarios/results/<int:pk>/', views.ScenarioComparisonView.as_view(), name='scenario_comparison'),
+    
     # Geospatial visualization
     path('map/', views.GeospatialMapView.as_view(), name='geospatial_map'),
     path('projects/<int:pk>/map/', views.ProjectMapView.as_view(), name='project_map'),
@@ -34,6 +37,19 @@ urlpatterns = [
     
     # API endpoints
     path('api/calculate-metrics/', views.calculate_metrics_api, name='calculate_metrics_api'),
+    path('api/calculate-metrics/batch/', views.calculate_portfolio_metrics_api, name='calculate_portfolio_metrics_api'),
+    path('api/projects/<int:pk>/sensitivity/', views.sensitivity_api, name='sensitivity_api'),
+    path('api/projects/<int:pk>/hourly/', views.hourly_profile_api, name='hourly_profile_api'),
+    path('api/projects/<int:pk>/risk-simulation/', views.risk_simulation_api, name='risk_simulation_api'),
+    path('api/projects/<int:pk>/debt-sizing/', views.debt_sizing_api, name='debt_sizing_api'),
+    path('api/debt-sizing/batch/', views.portfolio_debt_sizing_api, name='portfolio_debt_sizing_api'),
+    path('api/goal-seek/', views.goal_seek_api, name='goal_seek_api'),
+    path('api/scenarios/evaluate/', views.evaluate_scenarios_api, name='evaluate_scenarios_api'),
+    path('api/metrics-cache/stats/', views.metrics_cache_stats_api, name='metrics_cache_stats_api'),
+    path('api/pvwatts-cache/stats/', views.pvwatts_cache_stats_api, name='pvwatts_cache_stats_api'),
+    path('api/single-flight/stats/', views.single_flight_stats_api, name='single_flight_stats_api'),
+    path('api/jobs/', views.jobs_api, name='jobs_api'),
+    path('api/jobs/<int:pk>/', views.job_detail_api, name='job_detail_api'),
     path('api/map-data/', views.map_data_api, name='map_data_api'),
     path('api/project-map-data/<int:pk>/', views.project_map_data_api, name='project_map_data_api'),
     path('api/solar-radiation/<int:pk>/', views.solar_radiation_api, name='solar_radiation_api'),
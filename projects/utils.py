@@ -3,13 +3,24 @@ Utility functions for the Energy Finance application.
 """
 
 import os
+import logging
 import numpy as np
 import pandas as pd
 from datetime import datetime
 from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from .models import Project, SolarProject, CashFlow, FinancialMetric
+from .models import Project, SolarProject, FinancialMetric
+from . import hourly_model, metrics_cache
+from .cash_flow_engine import (HOURS_PER_YEAR, add_hourly_overrides, build_cash_flow_matrix, compute_metrics,
+                               generate_portfolio_cash_flows, load_cash_flow_inputs, load_cash_flow_schedule,
+                               load_ppa_terms, persist_cash_flows, project_cash_flow_inputs, refresh_cash_flows,
+                               resolve_ppa_terms, STORED)
+from .risk_tables import get_risk_lookup
+
+logger = logging.getLogger(__name__)
 
 
 def generate_project_templates():
@@ -64,7 +75,25 @@ def generate_project_templates():
     return excel_path, csv_path
 
 
-def calculate_financial_metrics(project, discount_rate=0.08, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05):
+def get_project_with_solar(pk):
+    """
+    Load a project with one query, as its SolarProject row for solar projects.
+    
+    The cash flow engine only applies the solar capacity factor, degradation
+    and performance ratio to SolarProject instances, so every path that
+    calculates metrics for a project id loads it through here.
+    
+    Returns: SolarProject or Project instance; raises Project.DoesNotExist
+    """
+    project = Project.objects.select_related('solarproject').get(pk=pk)
+    try:
+        return project.solarproject
+    except SolarProject.DoesNotExist:
+        return project
+
+
+def calculate_financial_metrics(project, discount_rate=0.08, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05,
+                                ppa_price=STORED, ppa_escalation=STORED, ppa_term=STORED):
     """
     Calculate financial metrics for a project.
     
@@ -74,230 +103,297 @@ def calculate_financial_metrics(project, discount_rate=0.08, inflation_rate=0.02
     - inflation_rate: Inflation rate (default 2.5%)
     - debt_ratio: Debt to capital ratio (default 70%)
     - interest_rate: Interest rate on debt (default 5%)
+    - ppa_price: PPA price in $/MWh (default: the stored price; without one
+      all energy is sold at the merchant price)
+    - ppa_escalation: Annual PPA price escalation (default: the stored value)
+    - ppa_term: PPA term in years (default: the stored term; without one the
+      PPA covers the whole lifetime)
+    
+    A PPA term given as None clears the stored one.
     
     Returns: FinancialMetric instance
     """
     # Get or create a financial metric instance for this project
     financial_metric, created = FinancialMetric.objects.get_or_create(project=project)
     
-    # Set input parameters
+    # Set input parameters; PPA terms not given keep their stored values
     financial_metric.discount_rate = discount_rate
     financial_metric.inflation_rate = inflation_rate
     financial_metric.debt_ratio = debt_ratio
     financial_metric.interest_rate = interest_rate
+    ppa_terms = {
+        name: getattr(financial_metric, name) if value is STORED else value
+        for name, value in [('ppa_price', ppa_price), ('ppa_escalation', ppa_escalation), ('ppa_term', ppa_term)]
+    }
+    for name, value in ppa_terms.items():
+        setattr(financial_metric, name, value)
+    
+    # Reuse cached results for identical inputs, rates and stored cash flows
+    inputs = project_cash_flow_inputs([project])
+    rates = dict({
+        'discount_rate': discount_rate,
+        'inflation_rate': inflation_rate,
+        'debt_ratio': debt_ratio,
+        'interest_rate': interest_rate,
+    }, **ppa_terms)
+    cache_key = metrics_cache.metrics_key(project.pk, inputs, rates)
+    metrics = metrics_cache.get(cache_key)
+    
+    if metrics is None:
+        # Update only the stored cash flow columns whose inputs changed; the
+        # discount rate never touches them and only re-discounts the vector
+        if refresh_cash_flows(project, inflation_rate, debt_ratio, interest_rate, **ppa_terms):
+            # Writing cash flows invalidated the old key
+            cache_key = metrics_cache.metrics_key(project.pk, inputs, rates)
+        schedule = load_cash_flow_schedule(project)
+        
+        # Calculate NPV, IRR, payback, LCOE, MIRR, profitability index and DSCR
+        metrics = compute_metrics(
+            schedule,
+            project.expected_lifetime_years,
+            discount_rate=discount_rate,
+            interest_rate=interest_rate
+        )
+        metrics = {field: float(values[0]) for field, values in metrics.items()}
+        metrics_cache.set(cache_key, metrics)
     
-    # Get all cash flows for this project, ordered by year
-    cash_flows = project.cash_flows.all().order_by('year')
-    
-    if not cash_flows:
-        # Generate cash flows if none exist
-        _generate_cash_flows(project, discount_rate, inflation_rate, debt_ratio, interest_rate)
-        cash_flows = project.cash_flows.all().order_by('year')
-    
-    # Extract cash flow data for calculations
-    years = [cf.year for cf in cash_flows]
-    net_cash_flows = [cf.net_cash_flow for cf in cash_flows]
-    
-    if not net_cash_flows or all(ncf == 0 for ncf in net_cash_flows):
-        # Default values if we can't calculate
-        financial_metric.npv = 0
-        financial_metric.irr = 0
-        financial_metric.payback_period = project.expected_lifetime_years
-        financial_metric.lcoe = 0
-        financial_metric.mirr = 0
-        financial_metric.profitability_index = 0
-        financial_metric.debt_service_coverage_ratio = 0
-        financial_metric.save()
-        return financial_metric
-    
-    # Calculate NPV
-    npv = _calculate_npv(net_cash_flows, discount_rate)
-    financial_metric.npv = npv
-    
-    # Calculate IRR
-    try:
-        irr = np.irr(net_cash_flows) * 100  # Convert to percentage
-        if np.isnan(irr) or not np.isfinite(irr):
-            irr = 0
-        financial_metric.irr = irr
-    except:
-        financial_metric.irr = 0
-    
-    # Calculate payback period
-    cum_cash_flows = np.cumsum(net_cash_flows)
-    if cum_cash_flows[-1] <= 0:
-        # Project never pays back
-        payback_period = project.expected_lifetime_years
-    else:
-        payback_indices = np.where(cum_cash_flows > 0)[0]
-        if len(payback_indices) > 0:
-            payback_idx = payback_indices[0]
-            # Simple linear interpolation for fractional year
-            if payback_idx > 0:
-                prev_cf = cum_cash_flows[payback_idx - 1]
-                curr_cf = cum_cash_flows[payback_idx]
-                if curr_cf - prev_cf != 0:
-                    fraction = -prev_cf / (curr_cf - prev_cf)
-                else:
-                    fraction = 0
-                payback_period = payback_idx - 1 + fraction
-            else:
-                payback_period = payback_idx
-        else:
-            payback_period = project.expected_lifetime_years
+    for field, value in metrics.items():
+        if np.isnan(value):
+            # IRR and MIRR are undefined for cash flows without a sign change
+            logger.warning("%s is undefined for project %s", field, project.pk)
+            value = None
+        setattr(financial_metric, field, value)
     
-    financial_metric.payback_period = payback_period
+    financial_metric.save()
+    return financial_metric
+
+
+def evaluate_financial_metrics(project, discount_rate=0.08, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05,
+                               ppa_price=STORED, ppa_escalation=STORED, ppa_term=STORED):
+    """
+    Calculate financial metrics for a project entirely in memory.
     
-    # Calculate LCOE (Levelized Cost of Energy)
-    total_energy_mwh = sum(cf.energy_production_mwh for cf in cash_flows)
-    total_costs = sum(cf.capex + cf.opex + cf.maintenance + cf.insurance for cf in cash_flows)
-    if total_energy_mwh > 0:
-        lcoe = total_costs / total_energy_mwh
-    else:
-        lcoe = 0
-    financial_metric.lcoe = lcoe
+    Cash flows are rebuilt from the project's inputs with the given rates and
+    nothing is written; only the stored PPA terms are read.
     
-    # Calculate MIRR
-    try:
-        # Separate positive and negative cash flows
-        pos_flows = [max(cf, 0) for cf in net_cash_flows]
-        neg_flows = [min(cf, 0) for cf in net_cash_flows]
-        
-        # Replace zeros with a small number to avoid division by zero
-        neg_flows = [-0.000001 if nf == 0 else nf for nf in neg_flows]
-        
-        # Calculate MIRR
-        n = len(net_cash_flows) - 1  # Number of periods
-        neg_pv = np.npv(interest_rate, neg_flows)
-        pos_fv = np.sum(np.array(pos_flows) * np.power(1 + discount_rate, np.arange(n + 1)))
-        
-        if neg_pv != 0 and pos_fv > 0:
-            mirr = (pow(pos_fv / -neg_pv, 1 / n) - 1) * 100
-            if np.isnan(mirr) or not np.isfinite(mirr) or mirr > 100:
-                mirr = 0
-        else:
-            mirr = 0
-        financial_metric.mirr = mirr
-    except:
-        financial_metric.mirr = 0
-    
-    # Calculate Profitability Index
-    initial_investment = abs(net_cash_flows[0]) if net_cash_flows[0] < 0 else 1
-    if initial_investment > 0:
-        profitability_index = (npv + initial_investment) / initial_investment
-    else:
-        profitability_index = 0
-    financial_metric.profitability_index = profitability_index
-    
-    # Calculate Debt Service Coverage Ratio
-    annual_debt_service = sum(cf.debt_service for cf in cash_flows) / len(cash_flows)
-    if annual_debt_service != 0:
-        operating_income = sum(cf.revenue for cf in cash_flows) - sum(cf.opex for cf in cash_flows)
-        dscr = operating_income / abs(annual_debt_service)
-    else:
-        dscr = 0
-    financial_metric.debt_service_coverage_ratio = dscr
+    Parameters:
+    - project: A Project or SolarProject instance
+    - discount_rate: Discount rate (default 8%)
+    - inflation_rate: Inflation rate (default 2.5%)
+    - debt_ratio: Debt to capital ratio (default 70%)
+    - interest_rate: Interest rate on debt (default 5%)
+    - ppa_price, ppa_escalation, ppa_term: PPA terms as for calculate_financial_metrics()
     
-    financial_metric.save()
-    return financial_metric
+    Returns: Tuple of (metrics dictionary, cash flow schedule)
+    """
+    schedule = build_cash_flow_matrix(
+        add_hourly_overrides([project.pk], project_cash_flow_inputs([project])),
+        inflation_rate=inflation_rate,
+        debt_ratio=debt_ratio,
+        interest_rate=interest_rate,
+        **resolve_ppa_terms([project.pk], ppa_price, ppa_escalation, ppa_term)
+    )
+    metrics = compute_metrics(
+        schedule,
+        project.expected_lifetime_years,
+        discount_rate=discount_rate,
+        interest_rate=interest_rate
+    )
+    
+    # Undefined IRR/MIRR are reported as None
+    metrics = {
+        field: None if np.isnan(values[0]) else float(values[0])
+        for field, values in metrics.items()
+    }
+    return metrics, schedule
 
 
-def _calculate_npv(cash_flows, discount_rate):
-    """Calculate Net Present Value of cash flows"""
-    try:
-        npv = np.npv(discount_rate, cash_flows)
-        if np.isnan(npv) or not np.isfinite(npv):
-            return 0
-        return npv
-    except:
-        return 0
+def simulate_hourly_cash_flows(project, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05,
+                               dc_ac_ratio=hourly_model.DEFAULT_DC_AC_RATIO, export_limit=None, price_shape=None):
+    """
+    Switch a solar project to the hourly production model.
+    
+    Simulates 8760 x lifetime hourly energy, stores it as an HourlyProfile and
+    rebuilds the annual cash flows from its energy and time-of-day revenue.
+    Later cash flow updates keep using the profile until it is deleted.
+    
+    Parameters:
+    - project: A SolarProject instance
+    - inflation_rate: Inflation rate (default 2.5%)
+    - debt_ratio: Debt to capital ratio (default 70%)
+    - interest_rate: Interest rate on debt (default 5%)
+    - dc_ac_ratio: DC to AC ratio of the inverters (default 1.25)
+    - export_limit: Grid export limit as a share of capacity, or None
+    - price_shape: 24 time-of-day or 8760 hourly price multipliers (default: evening peak)
+    
+    Returns: HourlyProfile instance
+    """
+    if not isinstance(project, SolarProject):
+        raise ValueError("Hourly simulation is only available for solar projects")
+    
+    options = {
+        'latitude': project.latitude,
+        'tracking_type': project.tracking_type,
+        'dc_ac_ratio': dc_ac_ratio,
+        'export_limit': export_limit,
+        'price_shape': None if price_shape is None else [float(value) for value in price_shape],
+    }
+    inputs = project_cash_flow_inputs([project])
+    current = {name: inputs[name][0].item() for name in hourly_model.PROFILE_INPUTS}
+    
+    with transaction.atomic():
+        result = hourly_model.simulate_hourly(current, **options)
+        profile = hourly_model.save_hourly_profile(project.pk, current, result, options)
+        schedule = build_cash_flow_matrix(
+            add_hourly_overrides([project.pk], inputs, profiles=[{
+                'project_id': project.pk,
+                'inputs': profile.inputs,
+                'options': options,
+                'annual_energy_mwh': profile.annual_energy_mwh,
+                'annual_price_factor': profile.annual_price_factor,
+            }]),
+            inflation_rate=inflation_rate,
+            debt_ratio=debt_ratio,
+            interest_rate=interest_rate,
+            **load_ppa_terms([project.pk])
+        )
+        persist_cash_flows([project], schedule)
+    
+    return profile
 
 
-def _generate_cash_flows(project, discount_rate=0.08, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05):
-    """Generate cash flow projections for a project"""
-    # Clear existing cash flows
-    project.cash_flows.all().delete()
-    
-    lifetime = project.expected_lifetime_years
-    
-    # Year 0: Initial investment
-    initial_capex = project.capex if project.capex else (project.capex_per_mw * project.capacity_mw if project.capex_per_mw else 0)
-    
-    # Calculate debt and equity portions
-    debt_amount = initial_capex * debt_ratio
-    equity_amount = initial_capex * (1 - debt_ratio)
-    
-    # Calculate annual debt service (assuming equal payments over 15 years or project lifetime)
-    loan_term = min(15, lifetime)
-    if debt_amount > 0 and interest_rate > 0:
-        annual_debt_service = -debt_amount * (interest_rate * (1 + interest_rate) ** loan_term) / ((1 + interest_rate) ** loan_term - 1)
-    else:
-        annual_debt_service = 0
-    
-    # Year 0 cash flow
-    CashFlow.objects.create(
-        project=project,
-        year=0,
-        capex=-initial_capex,
-        net_cash_flow=-equity_amount,  # Only equity portion affects cash flow
-        cumulative_cash_flow=-equity_amount
-    )
+def filter_projects(queryset, filters):
+    """
+    Apply portfolio filters to a Project queryset.
     
-    # Years 1 to end of life
-    cumulative_cash_flow = -equity_amount
+    Parameters:
+    - queryset: A Project queryset
+    - filters: Dictionary with any of project_type, status, target_country,
+      min_capacity and max_capacity
     
-    for year in range(1, lifetime + 1):
-        # Calculate energy production
-        if isinstance(project, SolarProject):
-            energy_production = estimate_energy_production(project, year)
-        else:
-            # Simple estimation for non-solar projects
-            energy_production = project.capacity_mw * 8760 * 0.3  # Assuming 30% capacity factor
-        
-        # Annual O&M costs with inflation
-        annual_opex = project.opex_per_year if project.opex_per_year else (project.opex_per_mw * project.capacity_mw if project.opex_per_mw else 0)
-        annual_opex *= (1 + inflation_rate) ** (year - 1)
-        
-        # Maintenance and insurance (simplified)
-        maintenance = -annual_opex * 0.3  # 30% of OPEX for maintenance
-        insurance = -annual_opex * 0.1    # 10% of OPEX for insurance
-        
-        # Revenue (simplified)
-        # Assuming $50/MWh base power price with inflation
-        ppa_price = 50 * (1 + inflation_rate) ** (year - 1)
-        revenue = energy_production * ppa_price
-        
-        # Debt service (only until loan term)
-        debt_service = annual_debt_service if year <= loan_term else 0
-        
-        # Tax calculation (simplified)
-        taxable_income = revenue + annual_opex + maintenance + insurance + debt_service * 0.5  # Assume 50% of interest is deductible
-        taxes = -taxable_income * 0.21 if taxable_income > 0 else 0  # Simplified corporate tax rate
+    Returns: Filtered queryset
+    """
+    if filters.get('project_type'):
+        queryset = queryset.filter(project_type=filters['project_type'])
+    if filters.get('status'):
+        queryset = queryset.filter(status=filters['status'])
+    if filters.get('target_country'):
+        queryset = queryset.filter(target_country__iexact=filters['target_country'])
+    if filters.get('min_capacity') is not None:
+        queryset = queryset.filter(capacity_mw__gte=float(filters['min_capacity']))
+    if filters.get('max_capacity') is not None:
+        queryset = queryset.filter(capacity_mw__lte=float(filters['max_capacity']))
+    return queryset
+
+
+PORTFOLIO_RATE_DEFAULTS = {
+    'discount_rate': 0.08,
+    'inflation_rate': 0.025,
+    'debt_ratio': 0.7,
+    'interest_rate': 0.05,
+}
+
+# Optional per-portfolio or per-project PPA terms; unset means merchant sales
+PORTFOLIO_PPA_TERMS = ['ppa_price', 'ppa_escalation', 'ppa_term']
+
+
+def calculate_portfolio_metrics(queryset, rates=None, project_rates=None, persist=False, chunk_size=5000):
+    """
+    Calculate financial metrics for many projects in vectorized batches.
+    
+    Inputs are loaded with one query per chunk and each chunk is computed as a
+    single (projects x years) matrix, so the cost grows linearly with the
+    number of projects.
+    
+    Parameters:
+    - queryset: A Project queryset selecting the portfolio
+    - rates: Shared rate parameters, keys from PORTFOLIO_RATE_DEFAULTS and
+      PORTFOLIO_PPA_TERMS; PPA terms not given come from each project's
+      stored FinancialMetric, and PPA terms given as None clear them
+    - project_rates: Optional {project_id: {rate: value}} overrides
+    - persist: Store cash flows and FinancialMetric rows in bulk (default False)
+    - chunk_size: Number of projects computed per batch
+    
+    Returns: Dictionary with an 'id' array and one metric array per FinancialMetric field
+    """
+    rates = rates or {}
+    shared = dict(PORTFOLIO_RATE_DEFAULTS, **{name: value for name, value in rates.items() if name in PORTFOLIO_RATE_DEFAULTS})
+    shared_ppa = {name: rates[name] for name in PORTFOLIO_PPA_TERMS if name in rates}
+    project_rates = {int(pk): values for pk, values in (project_rates or {}).items()}
+    
+    results = []
+    last_id = 0
+    queryset = queryset.order_by('pk')
+    while True:
+        ids, inputs = load_cash_flow_inputs(queryset.filter(pk__gt=last_id)[:chunk_size])
+        if not len(ids):
+            break
+        inputs = add_hourly_overrides(ids.tolist(), inputs, persist=persist)
+        last_id = int(ids[-1])
         
-        # Salvage value in final year
-        salvage_value = initial_capex * 0.1 if year == lifetime else 0  # Assume 10% salvage value
+        # Resolve per-project rate columns for this chunk
+        chunk_rates = {
+            name: np.array([float(project_rates.get(pk, {}).get(name, default)) for pk in ids.tolist()])
+            for name, default in shared.items()
+        }
+        chunk_ppa = load_ppa_terms(ids)
+        for name, stored in chunk_ppa.items():
+            chunk_ppa[name] = np.array([
+                project_rates.get(pk, {}).get(name, shared_ppa.get(name, stored_value))
+                for pk, stored_value in zip(ids.tolist(), stored.tolist())
+            ], dtype=float)
         
-        # Net cash flow
-        net_cash_flow = revenue + annual_opex + maintenance + insurance + debt_service + taxes + salvage_value
+        schedule = build_cash_flow_matrix(
+            inputs,
+            inflation_rate=chunk_rates['inflation_rate'],
+            debt_ratio=chunk_rates['debt_ratio'],
+            interest_rate=chunk_rates['interest_rate'],
+            **chunk_ppa
+        )
+        metrics = compute_metrics(
+            schedule,
+            inputs['lifetime'],
+            discount_rate=chunk_rates['discount_rate'],
+            interest_rate=chunk_rates['interest_rate']
+        )
         
-        # Cumulative cash flow
-        cumulative_cash_flow += net_cash_flow
+        if persist:
+            with transaction.atomic():
+                persist_cash_flows(ids.tolist(), schedule)
+                _persist_financial_metrics(ids, metrics, dict(chunk_rates, **chunk_ppa))
         
-        # Create cash flow record
-        CashFlow.objects.create(
-            project=project,
-            year=year,
-            revenue=revenue,
-            opex=annual_opex,
-            maintenance=maintenance,
-            insurance=insurance,
-            debt_service=debt_service,
-            taxes=taxes,
-            salvage_value=salvage_value,
-            energy_production_mwh=energy_production,
-            net_cash_flow=net_cash_flow,
-            cumulative_cash_flow=cumulative_cash_flow
-        )
+        metrics['id'] = ids
+        results.append(metrics)
+    
+    if not results:
+        return {'id': np.zeros(0, dtype=int)}
+    return {field: np.concatenate([chunk[field] for chunk in results]) for field in results[0]}
+
+
+def _persist_financial_metrics(ids, metrics, rates, batch_size=2000):
+    """Insert or update FinancialMetric rows for a batch of projects."""
+    fields = list(metrics) + list(rates)
+    values = {field: np.asarray(column, dtype=float).tolist() for field, column in dict(metrics, **rates).items()}
+    now = timezone.now()
+    
+    existing = FinancialMetric.objects.in_bulk(ids.tolist(), field_name='project_id')
+    to_create, to_update = [], []
+    for i, project_id in enumerate(ids.tolist()):
+        financial_metric = existing.get(project_id) or FinancialMetric(project_id=project_id)
+        for field in fields:
+            value = values[field][i]
+            setattr(financial_metric, field, None if np.isnan(value) else value)
+        financial_metric.updated_at = now
+        (to_update if financial_metric.pk else to_create).append(financial_metric)
+    
+    FinancialMetric.objects.bulk_create(to_create, batch_size=batch_size)
+    FinancialMetric.objects.bulk_update(to_update, fields + ['updated_at'], batch_size=batch_size)
+
+
+def _generate_cash_flows(project, discount_rate=0.08, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05):
+    """Generate cash flow projections for a project"""
+    generate_portfolio_cash_flows([project], inflation_rate=inflation_rate, debt_ratio=debt_ratio,
+                                  interest_rate=interest_rate)
     
     return project.cash_flows.all()
 
@@ -306,34 +402,22 @@ def estimate_energy_production(solar_project, year):
     """
     Estimate energy production for a solar project in a given year.
     
+    Uses the cash flow engine's capacity factor, degradation and performance
+    ratio assumptions.
+    
     Parameters:
     - solar_project: A SolarProject instance
     - year: Year of operation (1-based, where 1 is the first year)
     
     Returns: Estimated energy production in MWh
     """
-    # Basic calculation without site-specific data
-    capacity_mw = solar_project.capacity_mw
-    hours_per_year = 8760
+    inputs = project_cash_flow_inputs([solar_project])
+    degradation_factor = (1 - inputs['degradation_rate'][0]) ** (year - 1)
     
-    # Base capacity factor based on tracking type
-    base_capacity_factor = {
-        'fixed': 0.20,
-        'single-axis': 0.25,
-        'dual-axis': 0.30
-    }.get(solar_project.tracking_type, 0.20)
+    energy_production = (inputs['capacity_mw'][0] * HOURS_PER_YEAR * inputs['capacity_factor'][0]
+                         * inputs['performance_ratio'][0] * degradation_factor)
     
-    # Adjust for degradation over time
-    degradation_rate = solar_project.degradation_rate / 100 if solar_project.degradation_rate else 0.005
-    degradation_factor = (1 - degradation_rate) ** (year - 1)
-    
-    # Adjust for performance ratio
-    performance_ratio = solar_project.performance_ratio if solar_project.performance_ratio else 0.75
-    
-    # Calculate annual energy production in MWh
-    energy_production = capacity_mw * hours_per_year * base_capacity_factor * degradation_factor * performance_ratio
-    
-    return energy_production
+    return float(energy_production)
 
 
 def import_project_from_file(file):
@@ -402,6 +486,29 @@ def import_project_from_file(file):
         return False, f"Error importing project: {str(e)}", None
 
 
+# Risk table defaults for empty or unknown values (1-5 scale, where 5 is highest risk)
+DEFAULT_HOME_COUNTRY_RISK = 2.5
+DEFAULT_TARGET_COUNTRY_RISK = 3.0
+HOME_COUNTRY_WEIGHT = 0.3           # the target country has more impact
+DEFAULT_TECHNOLOGY_RISK = 3.0
+DEFAULT_STATUS_RISK = 3.0
+DEFAULT_OFF_TAKER_RISK = 3.0
+
+# Weights of the component scores in the overall risk score
+RISK_WEIGHTS = {
+    'country': 0.25,
+    'technology': 0.25,
+    'status': 0.20,
+    'off_taker': 0.30
+}
+
+# Project fields the risk scores are calculated from, and written to
+RISK_INPUT_FIELDS = ['home_country', 'target_country', 'project_type', 'technology_risk_factor',
+                     'project_status_risk', 'off_taker_rating']
+RISK_SCORE_FIELDS = ['country_risk_score', 'technology_risk_score', 'status_risk_score',
+                     'off_taker_risk_score', 'overall_risk_score']
+
+
 def calculate_risk_scores(project):
     """
     Calculate risk scores based on risk assessment factors.
@@ -411,112 +518,74 @@ def calculate_risk_scores(project):
     
     Returns: Updated Project instance with risk scores
     """
+    assign_risk_scores(project)
+    project.save()
+    
+    return project
+
+
+def assign_risk_scores(project):
+    """
+    Set a project's risk score fields without saving it.
+    
+    Parameters:
+    - project: A Project instance
+    
+    Returns: The same Project instance
+    """
+    lookup = get_risk_lookup()
+    
     # Country risk score (based on home/target country)
-    country_risk = _calculate_country_risk(project.home_country, project.target_country)
+    country_risk = _calculate_country_risk(project.home_country, project.target_country, lookup)
     project.country_risk_score = country_risk
     
     # Technology risk score
-    tech_risk = _calculate_technology_risk(project.project_type, project.technology_risk_factor)
+    tech_risk = _calculate_technology_risk(project.project_type, project.technology_risk_factor, lookup)
     project.technology_risk_score = tech_risk
     
     # Project status risk score
-    status_risk = _calculate_status_risk(project.project_status_risk)
+    status_risk = _calculate_status_risk(project.project_status_risk, lookup)
     project.status_risk_score = status_risk
     
     # Off-taker risk score
-    off_taker_risk = _calculate_off_taker_risk(project.off_taker_rating)
+    off_taker_risk = _calculate_off_taker_risk(project.off_taker_rating, lookup)
     project.off_taker_risk_score = off_taker_risk
     
     # Calculate overall risk score (weighted average)
-    weights = {
-        'country': 0.25,
-        'technology': 0.25,
-        'status': 0.20,
-        'off_taker': 0.30
-    }
-    
     overall_risk = (
-        weights['country'] * (country_risk or 0) +
-        weights['technology'] * (tech_risk or 0) +
-        weights['status'] * (status_risk or 0) +
-        weights['off_taker'] * (off_taker_risk or 0)
+        RISK_WEIGHTS['country'] * (country_risk or 0) +
+        RISK_WEIGHTS['technology'] * (tech_risk or 0) +
+        RISK_WEIGHTS['status'] * (status_risk or 0) +
+        RISK_WEIGHTS['off_taker'] * (off_taker_risk or 0)
     )
     
     project.overall_risk_score = overall_risk
-    project.save()
     
     return project
 
 
-def _calculate_country_risk(home_country, target_country):
+def _calculate_country_risk(home_country, target_country, lookup=None):
     """Calculate risk score based on home/target country."""
-    # Risk scores based on regions/countries (1-5 scale, where 5 is highest risk)
-    country_risk_map = {
-        # Low risk countries
-        'united states': 1.0,
-        'usa': 1.0,
-        'canada': 1.0,
-        'australia': 1.0,
-        'germany': 1.0,
-        'united kingdom': 1.0,
-        'uk': 1.0,
-        'france': 1.0,
-        'japan': 1.0,
-        'south korea': 1.0,
-        'singapore': 1.0,
-        
-        # Medium risk countries
-        'mexico': 2.0,
-        'brazil': 2.5,
-        'china': 2.5,
-        'india': 2.5,
-        'south africa': 2.5,
-        'turkey': 2.5,
-        'thailand': 2.0,
-        'malaysia': 2.0,
-        'indonesia': 2.5,
-        'chile': 2.0,
-        
-        # Higher risk countries
-        'nigeria': 3.5,
-        'egypt': 3.0,
-        'pakistan': 3.5,
-        'ukraine': 3.5,
-        'iraq': 4.0,
-        'venezuela': 4.0,
-        'libya': 4.5,
-        'afghanistan': 5.0,
-        'syria': 5.0,
-        'yemen': 5.0,
-    }
+    lookup = lookup or get_risk_lookup()
     
     # Default risk if countries not specified
     if not home_country and not target_country:
         return 2.5  # Medium risk
     
     # Get risk scores for home and target countries
-    home_risk = country_risk_map.get(str(home_country).lower(), 2.5) if home_country else 2.5
-    target_risk = country_risk_map.get(str(target_country).lower(), 3.0) if target_country else 3.0
+    home_risk = lookup.score('country', home_country, DEFAULT_HOME_COUNTRY_RISK)
+    target_risk = lookup.score('country', target_country, DEFAULT_TARGET_COUNTRY_RISK)
     
     # Calculate weighted average (target country has more impact)
-    country_risk = (home_risk * 0.3) + (target_risk * 0.7)
+    country_risk = (home_risk * HOME_COUNTRY_WEIGHT) + (target_risk * (1 - HOME_COUNTRY_WEIGHT))
     
     return country_risk
 
 
-def _calculate_technology_risk(project_type, tech_risk_factor=None):
+def _calculate_technology_risk(project_type, tech_risk_factor=None, lookup=None):
     """Calculate risk score based on technology type and risk factor."""
-    # Base technology risk by project type (1-5 scale)
-    base_tech_risk = {
-        'solar': 1.5,  # Solar is relatively low risk
-        'wind': 1.8,   # Wind slightly higher
-        'hydro': 2.2,  # Hydro has more variables
-        'biomass': 2.5,
-        'geothermal': 2.8,
-        'tidal': 3.5,  # Emerging technologies higher risk
-        'wave': 3.8,
-        'hydrogen': 4.0,
-    }.get(str(project_type).lower(), 3.0)  # Default for unknown types
+    lookup = lookup or get_risk_lookup()
+    base_tech_risk = lookup.score('technology', project_type, DEFAULT_TECHNOLOGY_RISK)
     
     # If tech risk factor is provided, use it to adjust the base risk
     if tech_risk_factor is not None:
@@ -534,48 +603,142 @@ def _calculate_technology_risk(project_type, tech_risk_factor=None):
     return base_tech_risk
 
 
-def _calculate_status_risk(project_status):
+def _calculate_status_risk(project_status, lookup=None):
     """Calculate risk score based on project development status."""
-    # Risk scores by project status (1-5 scale)
-    status_risk_map = {
-        'early_stage': 4.5,     # Highest risk
-        'development': 3.5,
-        'construction': 2.5,
-        'operational': 1.5      # Lowest risk
-    }
-    
-    return status_risk_map.get(project_status, 3.0)  # Default for unknown status
+    lookup = lookup or get_risk_lookup()
+    return lookup.score('status', project_status, DEFAULT_STATUS_RISK)
 
 
-def _calculate_off_taker_risk(off_taker_rating):
+def _calculate_off_taker_risk(off_taker_rating, lookup=None):
     """Calculate risk score based on off-taker credit rating."""
-    # Risk scores by credit rating (1-5 scale)
-    rating_risk_map = {
-        'AAA': 1.0,
-        'AA+': 1.1,
-        'AA': 1.2,
-        'AA-': 1.3,
-        'A+': 1.5,
-        'A': 1.7,
-        'A-': 1.9,
-        'BBB+': 2.1,
-        'BBB': 2.3,
-        'BBB-': 2.5,
-        'BB+': 2.7,
-        'BB': 2.9,
-        'BB-': 3.1,
-        'B+': 3.3,
-        'B': 3.5,
-        'B-': 3.7,
-        'CCC+': 4.0,
-        'CCC': 4.3,
-        'CCC-': 4.5,
-        'CC': 4.7,
-        'C': 4.9,
-        'D': 5.0,
-    }
+    lookup = lookup or get_risk_lookup()
+    return lookup.score('off_taker', off_taker_rating, DEFAULT_OFF_TAKER_RISK)
+
+
+def _lookup_scores(lookup, kind, values, default):
+    """
+    Score a column of project field values with one lookup per distinct value.
+    
+    Returns: Tuple of (score array, mask of empty values)
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    keys = [lookup.resolve(kind, value) for value in uniques]
+    # factorize() codes None as -1, which picks the appended default
+    scores = np.array([default if key is None else lookup.scores[kind].get(key, default) for key in keys] + [default])
+    empty = np.append(np.array([key is None for key in keys], dtype=bool), True)
+    return scores[codes], empty[codes]
+
+
+def risk_score_arrays(columns, lookup=None):
+    """
+    Vectorized risk scores for many projects.
+    
+    Gives the same scores as assign_risk_scores(), but looks each distinct
+    country, type, status and rating up once instead of once per project.
+    
+    Parameters:
+    - columns: Dictionary of RISK_INPUT_FIELDS value sequences, one entry per project
+    - lookup: RiskLookup to score with (default: the active risk tables)
+    
+    Returns: Dictionary of RISK_SCORE_FIELDS arrays
+    """
+    lookup = lookup or get_risk_lookup()
+    
+    home_risk, home_empty = _lookup_scores(lookup, 'country', columns['home_country'], DEFAULT_HOME_COUNTRY_RISK)
+    target_risk, target_empty = _lookup_scores(lookup, 'country', columns['target_country'],
+                                               DEFAULT_TARGET_COUNTRY_RISK)
+    country_risk = home_risk * HOME_COUNTRY_WEIGHT + target_risk * (1 - HOME_COUNTRY_WEIGHT)
+    country_risk = np.where(home_empty & target_empty, 2.5, country_risk)
+    
+    base_tech_risk, _ = _lookup_scores(lookup, 'technology', columns['project_type'], DEFAULT_TECHNOLOGY_RISK)
+    factor = np.array(columns['technology_risk_factor'], dtype=float)
+    tech_risk = np.where(
+        np.isnan(factor),
+        base_tech_risk,
+        np.clip(base_tech_risk * (1 + np.clip(np.nan_to_num(factor), 0, 1)), 1.0, 5.0)
+    )
+    
+    status_risk, _ = _lookup_scores(lookup, 'status', columns['project_status_risk'], DEFAULT_STATUS_RISK)
+    off_taker_risk, _ = _lookup_scores(lookup, 'off_taker', columns['off_taker_rating'], DEFAULT_OFF_TAKER_RISK)
+    
+    overall_risk = (
+        RISK_WEIGHTS['country'] * country_risk +
+        RISK_WEIGHTS['technology'] * tech_risk +
+        RISK_WEIGHTS['status'] * status_risk +
+        RISK_WEIGHTS['off_taker'] * off_taker_risk
+    )
+    return dict(zip(RISK_SCORE_FIELDS, [country_risk, tech_risk, status_risk, off_taker_risk, overall_risk]))
+
+
+def _update_risk_scores(rows, batch_size):
+    """
+    Write RISK_SCORE_FIELDS for many projects with one parameterized UPDATE.
+    
+    bulk_update() builds a CASE expression per row and field, which costs
+    more than the per-project saves it replaces; executemany() reuses a
+    single statement.
+    
+    Parameters:
+    - rows: Sequences of RISK_SCORE_FIELDS values followed by the project id
+    - batch_size: Number of rows per executemany() call
+    """
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(Project._meta.db_table),
+        ', '.join(f'{quote(Project._meta.get_field(field).column)} = %s' for field in RISK_SCORE_FIELDS),
+        quote(Project._meta.pk.column)
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def rescore_portfolio_risk(queryset, chunk_size=5000, batch_size=2000, dry_run=False):
+    """
+    Recalculate the risk scores of many projects in vectorized batches.
     
-    if not off_taker_rating:
-        return 3.0  # Default medium risk
+    Only the risk input and score columns are loaded, and only projects whose
+    scores change are written back, updating just the score columns. Unlike
+    calculate_risk_scores() this does not touch updated_at or send post_save;
+    risk scores are not financial metric inputs, so no cached metrics need to
+    be invalidated.
+    
+    Parameters:
+    - queryset: A Project or SolarProject queryset selecting the portfolio
+    - chunk_size: Number of projects loaded and scored per batch
+    - batch_size: Number of rows per UPDATE statement
+    - dry_run: Count the changes without writing them
     
-    return rating_risk_map.get(off_taker_rating.upper(), 3.0)
\ No newline at end of file
+    Returns: Dictionary with the number of 'projects' scored and 'updated'
+    """
+    lookup = get_risk_lookup()
+    scored = updated = 0
+    last_id = 0
+    queryset = queryset.order_by('pk')
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).values_list('pk', *RISK_INPUT_FIELDS, *RISK_SCORE_FIELDS)[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        
+        columns = list(zip(*rows))
+        ids = columns[0]
+        inputs = dict(zip(RISK_INPUT_FIELDS, columns[1:1 + len(RISK_INPUT_FIELDS)]))
+        current = dict(zip(RISK_SCORE_FIELDS, columns[1 + len(RISK_INPUT_FIELDS):]))
+        
+        scores = risk_score_arrays(inputs, lookup)
+        changed = np.zeros(len(ids), dtype=bool)
+        for field in RISK_SCORE_FIELDS:
+            old = np.array(current[field], dtype=float)
+            changed |= np.isnan(old) | ~np.isclose(old, scores[field], rtol=0, atol=1e-12)
+        
+        changed_rows = np.flatnonzero(changed).tolist()
+        if changed_rows and not dry_run:
+            values = [scores[field].tolist() for field in RISK_SCORE_FIELDS]
+            _update_risk_scores([[column[i] for column in values] + [ids[i]] for i in changed_rows], batch_size)
+        scored += len(ids)
+        updated += len(changed_rows)
+        if len(rows) < chunk_size:
+            break
+    
+    return {'projects': scored, 'updated': updated}
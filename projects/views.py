@@ -4,22 +4,32 @@ Views for the Energy Finance application.
 
 import os
 import json
+import hashlib
 import pandas as pd
 import numpy as np
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 from django.views.generic.edit import FormView
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.conf import settings
 from django.db.models import Sum, Avg, Min, Max
 
-from .models import Project, SolarProject, CashFlow, FinancialMetric, GeospatialLayer
+from .models import (Project, SolarProject, CashFlow, FinancialMetric, GeospatialLayer, HourlyProfile, Job, Scenario,
+                     ScenarioResultSet)
 from .forms import ProjectForm, SolarProjectForm, FinancialMetricForm, ProjectImportForm
-from .utils import (calculate_financial_metrics, generate_project_templates, 
-                   import_project_from_file, calculate_risk_scores)
-from .ml_models import PowerGenerationPredictor
+from .utils import (calculate_financial_metrics, evaluate_financial_metrics, generate_project_templates, 
+                   get_project_with_solar, import_project_from_file, calculate_risk_scores,
+                   filter_projects, simulate_hourly_cash_flows, PORTFOLIO_PPA_TERMS, PORTFOLIO_RATE_DEFAULTS)
+from . import hourly_model, jobs, metrics_cache, model_registry, pvwatts_cache, single_flight
+from .debt_sizing import DEFAULT_MAX_GEARING, DEFAULT_TARGET_DSCR, MAX_LOAN_TERM, size_portfolio_debt, size_project_debt
+from .goal_seek import BID_RATE_DEFAULTS, goal_seek_bids
+from .ml_models import power_demo_samples
+from .risk_simulation import simulate_project, MAX_SIMULATION_PATHS
+from .scenarios import evaluate_scenarios
+from .sensitivity import SENSITIVITY_PARAMETERS, DEFAULT_TORNADO_SPANS, parse_axis, sensitivity_grid, tornado
 
 
 class ProjectListView(ListView):
@@ -32,22 +42,31 @@ class ProjectListView(ListView):
 class ProjectDetailView(DetailView):
     """View to display project details"""
     model = Project
+    queryset = Project.objects.select_related('solarproject', 'financial_metrics')
     template_name = 'projects/project_detail.html'
     context_object_name = 'project'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        project = self.get_object()
+        project = self.object
         
-        # Get cash flows
-        cash_flows = project.cash_flows.all().order_by('year')
-        context['cash_flows'] = cash_flows
+        # Get cash flows as columns with a single query
+        cash_flows = project.get_cash_flow_arrays()
+        years = cash_flows['year'].astype(int).tolist()
+        net_cash_flows = cash_flows['net_cash_flow'].tolist()
+        cumulative_cash_flows = cash_flows['cumulative_cash_flow'].tolist()
         
-        # Prepare chart data
-        years = [cf.year for cf in cash_flows]
-        net_cash_flows = [cf.net_cash_flow for cf in cash_flows]
-        cumulative_cash_flows = [cf.cumulative_cash_flow for cf in cash_flows]
+        # Table rows as plain tuples: year, revenue, opex, energy, net, cumulative
+        context['cash_flows'] = list(zip(
+            years,
+            cash_flows['revenue'].tolist(),
+            cash_flows['opex'].tolist(),
+            cash_flows['energy_production_mwh'].tolist(),
+            net_cash_flows,
+            cumulative_cash_flows
+        ))
         
+        # Prepare chart data
         context['chart_data'] = {
             'years': years,
             'net_cash_flows': net_cash_flows,
@@ -139,6 +158,13 @@ class ProjectImportView(FormView):
     
     def form_valid(self, form):
         file = form.cleaned_data['file']
+        
+        if form.cleaned_data.get('background'):
+            # Large files are parsed by a run_jobs worker instead
+            job = jobs.submit('import_project', {'path': jobs.save_upload(file)})
+            messages.info(self.request, f"Import of {file.name} queued as job #{job.pk}.")
+            return super().form_valid(form)
+        
         success, message, project = import_project_from_file(file)
         
         if success:
@@ -178,7 +204,7 @@ class FinancialAnalysisView(FormView):
         return context
     
     def form_valid(self, form):
-        project = get_object_or_404(Project, pk=self.kwargs['pk'])
+        project = _get_project_with_solar(self.kwargs['pk'])
         
         # Extract form data
         discount_rate = form.cleaned_data['discount_rate'] or 0.08
@@ -186,6 +212,11 @@ class FinancialAnalysisView(FormView):
         debt_ratio = form.cleaned_data['debt_ratio'] or 0.7
         interest_rate = form.cleaned_data['interest_rate'] or 0.05
         
+        # Store the submitted PPA terms, which the engine reads back
+        financial_metric = form.save(commit=False)
+        financial_metric.project = project
+        financial_metric.save()
+        
         # Calculate metrics
         metrics = calculate_financial_metrics(
             project, 
@@ -199,6 +230,52 @@ class FinancialAnalysisView(FormView):
         return super().form_valid(form)
 
 
+class ScenarioComparisonView(DetailView):
+    """View comparing one metric across the scenarios and projects of a stored result set"""
+    model = ScenarioResultSet
+    template_name = 'projects/scenario_comparison.html'
+    context_object_name = 'result_set'
+    paginate_by = 100
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        result_set = self.object
+        
+        metric = self.request.GET.get('metric', 'npv')
+        if metric not in result_set.metrics:
+            metric = result_set.metrics[0]
+        values = result_set.metric_values(metric)
+        
+        # Per-scenario summary over the projects with a defined value
+        finite = np.isfinite(values)
+        counts = finite.sum(axis=1)
+        totals = np.where(finite, values, 0.0).sum(axis=1)
+        summary = [
+            {
+                'name': name,
+                'mean': totals[i] / counts[i] if counts[i] else None,
+                'min': values[i][finite[i]].min() if counts[i] else None,
+                'max': values[i][finite[i]].max() if counts[i] else None,
+            }
+            for i, (_, name) in enumerate(result_set.scenarios)
+        ]
+        
+        # One table row per project, paginated in memory
+        columns = _json_values(values.T)
+        rows = [(project_id, name, row) for (project_id, name), row in zip(result_set.projects, columns)]
+        page = Paginator(rows, self.paginate_by).get_page(self.request.GET.get('page'))
+        
+        context.update({
+            'metric': metric,
+            'metrics': result_set.metrics,
+            'scenario_names': [name for _, name in result_set.scenarios],
+            'summary': summary,
+            'page_obj': page,
+            'rows': page.object_list,
+        })
+        return context
+
+
 def generate_template_view(request):
     """View to generate and download project templates"""
     if request.method == 'GET':
@@ -223,6 +300,25 @@ def generate_template_view(request):
     return redirect('projects:project_import')
 
 
+def _get_project_with_solar(pk):
+    """Load a project with one query, returning the SolarProject row for solar projects"""
+    try:
+        return get_project_with_solar(pk)
+    except Project.DoesNotExist:
+        raise Http404("No Project matches the given query.")
+
+
+def _ppa_overrides(data):
+    """PPA terms given in a request body; a term given as null clears the stored one"""
+    return {name: None if data[name] is None else float(data[name]) for name in PORTFOLIO_PPA_TERMS if name in data}
+
+
+def _json_values(values):
+    """Convert a NumPy array to nested lists with NaN replaced by None"""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
 def calculate_metrics_api(request):
     """API endpoint for calculating financial metrics"""
     if request.method == 'POST':
@@ -233,44 +329,457 @@ def calculate_metrics_api(request):
             if not project_id:
                 return JsonResponse({'error': 'Project ID is required'}, status=400)
             
-            project = get_object_or_404(Project, pk=project_id)
-            
             # Get parameters from request or use defaults
             discount_rate = data.get('discount_rate', 0.08)
             inflation_rate = data.get('inflation_rate', 0.025)
             debt_ratio = data.get('debt_ratio', 0.7)
             interest_rate = data.get('interest_rate', 0.05)
+            ppa_terms = _ppa_overrides(data)
+            
+            if data.get('dry_run'):
+                # What-if mode: compute in memory and never touch stored results
+                project = _get_project_with_solar(project_id)
+                
+                metrics, schedule = evaluate_financial_metrics(
+                    project,
+                    discount_rate=float(discount_rate),
+                    inflation_rate=float(inflation_rate),
+                    debt_ratio=float(debt_ratio),
+                    interest_rate=float(interest_rate),
+                    **ppa_terms
+                )
+                response_data = dict(metrics, dry_run=True)
+                if data.get('include_cash_flows'):
+                    response_data['cash_flows'] = {
+                        'years': schedule['year'].tolist(),
+                        'net_cash_flows': schedule['net_cash_flow'][0].tolist(),
+                        'cumulative_cash_flows': schedule['cumulative_cash_flow'][0].tolist()
+                    }
+                return JsonResponse(response_data)
+            
+            project = _get_project_with_solar(project_id)
+            
+            if data.get('background'):
+                return _job_accepted(jobs.submit('calculate_metrics', data))
+            
+            # Concurrent identical requests share one calculation
+            parameters = json.dumps([discount_rate, inflation_rate, debt_ratio, interest_rate, ppa_terms],
+                                    sort_keys=True)
+            key = f'calculate-metrics:{project.pk}:{hashlib.sha256(parameters.encode()).hexdigest()}'
+            response_data = single_flight.run(key, lambda: jobs.calculate_metrics(data))
+            
+            return JsonResponse(response_data)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def calculate_portfolio_metrics_api(request):
+    """API endpoint for calculating financial metrics for many projects at once"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            
+            if data.get('background'):
+                return _job_accepted(jobs.submit('portfolio_metrics', data))
+            
+            response_data = jobs.portfolio_metrics(data)
+            
+            return JsonResponse(response_data)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def sensitivity_api(request, pk):
+    """API endpoint for sensitivity grids and tornado analysis of a project"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body) if request.body else {}
+            project = _get_project_with_solar(pk)
+            
+            # Base case from the stored analysis, falling back to the usual defaults
+            base_rates = dict(PORTFOLIO_RATE_DEFAULTS)
+            try:
+                stored = project.financial_metrics
+                for name in SENSITIVITY_PARAMETERS:
+                    if getattr(stored, name) is not None:
+                        base_rates[name] = getattr(stored, name)
+            except FinancialMetric.DoesNotExist:
+                pass
+            base_rates.update({name: float(data['base'][name]) for name in data.get('base', {})})
+            
+            mode = data.get('mode', 'tornado')
+            if mode == 'tornado':
+                spans = dict(DEFAULT_TORNADO_SPANS, **{
+                    name: float(value) for name, value in data.get('spans', {}).items()
+                })
+                result = tornado(project, base_rates, spans, **_ppa_overrides(data))
+                response_data = {
+                    'mode': 'tornado',
+                    'base': {name: _json_values(value) for name, value in result['base'].items()},
+                    'bars': [
+                        {name: _json_values(value) if name != 'parameter' else value for name, value in bar.items()}
+                        for bar in result['bars']
+                    ]
+                }
+            elif mode == 'grid':
+                axes = [parse_axis(data.get(name), base_rates[name]) for name in SENSITIVITY_PARAMETERS]
+                result = sensitivity_grid(project, *axes, **_ppa_overrides(data))
+                response_data = {name: _json_values(value) for name, value in result.items()}
+                response_data['mode'] = 'grid'
+            else:
+                return JsonResponse({'error': f"Invalid mode: {mode}. Must be 'tornado' or 'grid'"}, status=400)
+            
+            return JsonResponse(response_data)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def hourly_profile_api(request, pk):
+    """API endpoint for the hourly production model of a solar project"""
+    project = _get_project_with_solar(pk)
+    
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body) if request.body else {}
+            rates = {name: float(data.get(name, default)) for name, default in PORTFOLIO_RATE_DEFAULTS.items()}
+            export_limit = data.get('export_limit')
+            
+            profile = simulate_hourly_cash_flows(
+                project,
+                inflation_rate=rates['inflation_rate'],
+                debt_ratio=rates['debt_ratio'],
+                interest_rate=rates['interest_rate'],
+                dc_ac_ratio=float(data.get('dc_ac_ratio', hourly_model.DEFAULT_DC_AC_RATIO)),
+                export_limit=None if export_limit is None else float(export_limit),
+                price_shape=data.get('price_shape')
+            )
+            metrics = calculate_financial_metrics(project, **rates)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    elif request.method == 'GET':
+        try:
+            profile = project.hourly_profile
+        except HourlyProfile.DoesNotExist:
+            return JsonResponse({'error': 'Project has no hourly profile'}, status=404)
+        metrics = None
+    
+    else:
+        return JsonResponse({'error': 'Only GET and POST requests are supported'}, status=405)
+    
+    response_data = {
+        'project_id': project.id,
+        'years': profile.years,
+        'options': profile.options,
+        'annual_energy_mwh': profile.annual_energy_mwh,
+        'annual_price_factor': profile.annual_price_factor,
+        'clipped_mwh': profile.clipped_mwh,
+        'curtailed_mwh': profile.curtailed_mwh,
+    }
+    if metrics is not None:
+        response_data['metrics'] = {
+            'npv': metrics.npv,
+            'irr': metrics.irr,
+            'payback_period': metrics.payback_period,
+            'lcoe': metrics.lcoe,
+        }
+    
+    # Optional hourly values for one operating year (1-based), read through the memory map
+    year = request.GET.get('year')
+    if year is not None:
+        try:
+            year = int(year)
+        except ValueError:
+            return JsonResponse({'error': 'year must be an integer'}, status=400)
+        if not 1 <= year <= profile.years:
+            return JsonResponse({'error': f'year must be between 1 and {profile.years}'}, status=400)
+        response_data['hourly_mwh'] = hourly_model.load_hourly_energy(profile)[year - 1].tolist()
+    
+    return JsonResponse(response_data)
+
+
+def risk_simulation_api(request, pk):
+    """API endpoint for Monte Carlo risk simulation of a project"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body) if request.body else {}
+            project = _get_project_with_solar(pk)
             
-            # Calculate metrics
-            metrics = calculate_financial_metrics(
-                project, 
-                discount_rate=discount_rate,
-                inflation_rate=inflation_rate,
-                debt_ratio=debt_ratio,
-                interest_rate=interest_rate
+            n_paths = int(data.get('paths', 10000))
+            if not 1 <= n_paths <= MAX_SIMULATION_PATHS:
+                return JsonResponse({'error': f'paths must be between 1 and {MAX_SIMULATION_PATHS}'}, status=400)
+            
+            rates = {name: float(data.get(name, default)) for name, default in PORTFOLIO_RATE_DEFAULTS.items()}
+            summary = simulate_project(
+                project,
+                n_paths=n_paths,
+                seed=data.get('seed'),
+                hurdle_rate=float(data.get('hurdle_rate', 0.1)),
+                **rates,
+                **_ppa_overrides(data)
+            )
+            
+            return JsonResponse(summary)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def _debt_sizing_params(data):
+    """Sizing parameters from a request body, with the usual defaults"""
+    params = {
+        'target_dscr': float(data.get('target_dscr', DEFAULT_TARGET_DSCR)),
+        'tenor': int(data.get('tenor', MAX_LOAN_TERM)),
+        'max_gearing': float(data.get('max_gearing', DEFAULT_MAX_GEARING)),
+    }
+    if params['target_dscr'] <= 0:
+        raise ValueError('target_dscr must be positive')
+    if params['tenor'] < 1:
+        raise ValueError('tenor must be at least 1 year')
+    params.update({
+        name: float(data.get(name, default))
+        for name, default in PORTFOLIO_RATE_DEFAULTS.items() if name != 'debt_ratio'
+    })
+    params.update(_ppa_overrides(data))
+    return params
+
+
+def debt_sizing_api(request, pk):
+    """API endpoint for sculpted debt sizing of a project, with the repayment profile"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body) if request.body else {}
+            project = _get_project_with_solar(pk)
+            
+            sizing, schedule = size_project_debt(project, **_debt_sizing_params(data))
+            years = schedule['mask'][0]
+            response_data = {
+                name: _json_values(sizing[name][0])
+                for name in ['debt_amount', 'gearing', 'min_dscr', 'average_dscr', 'npv', 'irr']
+            }
+            response_data['profile'] = {'year': schedule['year'][years].tolist()}
+            response_data['profile'].update({
+                name: _json_values(sizing[name][0][years])
+                for name in ['debt_service', 'interest', 'principal', 'balance', 'dscr']
+            })
+            
+            return JsonResponse(response_data)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def portfolio_debt_sizing_api(request):
+    """API endpoint for sculpted debt sizing of many projects at once"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            
+            # Select projects by explicit ids or by filter
+            project_ids = data.get('project_ids')
+            filters = data.get('filter')
+            if project_ids:
+                projects = Project.objects.filter(pk__in=project_ids)
+            elif filters is not None:
+                projects = filter_projects(Project.objects.all(), filters)
+            else:
+                return JsonResponse({'error': 'project_ids or filter is required'}, status=400)
+            
+            results = size_portfolio_debt(projects, **_debt_sizing_params(data))
+            
+            fields = [field for field in results if field != 'id']
+            columns = [_json_values(results[field]) for field in fields]
+            response_data = {
+                'count': len(results['id']),
+                'total_debt': float(results['debt_amount'].sum()),
+                'results': [
+                    dict(zip(fields, values), project_id=project_id)
+                    for project_id, *values in zip(results['id'].tolist(), *columns)
+                ]
+            }
+            
+            return JsonResponse(response_data)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def goal_seek_api(request):
+    """API endpoint solving the PPA price, maximum CAPEX or minimum capacity factor for many bids"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            
+            bids = data.get('bids')
+            if not bids:
+                return JsonResponse({'error': 'bids is required'}, status=400)
+            
+            variable = data.get('variable', 'ppa_price')
+            defaults = {name: data[name] for name in list(BID_RATE_DEFAULTS) + PORTFOLIO_PPA_TERMS if name in data}
+            results = goal_seek_bids(
+                bids,
+                variable,
+                metric=data.get('metric', 'npv'),
+                target=float(data.get('target', 0.0)),
+                **defaults
             )
             
-            # Prepare response
             response_data = {
-                'npv': metrics.npv,
-                'irr': metrics.irr,
-                'payback_period': metrics.payback_period,
-                'lcoe': metrics.lcoe,
-                'mirr': metrics.mirr,
-                'profitability_index': metrics.profitability_index,
-                'debt_service_coverage_ratio': metrics.debt_service_coverage_ratio
+                'variable': variable,
+                'count': len(bids),
+                'results': [
+                    {'project_id': project_id, variable: value, 'achieved': achieved, 'converged': converged}
+                    for project_id, value, achieved, converged in zip(
+                        results['project_id'].tolist(),
+                        _json_values(results['value']),
+                        _json_values(results['achieved']),
+                        results['converged'].tolist()
+                    )
+                ]
             }
             
             return JsonResponse(response_data)
             
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
     return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
 
 
+def evaluate_scenarios_api(request):
+    """API endpoint evaluating scenarios across many projects and storing the packed results"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body) if request.body else {}
+            
+            scenario_ids = data.get('scenario_ids')
+            scenarios = Scenario.objects.filter(pk__in=scenario_ids) if scenario_ids else Scenario.objects.all()
+            if not scenarios:
+                return JsonResponse({'error': 'No scenarios found'}, status=400)
+            
+            # Select projects by explicit ids or by filter, defaulting to all
+            project_ids = data.get('project_ids')
+            if project_ids:
+                projects = Project.objects.filter(pk__in=project_ids)
+            else:
+                projects = filter_projects(Project.objects.all(), data.get('filter') or {})
+            
+            result_set = evaluate_scenarios(scenarios, projects, name=data.get('name', ''))
+            
+            response_data = {
+                'id': result_set.pk,
+                'url': reverse('projects:scenario_comparison', kwargs={'pk': result_set.pk}),
+                'scenarios': [name for _, name in result_set.scenarios],
+                'project_count': len(result_set.projects),
+            }
+            
+            return JsonResponse(response_data)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def metrics_cache_stats_api(request):
+    """API endpoint for financial metric cache hit/miss counters"""
+    return JsonResponse(metrics_cache.stats())
+
+
+def pvwatts_cache_stats_api(request):
+    """API endpoint for PVWatts response cache hit/miss counters and size"""
+    return JsonResponse(pvwatts_cache.stats())
+
+
+def single_flight_stats_api(request):
+    """API endpoint for counters of coalesced concurrent requests"""
+    return JsonResponse(single_flight.stats())
+
+
+def _job_accepted(job):
+    """202 response pointing at a queued job's polling endpoint"""
+    response_data = dict(jobs.job_status(job), url=reverse('projects:job_detail_api', kwargs={'pk': job.pk}))
+    return JsonResponse(response_data, status=202)
+
+
+def jobs_api(request):
+    """API endpoint to submit a background job"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            kind = data.get('kind')
+            if not kind:
+                return JsonResponse({'error': 'kind is required'}, status=400)
+            
+            job = jobs.submit(kind, data.get('params'), data.get('max_attempts', jobs.DEFAULT_MAX_ATTEMPTS))
+            return _job_accepted(job)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (TypeError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Only POST requests are supported'}, status=405)
+
+
+def job_detail_api(request, pk):
+    """API endpoint to poll a background job's status, progress and result"""
+    job = get_object_or_404(Job, pk=pk)
+    return JsonResponse(jobs.job_status(job))
+
+
 class IndexView(TemplateView):
     """Home page view"""
     template_name = 'projects/index.html'
@@ -531,42 +1040,14 @@ class SolarRadiationView(DetailView):
 
 def solar_radiation_api(request, pk):
     """API endpoint to get solar radiation data for a project"""
-    from .solar_service import SolarRadiationService
-    
     try:
         project = get_object_or_404(SolarProject, pk=pk)
         
-        # Get parameters from request
-        capacity = float(request.GET.get('capacity', project.capacity_mw * 1000))  # kW
-        data_type = request.GET.get('data_type', 'monthly')  # daily, monthly, annual
+        params = dict(request.GET.items(), project_id=project.pk)
+        if request.GET.get('background'):
+            return _job_accepted(jobs.submit('solar_aggregates', params))
         
-        # Check if project has coordinates
-        if not project.latitude or not project.longitude:
-            return JsonResponse({
-                'error': 'Project does not have geographic coordinates'
-            }, status=400)
-        
-        # Initialize service
-        service = SolarRadiationService()
-        
-        # Get requested data
-        if data_type == 'daily':
-            data = service.get_daily_solar_data(project.latitude, project.longitude, capacity)
-            response_data = {
-                'daily_data': data
-            }
-        elif data_type == 'monthly':
-            data = service.get_monthly_solar_data(project.latitude, project.longitude, capacity)
-            response_data = {
-                'monthly_data': data
-            }
-        elif data_type == 'annual':
-            data = service.get_annual_production(project.latitude, project.longitude, capacity)
-            response_data = data
-        else:
-            return JsonResponse({
-                'error': f"Invalid data_type: {data_type}. Must be one of 'daily', 'monthly', or 'annual'"
-            }, status=400)
+        response_data = jobs.solar_aggregates(params)
         
         return JsonResponse(response_data)
         
@@ -579,86 +1060,70 @@ class MLPowerPredictionView(TemplateView):
     """View for machine learning power generation prediction"""
     template_name = 'projects/ml_power_prediction.html'
     
+    def post(self, request, *args, **kwargs):
+        """Queue a train_model job that publishes and activates a new model version"""
+        job = model_registry.request_training('power_generation')
+        messages.info(request, f"Model training queued as job #{job.pk}.")
+        return redirect('projects:ml_power_prediction')
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Create predictor model
-        predictor = PowerGenerationPredictor()
-        
-        # Generate sample data for demonstration
-        X, y = predictor.generate_sample_data(n_samples=1000)
-        
-        # Evaluate model
-        eval_metrics = predictor.evaluate_model(X, y)
-        
-        # Sample prediction
-        sample_inputs = X.iloc[[0, 100, 200, 300, 400]].copy()  # Get a few sample rows for demonstration
-        sample_predictions = predictor.predict(sample_inputs)
+        # Served from the model registry; training runs in the train_model job
+        context['model_error'] = None
+        context['training_job'] = model_registry.pending_training('power_generation')
+        try:
+            model = model_registry.get_model('power_generation')
+        except model_registry.ModelNotAvailable as e:
+            model = None
+            context['model_error'] = str(e)
         
-        # Convert to list for JSON serialization
+        # Sample predictions on held-out rows published with the model version
         prediction_examples = []
-        for i, (_, row) in enumerate(sample_inputs.iterrows()):
-            prediction_examples.append({
-                'input': {
-                    'solar_irradiance': round(row['solar_irradiance'], 2),
-                    'temperature': round(row['temperature'], 2),
-                    'cloud_cover': round(row['cloud_cover'], 2),
-                    'system_capacity': round(row['system_capacity'], 2),
-                    'tilt_angle': round(row['tilt_angle'], 2),
-                    'azimuth': round(row['azimuth'], 2),
-                    'panel_efficiency': round(row['panel_efficiency'], 2),
-                    'hour_of_day': int(row['hour_of_day']),
-                    'month': int(row['month'])
-                },
-                'predicted_power': round(float(sample_predictions[i]), 2)
-            })
-        
-        # Prepare data for visualization
         visualization_data = {
             'irradiance_vs_power': [],
             'cloud_cover_vs_power': [],
             'temperature_vs_power': [],
             'efficiency_vs_power': []
         }
-        
-        # Sample 100 points for visualization
-        sample_size = min(100, len(X))
-        indices = np.random.choice(len(X), sample_size, replace=False)
-        
-        # Convert to lists for easier handling
-        irradiance_values = X['solar_irradiance'].values[indices].tolist()
-        cloud_cover_values = X['cloud_cover'].values[indices].tolist()
-        temperature_values = X['temperature'].values[indices].tolist()
-        efficiency_values = X['panel_efficiency'].values[indices].tolist()
-        power_values = y.tolist()
-        power_samples = [power_values[i] for i in indices]
-        
-        # Create visualization data points
-        for i in range(sample_size):
-            visualization_data['irradiance_vs_power'].append({
-                'x': float(irradiance_values[i]),
-                'y': float(power_samples[i])
-            })
-            visualization_data['cloud_cover_vs_power'].append({
-                'x': float(cloud_cover_values[i]),
-                'y': float(power_samples[i])
-            })
-            visualization_data['temperature_vs_power'].append({
-                'x': float(temperature_values[i]),
-                'y': float(power_samples[i])
-            })
-            visualization_data['efficiency_vs_power'].append({
-                'x': float(efficiency_values[i]),
-                'y': float(power_samples[i])
-            })
+        if model is not None:
+            samples = model.metadata.get('demo_samples') or power_demo_samples(
+                n_samples=model.metadata.get('n_samples', 1000), seed=model.metadata.get('seed', 42)
+            )
+            X = pd.DataFrame(samples['features'])
+            sample_inputs = X.iloc[np.linspace(0, len(X) - 1, 5).astype(int)]  # A few rows for demonstration
+            sample_predictions = model.predict(sample_inputs)
+            
+            # Convert to list for JSON serialization
+            for i, (_, row) in enumerate(sample_inputs.iterrows()):
+                prediction_examples.append({
+                    'input': {
+                        'solar_irradiance': round(row['solar_irradiance'], 2),
+                        'temperature': round(row['temperature'], 2),
+                        'cloud_cover': round(row['cloud_cover'], 2),
+                        'system_capacity': round(row['system_capacity'], 2),
+                        'tilt_angle': round(row['tilt_angle'], 2),
+                        'azimuth': round(row['azimuth'], 2),
+                        'panel_efficiency': round(row['panel_efficiency'], 2),
+                        'hour_of_day': int(row['hour_of_day']),
+                        'month': int(row['month'])
+                    },
+                    'predicted_power': round(float(sample_predictions[i]), 2)
+                })
+            
+            # Actual power of every stored row against each input
+            for feature, series in [('solar_irradiance', 'irradiance_vs_power'),
+                                    ('cloud_cover', 'cloud_cover_vs_power'),
+                                    ('temperature', 'temperature_vs_power'),
+                                    ('panel_efficiency', 'efficiency_vs_power')]:
+                visualization_data[series] = [
+                    {'x': float(x), 'y': float(power)} for x, power in zip(samples['features'][feature], samples['power'])
+                ]
             
         # Add data to context
-        context['eval_metrics'] = {
-            'mse': round(eval_metrics['mse'], 4),
-            'rmse': round(eval_metrics['rmse'], 4),
-            'mae': round(eval_metrics['mae'], 4),
-            'r_squared': round(eval_metrics['r_squared'], 4)
-        }
+        if model is not None:
+            context['eval_metrics'] = {name: round(value, 4) for name, value in model.metrics.items()}
+            context['model_version'] = model.version
         context['prediction_examples'] = prediction_examples
         context['visualization_data'] = visualization_data
         